@@ -0,0 +1,144 @@
+# Контроль приёма заказов: ограничение очередей по этапам и скорости поступления
+import threading
+import time
+
+from pipeline import Pipeline
+
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше burst про запас."""
+
+    def __init__(self, rate, burst=None, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self.clock = clock
+        self.tokens = self.burst
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, count=1):
+        """Забрать count токенов; возвращает 0, если получилось, иначе сколько секунд ждать."""
+        self._refill()
+        if count > self.burst:
+            return None  # Столько токенов не наберётся никогда
+        if self.tokens >= count:
+            self.tokens -= count
+            return 0.0
+        return (count - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """Решает, принимать ли заказ, до списания ингредиентов.
+
+    queue_limits - максимальное число заказов на этапе конвейера (в очереди и
+    в работе), например {"chef": 50, "waiter": 50}; rate и burst - параметры
+    ведра токенов для всех заказов. Глубина очередей и суммарная работа по
+    этапам ведутся по событиям менеджера процессов, поэтому проверка не
+    перебирает заказы. check() сразу занимает места на первом этапе, поэтому
+    параллельные запросы не превысят лимит; если заказ затем не прошёл
+    (нет ингредиентов), места возвращаются через release(). Отказ
+    возвращается как словарь с error, reason ("rate_limited" или
+    "queue_full"), retry_after и projected_wait в секундах.
+    """
+
+    def __init__(self, queue_limits=None, rate=None, burst=None, clock=time.monotonic):
+        self.queue_limits = dict(queue_limits or {})
+        self.bucket = TokenBucket(rate, burst, clock) if rate else None
+        self.lock = threading.Lock()
+        self._use_pipeline(Pipeline.from_config(None))
+        self.admitted = 0
+        self.rejected = {"rate_limited": 0, "queue_full": 0}
+        self.database = None
+
+    def _use_pipeline(self, pipeline):
+        self.pipeline = pipeline
+        self.depth = {stage.name: 0 for stage in pipeline.stages}  # Заказов на этапе
+        self.work = {stage.name: 0.0 for stage in pipeline.stages}  # Их суммарная оценка времени
+
+    def attach(self, manager):
+        """Подключиться к менеджеру процессов (ProcessManager или AsyncProcessManager)."""
+        self.database = manager.database
+        with self.lock:
+            self._use_pipeline(manager.pipeline)
+        manager.add_event_listener(self._on_event)
+        return self
+
+    def _stage_wait(self, stage, work):
+        staff = len(self.database.employees_by_role.get(stage.role, ())) if self.database else 0
+        return work * stage.work_factor / staff if staff else 0.0
+
+    def projected_wait(self):
+        """Ожидаемое время до доставки нового заказа при текущей загрузке."""
+        # Заказы ранних этапов ещё пройдут и через все следующие
+        wait = 0.0
+        ahead = 0.0
+        for stage in self.pipeline.stages:
+            ahead += self.work[stage.name]
+            wait += self._stage_wait(stage, ahead)
+        return wait
+
+    def check(self, count=1):
+        """Вернуть отказ или None, если count заказов можно принять (места при этом занимаются)."""
+        with self.lock:
+            for stage in self.pipeline.stages:
+                limit = self.queue_limits.get(stage.name)
+                if limit is not None and self.depth[stage.name] + count > limit:
+                    # Повторять имеет смысл, когда очередь этапа хотя бы частично разберут
+                    retry_after = self._stage_wait(stage, self.work[stage.name])
+                    return self._reject("queue_full", "Kitchen queue is full", retry_after)
+            if self.bucket is not None:
+                retry_after = self.bucket.try_acquire(count)
+                if retry_after != 0.0:
+                    return self._reject("rate_limited", "Too many orders", retry_after)
+            self.depth[self.pipeline.first.name] += count
+            return None
+
+    def release(self, count=1):
+        """Вернуть места, занятые check(), если заказ так и не был принят."""
+        with self.lock:
+            self.depth[self.pipeline.first.name] -= count
+
+    def _reject(self, reason, message, retry_after):
+        # Вызывается под self.lock
+        self.rejected[reason] += 1
+        return {
+            "error": message,
+            "reason": reason,
+            "retry_after": retry_after,
+            "projected_wait": self.projected_wait(),
+        }
+
+    def record(self, order):
+        """Учесть принятый заказ, место которому заняла check()."""
+        with self.lock:
+            self.admitted += 1
+            self.work[self.pipeline.first.name] += order.time_to_complete
+
+    def _on_event(self, event, order, employee, now):
+        if event == "completed" or event == "cancelled":
+            with self.lock:
+                self.depth[order.stage] -= 1
+                self.work[order.stage] -= order.time_to_complete
+                if not self.depth[order.stage]:
+                    self.work[order.stage] = 0.0  # Не копим ошибку округления
+                next_stage = self.pipeline.next_stage(order.stage) if event == "completed" else None
+                if next_stage is not None:
+                    # Заказ переходит на следующий этап
+                    self.depth[next_stage] += 1
+                    self.work[next_stage] += order.time_to_complete
+
+    def stats(self):
+        with self.lock:
+            return {
+                "queue_depth": dict(self.depth),
+                "queued_work": dict(self.work),
+                "queue_limits": dict(self.queue_limits),
+                "projected_wait": self.projected_wait(),
+                "admitted": self.admitted,
+                "rejected": dict(self.rejected),
+                "tokens": self.bucket.tokens if self.bucket is not None else None,
+            }
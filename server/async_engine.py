@@ -0,0 +1,336 @@
+# Движок обработки заказов на asyncio: один цикл событий вместо потоков
+import asyncio
+import logging
+import random
+import threading
+import time
+
+from database import RestaurantDatabase
+from pipeline import StageMetrics
+from process_manager import Order, logger
+
+
+class AsyncProcessManager:
+    """Конвейер заказов по этапам pipeline.Pipeline в одном цикле событий asyncio.
+
+    У каждой роли своя очередь asyncio.Queue, у каждого сотрудника -
+    сопрограмма-исполнитель, которая берёт из очереди своей роли следующий
+    заказ, как только освобождается. Этап заказа - отдельная задача, поэтому
+    отмена заказа - это отмена задачи. Все заказы в работе живут в одном
+    потоке цикла событий, сколько бы их ни было.
+
+    add_order, add_order_batch и cancel_order потокобезопасны и не ждут
+    цикл событий, поэтому их можно вызывать из обработчиков Flask так же,
+    как методы ProcessManager. admission, pipeline, metrics и stage_metrics - как в
+    ProcessManager; этап, как и там, длится order.work / performance сотрудника.
+    """
+
+    def __init__(self, database: RestaurantDatabase, rng=None, verbose=True, admission=None, pipeline=None,
+                 metrics=None):
+        self.database = database
+        self.pipeline = pipeline or database.pipeline
+        # Защищает orders и очереди сотрудников; с metrics замеряются ожидание и удержание
+        self.lock = metrics.timed_lock("engine") if metrics is not None else threading.Lock()
+        self.orders = {}  # ID -> Order для всех незавершённых заказов
+        self.random = rng or random
+        self.verbose = verbose
+        self.event_listeners = []
+        self.queues = {}  # Роль -> asyncio.Queue, создаются в цикле событий
+        self._workers = {}  # (ID сотрудника, роль) -> задача исполнителя
+        self._backlog = []  # Заказы, ожидающие запуска цикла событий
+        self._loop = None
+        self._thread = None
+        self.stage_metrics = StageMetrics(self.pipeline).attach(self)
+        self.admission = admission
+        if admission is not None:
+            admission.attach(self)
+
+    def _log(self, message, level=logging.INFO, **fields):
+        # Как ProcessManager._log: запись уходит в очередь, цикл событий не ждёт вывода
+        if self.verbose and logger.isEnabledFor(level):
+            logger.log(level, message, extra={"fields": fields})
+
+    def add_event_listener(self, listener):
+        """Подписаться на события: listener(event, order, employee, now), как в ProcessManager."""
+        self.event_listeners.append(listener)
+
+    def now(self):
+        """Текущее время по часам конвейера (те же часы, что у цикла событий asyncio)."""
+        return time.monotonic()
+
+    def _emit(self, event, order, employee=None):
+        if not self.event_listeners:
+            return
+        now = time.monotonic()  # Часы цикла событий asyncio
+        for listener in self.event_listeners:
+            listener(event, order, employee, now)
+
+    # ==== Потокобезопасный интерфейс ====
+
+    def add_order(self, recipe_name, quantity):
+        with self.lock:
+            rejection = self._check_admission(1)
+        if rejection:
+            return rejection
+        # База блокирует только нужные ингредиенты и пишет журнал; общую блокировку
+        # движка на это время не держим, чтобы не останавливать цикл событий
+        try:
+            result = self.database.process_order(recipe_name, quantity, assign=False)
+        except Exception:
+            self._release_admission(1)
+            raise
+        if "error" in result:
+            self._release_admission(1)
+            return result
+        noise_factor = self.random.uniform(0.8, 1.2)  # Добавляем шумовую величину
+        time_to_complete = result["time_to_complete"] * noise_factor
+        order = Order(result["order_id"], recipe_name, quantity, time_to_complete,
+                      work=result["work"] * noise_factor)
+        with self.lock:
+            self._track(order)
+        self._submit([order])
+        self._log(f"Заказ {order.order_id} добавлен в очередь.", order_id=order.order_id, recipe=recipe_name,
+                  quantity=quantity, stage=order.stage)
+        return {
+            "status": "Order added to the queue",
+            "order_id": order.order_id,
+            "time_to_complete": time_to_complete,
+            "total_cost": result["total_cost"],
+        }
+
+    def add_order_batch(self, items):
+        """Принять чек из нескольких позиций целиком или отклонить его целиком."""
+        with self.lock:
+            rejection = self._check_admission(len(items))
+        if rejection:
+            return rejection
+        try:
+            result = self.database.process_order_batch(items, assign=False)
+        except Exception:
+            self._release_admission(len(items))
+            raise
+        if "error" in result:
+            self._release_admission(len(items))
+            return result
+        orders = []
+        for item in result["items"]:
+            noise_factor = self.random.uniform(0.8, 1.2)
+            item["time_to_complete"] *= noise_factor
+            orders.append(Order(item["order_id"], item["recipe_name"], item["quantity"], item["time_to_complete"],
+                                work=item["work"] * noise_factor))
+        with self.lock:
+            for order in orders:
+                self._track(order)
+        self._submit(orders)
+        order_ids = [order.order_id for order in orders]
+        self._log(f"Заказы {order_ids} добавлены в очередь.", order_ids=order_ids)
+        return {
+            "status": "Orders added to the queue",
+            "order_ids": order_ids,
+            "items": result["items"],
+            "total_cost": result["total_cost"],
+        }
+
+    def cancel_order(self, order_id):
+        """Отменить незавершённый заказ; выполняемый этап отменяется вместе с его задачей."""
+        with self.lock:
+            order = self.orders.pop(order_id, None)
+            if order is None:
+                return {"error": "Order not found"}
+            order.cancelled = True
+            employee = order.employee
+            if employee is not None:
+                employee.cancel_order(order_id)
+                order.employee = None
+            task, order.timer = order.timer, None
+            loop = self._loop
+        if task is not None:
+            self._call_soon(task.cancel)
+        self._log(f"Заказ {order_id} отменён (этап: {order.stage}).", order_id=order_id, stage=order.stage)
+        if loop is None:
+            # Цикл остановлен: события сообщаем сразу, иначе контроль приёма и метрики
+            # этапов не узнают об отмене до следующего start()
+            if order.created_at is None:
+                order.created_at = self.now()
+                self._emit("queued", order)
+            self._emit("cancelled", order, employee)
+        else:
+            loop.call_soon_threadsafe(self._emit, "cancelled", order, employee)
+        return {"status": "Order canceled", "order_id": order_id}
+
+    def exclusive(self):
+        """Остановить все изменения конвейера (для перезагрузки конфигурации)."""
+        return self.lock
+
+    def employees_changed(self):
+        """Запустить исполнителей для сотрудников, появившихся после перезагрузки конфигурации."""
+        self._call_soon(self._sync_workers)
+
+    def _check_admission(self, count):
+        # Вызывается под self.lock (без базы): быстрый отказ до проверки и списания ингредиентов
+        if self.admission is None:
+            return None
+        return self.admission.check(count)
+
+    def _release_admission(self, count):
+        if self.admission is not None:
+            self.admission.release(count)
+
+    def _enter_stage(self, order, stage_name):
+        order.stage = stage_name
+        order.work = order.base_work * self.pipeline.stage(stage_name).work_factor
+        order.stage_entered_at = time.monotonic()
+        order.stage_started_at = None
+
+    def _track(self, order):
+        # Вызывается под self.lock
+        self._enter_stage(order, self.pipeline.first.name)
+        self.orders[order.order_id] = order
+        if self.admission is not None:
+            self.admission.record(order)
+
+    def _submit(self, orders):
+        with self.lock:
+            if self._loop is None:
+                self._backlog.extend(orders)
+                return
+            loop = self._loop
+        loop.call_soon_threadsafe(self._enqueue, orders)
+
+    def _call_soon(self, callback, *args):
+        loop = self._loop
+        if loop is not None:
+            loop.call_soon_threadsafe(callback, *args)
+
+    # ==== Цикл событий ====
+
+    def _enqueue(self, orders):
+        now = time.monotonic()
+        for order in orders:
+            if order.created_at is None:
+                # Заказы из backlog после перезапуска уже учтены. Заказ, отменённый до
+                # постановки в очередь, тоже отмечается: его событие cancelled придёт следом
+                order.created_at = now
+                self._emit("queued", order)
+            if order.cancelled:
+                continue
+            self.queues[self.pipeline.role_of(order.stage)].put_nowait(order)
+
+    def _sync_workers(self):
+        for employee in self.database.employees:
+            key = (employee.id, employee.role)
+            if employee.role in self.queues and (key not in self._workers or self._workers[key].done()):
+                self._workers[key] = asyncio.get_running_loop().create_task(self._work(employee.id, employee.role))
+
+    async def _work(self, employee_id, role):
+        queue = self.queues[role]
+        while True:
+            order = await queue.get()
+            if order.cancelled:
+                continue
+            employee = self.database.get_employee_by_id(employee_id)
+            if employee is None or employee.role != role:
+                # Сотрудника убрали из конфигурации: заказ достанется другому
+                queue.put_nowait(order)
+                return
+            await self._run_stage(order, employee)
+
+    async def _run_stage(self, order, employee):
+        with self.lock:
+            if order.cancelled:
+                return
+            order.employee = employee
+            employee.assign_order(order)
+            order.stage_started_at = time.monotonic()
+            # Таймер этапа - задача, которую cancel_order может отменить
+            duration = order.work / employee.performance
+            timer = order.timer = asyncio.create_task(asyncio.sleep(duration))
+        self._log(f"Сотрудник {employee.name} начал выполнение заказа {order.order_id} (этап: {order.stage}).",
+                  order_id=order.order_id, stage=order.stage, employee_id=employee.id, duration=duration)
+        self._emit("started", order, employee)
+        try:
+            await timer
+        except asyncio.CancelledError:
+            if order.cancelled:
+                return  # Заказ снят с сотрудника в cancel_order
+            raise  # Остановка движка
+
+        with self.lock:
+            if order.cancelled:
+                return
+            employee.complete_order(order.order_id)
+            order.employee = None
+            order.timer = None
+            next_stage = self.pipeline.next_stage(order.stage)
+            if next_stage is None:
+                self.orders.pop(order.order_id, None)
+        self._emit("completed", order, employee)
+        fields = {"order_id": order.order_id, "stage": order.stage, "employee_id": employee.id,
+                  "service_time": self.now() - order.stage_started_at}
+        if next_stage is None:
+            self._log(f"{employee.name} завершил заказ {order.order_id}.", **fields)
+            self._emit("delivered", order, employee)
+        else:
+            self._log(f"{employee.name} завершил этап {order.stage} заказа {order.order_id}. "
+                      f"Передаем на этап {next_stage}.", next_stage=next_stage, **fields)
+            self._enter_stage(order, next_stage)
+            self.queues[self.pipeline.role_of(next_stage)].put_nowait(order)
+
+    async def _shutdown(self):
+        workers = list(self._workers.values())
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        self._workers.clear()
+        # Прерванные этапы и очереди переносим в backlog до следующего start()
+        with self.lock:
+            interrupted = []
+            for order in self.orders.values():
+                if order.employee is not None:
+                    order.employee.cancel_order(order.order_id)
+                    order.employee = None
+                    order.timer = None
+                    interrupted.append(order)
+            queued = []
+            for queue in self.queues.values():
+                while not queue.empty():
+                    order = queue.get_nowait()
+                    if not order.cancelled:
+                        queued.append(order)
+            self._backlog = interrupted + queued + self._backlog
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.is_running():
+            return
+        loop = asyncio.new_event_loop()
+        started = threading.Event()
+        loop.call_soon(started.set)
+        self._thread = threading.Thread(target=loop.run_forever, name="order-engine", daemon=True)
+        self._thread.start()
+        started.wait()
+
+        async def setup():
+            self.queues = {role: asyncio.Queue() for role in self.pipeline.roles}
+            self._sync_workers()
+            with self.lock:
+                self._loop = loop
+                backlog, self._backlog = self._backlog, []
+            self._enqueue(backlog)
+
+        asyncio.run_coroutine_threadsafe(setup(), loop).result()
+
+    def stop(self, timeout=None):
+        """Остановить цикл событий; незавершённые заказы продолжатся после следующего start()."""
+        if not self.is_running():
+            return
+        loop = self._loop
+        with self.lock:
+            self._loop = None  # Новые заказы копятся в backlog
+        asyncio.run_coroutine_threadsafe(self._shutdown(), loop).result(timeout)
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join(timeout)
+        self._thread = None
+        loop.close()
@@ -0,0 +1,65 @@
+# Готовка партиями: одинаковые заказы на первом этапе конвейера объединяются в одну работу
+import itertools
+
+
+class BatchCooking:
+    """Настройки объединения заказов одного рецепта в партию.
+
+    Заказы рецепта, пришедшие к диспетчеру в течение window секунд после
+    первого, готовятся одной партией (не больше max_size заказов). Партия
+    из n заказов длится work * (1 + factor * (n - 1)) / performance, где
+    work - самый долгий из заказов, а factor - Recipe.batch_factor или
+    default_factor. Рецепты с factor >= 1 партиями не готовятся.
+    """
+
+    def __init__(self, window=30.0, max_size=8, default_factor=0.3):
+        self.window = window
+        self.max_size = max_size
+        self.default_factor = default_factor
+
+    def factor_for(self, recipe):
+        factor = getattr(recipe, "batch_factor", None)
+        return self.default_factor if factor is None else factor
+
+
+class KitchenBatch:
+    """Партия заказов одного рецепта.
+
+    В очереди сотрудника занимает одно место и ведёт себя как заказ (order_id,
+    work, weight, timer); после готовки заказы партии по одному идут на
+    следующий этап.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, recipe_name, factor, stage):
+        self.order_id = ("batch", next(self._ids))
+        self.recipe_name = recipe_name
+        self.factor = factor
+        self.orders = []
+        self.stage = stage
+        self.employee = None
+        self.timer = None  # Завершение готовки
+        self.flush_timer = None  # Конец окна набора партии
+        self.stage_started_at = None
+        self.cancelled = False
+        self.sealed = False  # Набор закончен, партия передана исполнителю
+        self.work = 0.0
+
+    @property
+    def weight(self):
+        return sum(order.weight for order in self.orders)
+
+    def add(self, order):
+        self.orders.append(order)
+        order.batch = self
+
+    def remove(self, order):
+        self.orders.remove(order)
+        order.batch = None
+
+    def seal(self):
+        """Закончить набор и зафиксировать длительность партии."""
+        self.sealed = True
+        if self.orders:
+            self.work = max(order.work for order in self.orders) * (1 + self.factor * (len(self.orders) - 1))
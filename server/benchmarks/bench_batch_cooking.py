@@ -0,0 +1,63 @@
+# Бенчмарк: готовка партиями в час пик на дискретно-событийной модели
+#
+# Один и тот же плотный поток заказов прогоняется без партий и с разными
+# окнами набора партии (--windows). Официантов заведомо хватает, чтобы
+# узким местом была кухня; склад не ограничен. Партия набирается, только
+# пока все повара заняты, поэтому при редких заказах (--interval 30) окно
+# не добавляет задержки. Запуск из корня:
+#     python server/benchmarks/bench_batch_cooking.py [--orders 3000] [--interval 2] [--windows 10,30,60]
+import argparse
+import os
+import statistics
+import sys
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+from batching import BatchCooking  # noqa: E402
+from database import RestaurantDatabase  # noqa: E402
+from simulation import KitchenSimulation, random_stream, set_staffing  # noqa: E402
+
+
+def run(batching, config_file, staffing, orders, interval, seed):
+    database = RestaurantDatabase(config_file)
+    set_staffing(database, staffing)
+    database.stock.fill(float("inf"))
+    simulation = KitchenSimulation(database, seed=seed, batching=batching)
+    for at, recipe_name, quantity in random_stream(database, orders, interval, seed):
+        simulation.submit(at, recipe_name, quantity)
+    return simulation.run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput and latency with and without batch cooking")
+    parser.add_argument("--config", default=os.path.join(SERVER_DIR, "config.json"))
+    parser.add_argument("--chefs", type=int, default=2)
+    parser.add_argument("--waiters", type=int, default=8)
+    parser.add_argument("--orders", type=int, default=3000, help="Заказов в потоке")
+    parser.add_argument("--interval", type=float, default=2.0, help="Средний интервал между заказами")
+    parser.add_argument("--windows", default="10,30,60", help="Окна набора партии через запятую")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--seeds", type=int, default=3, help="Сколько потоков усреднять")
+    args = parser.parse_args()
+
+    staffing = {"chef": args.chefs, "waiter": args.waiters}
+    variants = [("no batching", None)] + [
+        (f"window {window:g}", BatchCooking(window, args.batch_size))
+        for window in (float(value) for value in args.windows.split(","))
+    ]
+    print(f"{'variant':<14} {'makespan':>10} {'orders/hour':>12} {'mean latency':>13} {'p90 latency':>12}")
+    for name, batching in variants:
+        reports = [
+            run(batching, args.config, staffing, args.orders, args.interval, seed)
+            for seed in range(1, args.seeds + 1)
+        ]
+        makespan = statistics.mean(report["makespan"] for report in reports)
+        throughput = statistics.mean(report["delivered"] / report["makespan"] * 3600 for report in reports)
+        mean_latency = statistics.mean(report["mean_latency"] for report in reports)
+        p90_latency = statistics.mean(report["p90_latency"] for report in reports)
+        print(f"{name:<14} {makespan:>10.0f} {throughput:>12.0f} {mean_latency:>13.1f} {p90_latency:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# Бенчмарк: загрузка процессора и задержка запросов при простаивающем диспетчере
+#
+# Сравнивает прежний цикл опроса очереди (while True: if not queue.empty())
+# с блокирующим диспетчером ProcessManager. Запуск из корня репозитория:
+#     python server/benchmarks/bench_dispatcher_idle.py [--seconds 2] [--requests 500]
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+from process_manager import Order, ProcessManager  # noqa: E402
+from server import create_app  # noqa: E402
+from simulation import percentile  # noqa: E402
+
+
+class BusyWaitProcessManager(ProcessManager):
+    """Прежняя реализация диспетчера, которая опрашивает очередь в цикле."""
+
+    def process_orders(self):
+        while True:
+            if not self.orders_queue.empty():
+                with self.orders_lock:
+                    order = self.orders_queue.get()
+                if not isinstance(order, Order):
+                    break  # Сигнал остановки
+                if not order.cancelled:
+                    self.assign_order_to_employee(order)
+
+
+def measure(app, manager_class, seconds, requests):
+    state = app.extensions["restaurant_state"]
+    state.process_manager.stop()
+    state.process_manager = manager_class(state.db)
+    state.process_manager.start()
+    time.sleep(0.1)  # Даём потокам запуститься
+
+    # Процессорное время всего процесса, пока кухня простаивает
+    cpu_before = time.process_time()
+    time.sleep(seconds)
+    idle_cpu = (time.process_time() - cpu_before) / seconds
+
+    # Задержка запросов, которые конкурируют с диспетчером за GIL
+    client = app.test_client()
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        client.get("/halls")
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    state.process_manager.stop(timeout=5)
+    return {
+        "idle_cpu": idle_cpu,
+        "p50_ms": statistics.median(latencies),
+        "p99_ms": percentile(latencies, 0.99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Idle dispatcher CPU and request latency")
+    parser.add_argument("--seconds", type=float, default=2.0, help="Длительность замера простоя")
+    parser.add_argument("--requests", type=int, default=500, help="Число запросов GET /halls")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-dispatcher-")
+    try:
+        config_file = os.path.join(workdir, "config.json")
+        shutil.copy(os.path.join(SERVER_DIR, "config.json"), config_file)
+        app = create_app(config_file, persistence="file")
+
+        print(f"{'dispatcher':<12} {'idle CPU':>9} {'p50, ms':>9} {'p99, ms':>9}")
+        for name, manager_class in (("busy-wait", BusyWaitProcessManager), ("blocking", ProcessManager)):
+            result = measure(app, manager_class, args.seconds, args.requests)
+            print(f"{name:<12} {result['idle_cpu']:>8.0%} {result['p50_ms']:>9.3f} {result['p99_ms']:>9.3f}")
+        app.extensions["restaurant_state"].close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+# Микробенчмарки горячих путей RestaurantDatabase и ProcessManager по размерам заведения
+#
+# Для каждого размера из --sizes генерируется синтетическое заведение
+# (venue.generate_venue) и замеряется время одной операции: медиана по
+# --repeat серий, в каждой серии операция повторяется, пока серия не займёт
+# хотя бы --min-time секунд. Медиана многих коротких серий устойчивее
+# лучшей из нескольких: одна удачная или медленная серия её не сдвигает.
+# По строкам таблицы видно, как растёт стоимость операции с размером
+# заведения. Результаты можно сохранить как эталон и сравнивать с ним: при
+# замедлении больше --max-regression скрипт завершается с кодом 1. Вместе с
+# эталоном записываются процессор (модель и число ядер) и версия Python.
+# Абсолютные времена сравниваются только на таком же процессоре и Python;
+# иначе сравнивается рост времени с размером (отношение ко времени на
+# наименьшем общем размере), который от скорости машины почти не зависит.
+# Запуск из корня:
+#     python server/benchmarks/bench_hot_paths.py --save-baseline server/benchmarks/baseline_hot_paths.json
+#     python server/benchmarks/bench_hot_paths.py --baseline server/benchmarks/baseline_hot_paths.json
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+from database import RestaurantDatabase  # noqa: E402
+from process_manager import ProcessManager  # noqa: E402
+from simulation import VirtualScheduler  # noqa: E402
+from venue import write_venue  # noqa: E402
+
+# Размер -> (залов, столов в зале, ингредиентов, рецептов, складов)
+SIZES = {
+    "xs": (2, 5, 20, 10, 2),
+    "s": (10, 20, 100, 100, 5),
+    "m": (50, 200, 500, 1000, 20),
+    "l": (200, 500, 2000, 5000, 50),
+}
+
+
+def measure(operation, min_time, repeat):
+    """Медианное по repeat сериям время одного вызова operation() в секундах."""
+    per_call = []
+    for _ in range(repeat):
+        number = 0
+        started = time.perf_counter()
+        elapsed = 0.0
+        while elapsed < min_time:
+            operation()
+            number += 1
+            elapsed = time.perf_counter() - started
+        per_call.append(elapsed / number)
+    return statistics.median(per_call)
+
+
+def bench_size(size, workdir, min_time, repeat):
+    halls, tables, ingredients, recipes, warehouses = SIZES[size]
+    config_file = write_venue(os.path.join(workdir, f"venue_{size}.json"), halls, tables, ingredients, recipes,
+                              warehouses, recipe_ingredients=5, chefs=4, waiters=4)
+    database = RestaurantDatabase(config_file)
+    rng = random.Random(1)
+    recipe_names = [recipe.name for recipe in database.recipes]
+    all_tables = itertools.cycle([(hall.id, table.id) for hall in database.halls for table in hall.tables])
+
+    def reserve_table():
+        # Бронь и освобождение, чтобы свободные столы не кончались
+        hall_id, table_id = next(all_tables)
+        database.reserve_table(hall_id, table_id)
+        database.release_table(hall_id, table_id)
+
+    manager = ProcessManager(database, scheduler=VirtualScheduler(), synchronous=True, verbose=False)
+
+    def add_order():
+        manager.add_order(rng.choice(recipe_names), 1)
+        # Очереди сотрудников не должны расти от серии к серии
+        if len(manager.orders) > 1000:
+            manager.scheduler.run()
+
+    operations = {
+        "load_data": lambda: database.load_data(),
+        "get_halls": lambda: database.get_halls(),
+        "reserve_table": reserve_table,
+        "check_ingredients_for_recipe": lambda: database.check_ingredients_for_recipe(rng.choice(recipe_names), 2),
+        "process_order": lambda: database.process_order(rng.choice(recipe_names), 1, assign=False),
+        "deduct_ingredients": lambda: database.deduct_ingredients(rng.choice(recipe_names), 1),
+        "save_changes": lambda: database.save_changes(),
+        "add_order": add_order,
+    }
+    return {
+        "venue": {"tables": halls * tables, "recipes": recipes, "ingredients": ingredients, "warehouses": warehouses},
+        "seconds": {name: measure(operation, min_time, repeat) for name, operation in operations.items()},
+    }
+
+
+def cpu_model():
+    """Модель процессора: из /proc/cpuinfo в Linux, иначе platform.processor()."""
+    try:
+        with open("/proc/cpuinfo", 'r', encoding='utf-8') as file:
+            for line in file:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor()
+
+
+def machine_info():
+    """Процессор и интерпретатор, на которых сняты результаты (имя хоста не важно для скорости)."""
+    return {
+        "machine": platform.machine(),
+        "processor": cpu_model(),
+        "cpu_count": os.cpu_count(),
+        "system": platform.system(),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+    }
+
+
+def compare(results, baseline, max_regression):
+    """Список замедлений относительно эталона больше max_regression (доля)."""
+    regressions = []
+    for size, result in results.items():
+        for name, seconds in result["seconds"].items():
+            reference = baseline.get(size, {}).get("seconds", {}).get(name)
+            if reference and seconds > reference * (1 + max_regression):
+                regressions.append((size, name, reference, seconds))
+    return regressions
+
+
+def scaling(results, base_size):
+    """Время операций каждого размера, делённое на время на размере base_size."""
+    base = results[base_size]["seconds"]
+    return {size: {"seconds": {name: seconds / base[name] for name, seconds in result["seconds"].items()
+                               if base.get(name)}}
+            for size, result in results.items() if size != base_size}
+
+
+def compare_scaling(results, baseline, max_regression):
+    """Как compare, но для роста времени с размером; None, если общих размеров меньше двух."""
+    common = [size for size in SIZES if size in results and size in baseline]
+    if len(common) < 2:
+        return None
+    base_size = common[0]
+    current = scaling({size: results[size] for size in common}, base_size)
+    reference = scaling({size: baseline[size] for size in common}, base_size)
+    return compare(current, reference, max_regression)
+
+
+def format_time(seconds):
+    if seconds >= 1:
+        return f"{seconds:.2f}s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f}ms"
+    return f"{seconds * 1e6:.1f}us"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scaling microbenchmarks of the database and process manager")
+    parser.add_argument("--sizes", default=",".join(SIZES), help=f"Размеры через запятую из {', '.join(SIZES)}")
+    parser.add_argument("--min-time", type=float, default=0.05, help="Минимальная длительность серии, секунды")
+    parser.add_argument("--repeat", type=int, default=15, help="Серий на операцию (берётся медиана)")
+    parser.add_argument("--output", help="Сохранить результаты в JSON")
+    parser.add_argument("--save-baseline", help="Сохранить результаты как эталон")
+    parser.add_argument("--baseline", help="Сравнить с эталоном из JSON")
+    parser.add_argument("--max-regression", type=float, default=0.5,
+                        help="Допустимое замедление относительно эталона (0.5 = 50%%)")
+    args = parser.parse_args()
+
+    sizes = args.sizes.split(",")
+    workdir = tempfile.mkdtemp(prefix="bench-hot-")
+    try:
+        results = {size: bench_size(size, workdir, args.min_time, args.repeat) for size in sizes}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    operations = list(next(iter(results.values()))["seconds"])
+    print(f"{'operation':<30}" + "".join(f"{size + ' (' + str(results[size]['venue']['tables']) + ' tables)':>22}"
+                                         for size in sizes))
+    for name in operations:
+        print(f"{name:<30}" + "".join(f"{format_time(results[size]['seconds'][name]):>22}" for size in sizes))
+
+    machine = machine_info()
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as file:
+                json.dump({"machine": machine, "sizes": results}, file, indent=2)
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)
+        if baseline.get("machine") == machine:
+            regressions = compare(results, baseline["sizes"], args.max_regression)
+            for size, name, reference, seconds in regressions:
+                print(f"REGRESSION {size}/{name}: {format_time(reference)} -> {format_time(seconds)} "
+                      f"(+{(seconds / reference - 1) * 100:.0f}%)")
+        else:
+            print(f"Baseline {args.baseline} was recorded on another CPU or Python "
+                  f"({baseline.get('machine')}); comparing scaling with venue size only")
+            regressions = compare_scaling(results, baseline.get("sizes", {}), args.max_regression)
+            if regressions is None:
+                print("Skipped: at least two sizes shared with the baseline are needed to compare scaling")
+                return 0
+            for size, name, reference, ratio in regressions:
+                print(f"REGRESSION {size}/{name}: {reference:.1f}x -> {ratio:.1f}x of the smallest size "
+                      f"(+{(ratio / reference - 1) * 100:.0f}%)")
+        if regressions:
+            return 1
+        print(f"No regressions over {args.max_regression:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
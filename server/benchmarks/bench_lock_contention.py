@@ -0,0 +1,140 @@
+# Бенчмарк: пропускная способность базы при росте числа потоков запросов
+#
+# Потоки вперемешку бронируют и освобождают столы случайных залов и
+# принимают заказы случайных рецептов. Сравниваются одна общая блокировка
+# (как было раньше) и полосатые блокировки по залам и ингредиентам.
+# Каждая операция, как запрос с persist(durable=True), ждёт, пока её
+# изменение попадёт в MutationJournal на диске; fsync дополнительно длится
+# --io-ms. В прежней схеме запись шла под общей блокировкой, поэтому на
+# каждую операцию приходился свой fsync. С полосами изменение только
+# попадает в буфер журнала под блокировкой своих данных, а flush() идёт
+# после их освобождения: пока один поток ждёт fsync, другие меняют свои
+# залы и ингредиенты, и следующий fsync уносит их записи пачкой. Без
+# ввода-вывода (--io-ms 0, журнала нет) операции упираются в GIL. Запуск из корня:
+#     python server/benchmarks/bench_lock_contention.py [--threads 1,2,4,8,16] [--io-ms 0.2]
+import argparse
+import contextlib
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+from database import RestaurantDatabase  # noqa: E402
+from journal import MutationJournal  # noqa: E402
+from venue import write_venue  # noqa: E402
+
+
+class GlobalLockDatabase(RestaurantDatabase):
+    """Прежняя схема: все изменения под одной блокировкой базы."""
+
+    def __init__(self, *args, **kwargs):
+        self.global_lock = threading.RLock()
+        super().__init__(*args, **kwargs)
+
+    def reserve_table(self, hall_id, table_id):
+        with self.global_lock:
+            return super().reserve_table(hall_id, table_id)
+
+    def release_table(self, hall_id, table_id):
+        with self.global_lock:
+            return super().release_table(hall_id, table_id)
+
+    def process_order(self, recipe_name, quantity, order_id=None, assign=True):
+        with self.global_lock:
+            return super().process_order(recipe_name, quantity, order_id, assign)
+
+
+class SlowDiskJournal(MutationJournal):
+    """Журнал, у которого каждый fsync длится ещё io_delay секунд."""
+
+    def __init__(self, database, io_delay):
+        super().__init__(database)
+        self.io_delay = io_delay
+
+    def _sync_locked(self):
+        self._drain_locked()
+        if self.pending_sync:
+            time.sleep(self.io_delay)
+        super()._sync_locked()
+
+
+def measure(database_class, config_file, threads, seconds, io_delay):
+    # Своя копия конфигурации: журнал при закрытии пишет в неё снимок
+    run_file = f"{config_file}.{database_class.__name__}.{threads}.json"
+    shutil.copyfile(config_file, run_file)
+    database = database_class(run_file)
+    journal = SlowDiskJournal(database, io_delay).start() if io_delay else None
+    # Прежняя схема держит общую блокировку и на время записи
+    request_lock = getattr(database, "global_lock", None) or contextlib.nullcontext()
+    hall_ids = [hall.id for hall in database.halls]
+    recipe_names = [recipe.name for recipe in database.recipes]
+    counts = [0] * threads
+    stop = threading.Event()
+
+    def worker(index):
+        rng = random.Random(index)
+        while not stop.is_set():
+            with request_lock:
+                if rng.random() < 0.5:
+                    hall_id = rng.choice(hall_ids)
+                    table_id = rng.randint(1, len(database.get_hall(hall_id).tables))
+                    if not database.reserve_table(hall_id, table_id):
+                        database.release_table(hall_id, table_id)
+                else:
+                    database.process_order(rng.choice(recipe_names), 1, assign=False)
+                if journal is not None:
+                    journal.flush()
+            counts[index] += 1
+
+    workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    for thread in workers:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in workers:
+        thread.join()
+    if journal is not None:
+        journal.close()
+
+    # Параллельные изменения не должны нарушить согласованность индексов
+    stock = database.stock
+    assert np.allclose(stock.totals, stock.stock.sum(axis=0)), "stock totals diverged"
+    for hall in database.halls:
+        indexed = sum(len(ids) for ids in hall.tables_by_status.values())
+        assert indexed == len(hall.tables), "table status index diverged"
+    return sum(counts) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Global lock vs lock striping throughput")
+    parser.add_argument("--threads", default="1,2,4,8,16", help="Числа потоков через запятую")
+    parser.add_argument("--seconds", type=float, default=1.0, help="Длительность замера")
+    parser.add_argument("--io-ms", type=float, default=0.2, help="Задержка записи изменения, мс")
+    parser.add_argument("--halls", type=int, default=32)
+    parser.add_argument("--ingredients", type=int, default=64)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-locks-")
+    try:
+        config_file = write_venue(os.path.join(workdir, "config.json"), args.halls, 20, args.ingredients,
+                                  args.ingredients, 4)
+
+        print(f"{'threads':>7} {'global, ops/s':>14} {'striped, ops/s':>15} {'speedup':>8}")
+        for threads in (int(value) for value in args.threads.split(",")):
+            single = measure(GlobalLockDatabase, config_file, threads, args.seconds, args.io_ms / 1000)
+            striped = measure(RestaurantDatabase, config_file, threads, args.seconds, args.io_ms / 1000)
+            print(f"{threads:>7} {single:>14.0f} {striped:>15.0f} {striped / single:>7.1f}x")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# Бенчмарк: десятки тысяч одновременных заказов в движках threads и asyncio
+#
+# Заказы отправляются из нескольких потоков (как из обработчиков Flask),
+# замеряются задержка приёма заказа, число потоков процесса и время до
+# доставки последнего заказа. Длительность этапов сокращена в --speedup раз,
+# склад не ограничен. Запуск из корня репозитория:
+#     python server/benchmarks/bench_order_engines.py [--orders 20000] [--staff 2000]
+import argparse
+import os
+import sys
+import threading
+import time
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+from async_engine import AsyncProcessManager  # noqa: E402
+from database import RestaurantDatabase  # noqa: E402
+from process_manager import ProcessManager  # noqa: E402
+from simulation import percentile, set_staffing  # noqa: E402
+
+
+def measure(manager_class, orders, staff, speedup, clients):
+    database = RestaurantDatabase(os.path.join(SERVER_DIR, "config.json"))
+    set_staffing(database, {"chef": staff, "waiter": staff})
+    database.stock.fill(float("inf"))
+    for recipe in database.recipes:
+        recipe.complexity /= speedup
+    manager = manager_class(database, verbose=False)
+    manager.start()
+
+    latencies = []
+    peak_threads = threading.active_count()
+    recipes = [recipe.name for recipe in database.recipes]
+
+    def client(count):
+        for number in range(count):
+            started = time.perf_counter()
+            manager.add_order(recipes[number % len(recipes)], 1)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(orders // clients,)) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    while manager.orders:
+        peak_threads = max(peak_threads, threading.active_count())
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    manager.stop(timeout=5)
+    return {
+        "p50_ms": percentile(latencies, 0.5),
+        "p99_ms": percentile(latencies, 0.99),
+        "threads": peak_threads,
+        "elapsed": elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Threads vs asyncio order engine under load")
+    parser.add_argument("--orders", type=int, default=20000, help="Число заказов")
+    parser.add_argument("--staff", type=int, default=2000, help="Поваров и официантов (каждых)")
+    parser.add_argument("--speedup", type=float, default=100.0, help="Во сколько раз сократить этапы")
+    parser.add_argument("--clients", type=int, default=8, help="Число потоков, отправляющих заказы")
+    args = parser.parse_args()
+
+    print(f"{'engine':<8} {'p50, ms':>9} {'p99, ms':>9} {'threads':>8} {'total, s':>9}")
+    for name, manager_class in (("threads", ProcessManager), ("asyncio", AsyncProcessManager)):
+        result = measure(manager_class, args.orders, args.staff, args.speedup, args.clients)
+        print(f"{name:<8} {result['p50_ms']:>9.3f} {result['p99_ms']:>9.3f} {result['threads']:>8} {result['elapsed']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
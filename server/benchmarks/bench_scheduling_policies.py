@@ -0,0 +1,62 @@
+# Бенчмарк: политики распределения заказов на дискретно-событийной модели
+#
+# Один и тот же поток заказов прогоняется через ProcessManager с каждой
+# политикой из scheduling.POLICIES на виртуальных часах. Персонал
+# неоднородный (--chefs и --waiters - производительности через запятую),
+# склад не ограничен. Результаты усредняются по --seeds потокам. Запуск из корня:
+#     python server/benchmarks/bench_scheduling_policies.py [--orders 2000] [--interval 12]
+import argparse
+import os
+import statistics
+import sys
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+from database import Employee, RestaurantDatabase  # noqa: E402
+from scheduling import POLICIES  # noqa: E402
+from simulation import KitchenSimulation, random_stream  # noqa: E402
+
+
+def parse_performances(text):
+    return [float(value) for value in text.split(",")]
+
+
+def run(policy, config_file, chefs, waiters, orders, interval, seed):
+    database = RestaurantDatabase(config_file)
+    staff = [("chef", performance) for performance in chefs] + [("waiter", performance) for performance in waiters]
+    database.set_employees([
+        Employee(number, f"{role.capitalize()} {number}", role, performance)
+        for number, (role, performance) in enumerate(staff, start=1)
+    ])
+    database.stock.fill(float("inf"))
+    simulation = KitchenSimulation(database, seed=seed, policy=policy)
+    for at, recipe_name, quantity in random_stream(database, orders, interval, seed):
+        simulation.submit(at, recipe_name, quantity)
+    return simulation.run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Makespan and latency of scheduling policies")
+    parser.add_argument("--config", default=os.path.join(SERVER_DIR, "config.json"))
+    parser.add_argument("--chefs", type=parse_performances, default=[0.5, 1.0, 1.0, 2.0])
+    parser.add_argument("--waiters", type=parse_performances, default=[1.0, 3.0])
+    parser.add_argument("--orders", type=int, default=2000, help="Заказов в потоке")
+    parser.add_argument("--interval", type=float, default=12.0, help="Средний интервал между заказами")
+    parser.add_argument("--seeds", type=int, default=5, help="Сколько потоков усреднять")
+    args = parser.parse_args()
+
+    print(f"{'policy':<20} {'makespan':>10} {'mean latency':>13} {'p90 latency':>12}")
+    for name in POLICIES:
+        reports = [
+            run(name, args.config, args.chefs, args.waiters, args.orders, args.interval, seed)
+            for seed in range(1, args.seeds + 1)
+        ]
+        makespan = statistics.mean(report["makespan"] for report in reports)
+        mean_latency = statistics.mean(report["mean_latency"] for report in reports)
+        p90_latency = statistics.mean(report["p90_latency"] for report in reports)
+        print(f"{name:<20} {makespan:>10.0f} {mean_latency:>13.1f} {p90_latency:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
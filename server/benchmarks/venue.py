@@ -0,0 +1,47 @@
+# Синтетические конфигурации заведений для бенчмарков
+import json
+import random
+
+
+def generate_venue(halls, tables, ingredients, recipes, warehouses, seed=1, recipe_ingredients=2, chefs=1, waiters=1):
+    """Синтетическая конфигурация заведения заданного размера (tables - столов в каждом зале).
+
+    Склады хранят все ингредиенты в практически неисчерпаемом количестве,
+    поэтому заказы в бенчмарках не упираются в остатки.
+    """
+    rng = random.Random(seed)
+    return {
+        "halls": [
+            {"id": h, "name": f"Hall {h}", "tables": [{"id": t, "status": "free"} for t in range(1, tables + 1)]}
+            for h in range(1, halls + 1)
+        ],
+        "ingredients": [{"id": i, "name": f"Ingredient {i}", "unit": "g"} for i in range(1, ingredients + 1)],
+        "recipes": [
+            {
+                "id": r, "name": f"Recipe {r}", "complexity": rng.randint(1, 5), "price": rng.randint(5, 50),
+                "ingredients": [
+                    {"ingredient_id": i, "amount": rng.randint(1, 5)}
+                    for i in rng.sample(range(1, ingredients + 1), min(recipe_ingredients, ingredients))
+                ],
+            }
+            for r in range(1, recipes + 1)
+        ],
+        "warehouses": [
+            {
+                "id": w, "name": f"Warehouse {w}",
+                "ingredients": [{"ingredient_id": i, "amount": 10 ** 9} for i in range(1, ingredients + 1)],
+            }
+            for w in range(1, warehouses + 1)
+        ],
+        "employees": [
+            {"id": n, "name": f"{role.capitalize()} {n}", "role": role, "performance": 1.0}
+            for n, role in enumerate(["chef"] * chefs + ["waiter"] * waiters, start=1)
+        ],
+    }
+
+
+def write_venue(path, *args, **kwargs):
+    """Сгенерировать конфигурацию и записать её в файл path."""
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(generate_venue(*args, **kwargs), file)
+    return path
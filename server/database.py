@@ -1,23 +1,63 @@
 # Логика работы с данными
-import json
+import itertools
+import threading
+from contextlib import contextmanager
+from locking import LockStripes
+from logs import get_logger
+from pipeline import Pipeline
+from scheduling import EmployeeLoadIndex, OrderQueue, order_work
+from stock import StockMatrix
+from storage import JsonFileStorage
+
+logger = get_logger("database")
+
+
 # Класс для отображения заллов
 class Hall:
     def __init__(self, hall_id, name, tables):
         self.id = hall_id
         self.name = name
-        self.tables = tables  # Список объектов Table
+        self.tables = []  # Список объектов Table
+        self.tables_by_id = {}  # Индекс столов по ID
+        self.tables_by_status = {}  # Вторичный индекс: статус -> множество ID столов
+        for table in tables:
+            self.add_table(table)
+
+    #Добавить столик и обновить индексы
+    def add_table(self, table):
+        table.hall = self
+        self.tables.append(table)
+        self.tables_by_id[table.id] = table
+        self.tables_by_status.setdefault(table.status, set()).add(table.id)
+
     #Найти столик по ID
     def get_table(self, table_id):
-        
-        return next((table for table in self.tables if table.id == table_id), None)
+        return self.tables_by_id.get(table_id)
+
+    #Вернуть ID столов с указанным статусом
+    def get_tables_by_status(self, status):
+        return self.tables_by_status.get(status, set())
+
+    # Вызывается столом при смене статуса, чтобы поддерживать вторичный индекс
+    def _on_table_status_change(self, table, old_status, new_status):
+        table_ids = self.tables_by_status.get(old_status)
+        if table_ids is not None:
+            table_ids.discard(table.id)
+            if not table_ids:
+                del self.tables_by_status[old_status]
+        self.tables_by_status.setdefault(new_status, set()).add(table.id)
 
 # класс для отображения столов    
 class Table:
     def __init__(self, id, status):
         self.id = id
         self.status = status
+        self.hall = None  # Зал, которому принадлежит стол (заполняется в Hall.add_table)
     def set_status(self, status):
+        old_status = self.status
         self.status = status
+        if self.hall is not None and old_status != status:
+            self.hall._on_table_status_change(self, old_status, status)
 
 #Класс для ингридиентов
 class Ingredient:
@@ -28,20 +68,43 @@ class Ingredient:
 
 # Класс для представления рецепта
 class Recipe:
-    def __init__(self, id, name, ingredients, complexity, prise):
+    def __init__(self, id, name, ingredients, complexity, prise, batch_factor=None):
         self.id = id
         self.name = name
         self.ingredients = ingredients  # Список (ingredient_id, amount)
         self.complexity = complexity
-        self.prise = prise
+        self.price = prise
+        # Доля времени, которую добавляет каждая следующая порция при готовке партией
+        # (None - по умолчанию для менеджера процессов, 1 - партии не дают выигрыша)
+        self.batch_factor = batch_factor
+
+    @property
+    def work(self):
+        # Работа заказа у сотрудника с производительностью 1: 10 минут на единицу сложности
+        return self.complexity * 10
 
 # Класс для представления склада
 class Warehouse:
     def __init__(self, id, name, ingredients):
         self.id = id
         self.name = name
+        self.stock = None  # Общая матрица остатков (заполняется базой после загрузки)
         self.ingredients = ingredients  # Список (ingredient_id, amount)
 
+    # Остатки хранятся в матрице базы; список строится по запросу
+    @property
+    def ingredients(self):
+        if self.stock is None:
+            return self._ingredients
+        return self.stock.warehouse_items(self.id)
+
+    @ingredients.setter
+    def ingredients(self, ingredients):
+        self._ingredients = list(ingredients)
+        if self.stock is not None:
+            for ingredient_id, amount in self._ingredients:
+                self.stock.set(self.id, ingredient_id, amount)
+
 # клсасс персонала
 class Employee:
     def __init__(self, id, name, role, performance):
@@ -49,17 +112,34 @@ class Employee:
         self.name = name
         self.role = role
         self.performance = performance
-        self.orders = []  # Стек заказов
+        self.orders = OrderQueue()  # Очередь заказов с индексом по ID
+        self.queued_work = 0.0  # Суммарная работа заказов в очереди (см. scheduling.order_work)
+        self.on_load_change = None  # Вызывается при изменении нагрузки (обновляет индекс базы)
+
+    def _load_changed(self):
+        if self.on_load_change is not None:
+            self.on_load_change(self)
 
     def assign_order(self, order):
         """Добавить заказ в стек."""
         self.orders.append(order)
-
-    def complete_order(self):
-        """Удалить выполненный заказ из стека."""
-        if self.orders:
-            return self.orders.pop(0)
-        return None
+        self.queued_work += order_work(order)
+        self._load_changed()
+
+    def complete_order(self, order_id=None):
+        """Удалить выполненный заказ из очереди: указанный по ID или первый."""
+        if order_id is None:
+            order = self.orders.popleft()
+        else:
+            order = self.orders.remove(order_id)
+        if order is not None:
+            self.queued_work = max(self.queued_work - order_work(order), 0.0) if self.orders else 0.0
+            self._load_changed()
+        return order
+
+    def cancel_order(self, order_id):
+        """Снять заказ с сотрудника, где бы в очереди он ни находился."""
+        return self.complete_order(order_id)
 
     def get_load(self):
         """Вернуть количество заказов в стеке."""
@@ -67,22 +147,65 @@ class Employee:
 
 # Класс для работы с базой данных
 class RestaurantDatabase:
-    def __init__(self, config_file):
+    def __init__(self, config_file=None, storage=None):
+        # По умолчанию состояние хранится в одном JSON-файле
+        if storage is None:
+            storage = JsonFileStorage(config_file)
+        self.storage = storage
         self.config_file = config_file
+        # Порядок блокировок (захватываются только в этом порядке):
+        #   lock -> hall_locks -> stock_locks (по возрастанию полосы) -> кучи EmployeeLoadIndex
+        #   -> блокировки подписчиков на изменения (журнал, запись на диск)
+        # lock защищает структуру (загрузка, reload, замена персонала); обычные операции
+        # его не берут. Бронь стола берёт полосу своего зала, заказ - полосы ингредиентов
+        # рецепта. Изменение и его номер в журнале выдаются под одной полосой, а снимок
+        # делается под exclusive(), поэтому снимок никогда не расходится с журналом.
+        # Подписчики под полосой ввода-вывода не делают: журнал лишь буферизует запись.
+        self.lock = threading.RLock()
+        self.hall_locks = LockStripes()
+        self.stock_locks = LockStripes()
+        self.mutation_listeners = []  # Подписчики на изменения (журнал, запись на диск)
+        self.journal_seq = 0  # Номер последней записи журнала, вошедшей в загруженный снимок
+        self._order_ids = itertools.count(1)  # Единый источник ID заказов процесса
+        self._reset()
+        self.load_data()
+
+    # Очистить данные и индексы
+    def _reset(self):
         self.halls = []
         self.ingredients = []
         self.recipes = []
         self.warehouses = []
         self.employees = []  # Добавляем сотрудников
-        self.load_data(config_file)
-
-    def load_data(self, config_file):
-        with open(config_file, 'r') as file:
-            data = json.load(file)
+        # Первичные индексы по ID и по имени
+        self.halls_by_id = {}
+        self.halls_by_name = {}
+        self.ingredients_by_id = {}
+        self.ingredients_by_name = {}
+        self.recipes_by_id = {}
+        self.recipes_by_name = {}
+        self.warehouses_by_id = {}
+        self.warehouses_by_name = {}
+        self.employees_by_id = {}
+        self.employees_by_name = {}
+        self.employees_by_role = {}  # Роль -> список сотрудников
+        self.employee_loads = EmployeeLoadIndex()  # Кучи по ролям для выбора наименее загруженного
+        # Матрица остатков и скомпилированные векторы потребности рецептов
+        self.stock = None
+        self.recipe_requirements = {}
+        self.pipeline = Pipeline.from_config(None)  # Этапы заказа и роли их исполнителей
+
+    def load_data(self, config_file=None):
+        if config_file is not None:
+            data = JsonFileStorage(config_file).load()
+        else:
+            data = self.storage.load()
+        self.journal_seq = data.get("journal_seq", 0)
         
-       
+        # Сбрасываем ранее загруженные данные и индексы, чтобы повторная загрузка не дублировала объекты
+        self._reset()
+
         # Загрузка залов
-        self.halls = []
         for hall_data in data.get("halls", []):
             try:
                 hall_id = hall_data["id"]  # Проверяем, что есть id для зала
@@ -97,17 +220,20 @@ class RestaurantDatabase:
                         status = table_data["status"]  # Проверяем статус стола
                         tables.append(Table(id=table_id, status=status))
                     except KeyError as e:
-                        print(f"Warning: Missing key {e} in table data: {table_data}")
+                        logger.warning(f"Missing key {e} in table data: {table_data}")
 
                 # Создаем объект зала
                 hall = Hall(hall_id=hall_id, name=name, tables=tables)
-                self.halls.append(hall)
+                self.add_hall(hall)
 
             except KeyError as e:
-                print(f"Warning: Missing key {e} in hall data: {hall_data}")
+                logger.warning(f"Missing key {e} in hall data: {hall_data}")
 
 
             
+        # Конвейер заказа; менеджер процессов берёт его при создании
+        self.pipeline = Pipeline.from_config(data.get("pipeline"))
+
         # Загрузка сотрудников
         for employee_data in data["employees"]:
             employee = Employee(
@@ -116,7 +242,7 @@ class RestaurantDatabase:
                 employee_data["role"],
                 employee_data["performance"]
             )
-            self.employees.append(employee)
+            self.add_employee(employee)
 
         # Загружаем ингредиенты
         for ingredient_data in data["ingredients"]:
@@ -125,7 +251,7 @@ class RestaurantDatabase:
                 ingredient_data["name"],
                 ingredient_data["unit"]
             )
-            self.ingredients.append(ingredient)
+            self.add_ingredient(ingredient)
 
         # Загружаем рецепты
         for recipe_data in data["recipes"]:
@@ -137,10 +263,10 @@ class RestaurantDatabase:
                 recipe_data["name"],
                 ingredients,
                 recipe_data["complexity"],
-                recipe_data["price"]
-                
+                recipe_data["price"],
+                recipe_data.get("batch_factor")
             )
-            self.recipes.append(recipe)
+            self.add_recipe(recipe)
 
         # Загружаем склады
         for warehouse_data in data["warehouses"]:
@@ -152,7 +278,162 @@ class RestaurantDatabase:
                 warehouse_data["name"],
                 ingredients
             )
-            self.warehouses.append(warehouse)
+            self.add_warehouse(warehouse)
+
+        self._build_stock()
+
+    # Построить матрицу остатков по складам и векторы потребности рецептов
+    def _build_stock(self):
+        # Текущие остатки (из файла или из прежней матрицы при перестройке)
+        warehouse_items = {warehouse.id: warehouse.ingredients for warehouse in self.warehouses}
+        ingredient_ids = [ingredient.id for ingredient in self.ingredients]
+        known = set(ingredient_ids)
+        # Ингредиенты, которые встречаются только на складах или в рецептах, тоже получают столбец
+        for items in list(warehouse_items.values()) + [recipe.ingredients for recipe in self.recipes]:
+            for ingredient_id, _ in items:
+                if ingredient_id not in known:
+                    known.add(ingredient_id)
+                    ingredient_ids.append(ingredient_id)
+        stock = StockMatrix([warehouse.id for warehouse in self.warehouses], ingredient_ids)
+        for warehouse in self.warehouses:
+            for ingredient_id, amount in warehouse_items[warehouse.id]:
+                stock.set(warehouse.id, ingredient_id, amount)
+            warehouse.stock = stock
+        self.stock = stock
+        self.recipe_requirements = {
+            recipe.name: stock.requirement_vector(recipe.ingredients) for recipe in self.recipes
+        }
+
+    # Добавление объектов с обновлением индексов
+    def add_hall(self, hall):
+        self.halls.append(hall)
+        self.halls_by_id[hall.id] = hall
+        self.halls_by_name[hall.name] = hall
+
+    def add_employee(self, employee):
+        self.employees.append(employee)
+        self.employees_by_id[employee.id] = employee
+        self.employees_by_name[employee.name] = employee
+        self.employees_by_role.setdefault(employee.role, []).append(employee)
+        employee.on_load_change = self.employee_loads.refresh
+        self.employee_loads.add(employee)
+
+    # Заменить весь персонал (используется при моделировании разных вариантов штата)
+    def set_employees(self, employees):
+        with self.exclusive():
+            self.employees = []
+            self.employees_by_id = {}
+            self.employees_by_name = {}
+            self.employees_by_role = {}
+            self.employee_loads = EmployeeLoadIndex()
+            for employee in employees:
+                self.add_employee(employee)
+
+    def add_ingredient(self, ingredient):
+        self.ingredients.append(ingredient)
+        self.ingredients_by_id[ingredient.id] = ingredient
+        self.ingredients_by_name[ingredient.name] = ingredient
+        if self.stock is not None:
+            self._build_stock()
+
+    def add_recipe(self, recipe):
+        self.recipes.append(recipe)
+        self.recipes_by_id[recipe.id] = recipe
+        self.recipes_by_name[recipe.name] = recipe
+        if self.stock is not None:
+            self._build_stock()
+
+    def add_warehouse(self, warehouse):
+        self.warehouses.append(warehouse)
+        self.warehouses_by_id[warehouse.id] = warehouse
+        self.warehouses_by_name[warehouse.name] = warehouse
+        if self.stock is not None:
+            self._build_stock()
+
+    # Подписаться на изменения состояния. Слушатель получает словарь вида
+    # {"op": "reserve", "hall_id": 1, "table_id": 3}
+    def add_mutation_listener(self, listener):
+        self.mutation_listeners.append(listener)
+
+    def remove_mutation_listener(self, listener):
+        if listener in self.mutation_listeners:
+            self.mutation_listeners.remove(listener)
+
+    # Захватить все блокировки базы: никакие изменения не идут, пока она удерживается
+    @contextmanager
+    def exclusive(self):
+        with self.lock, self.hall_locks.hold_all(), self.stock_locks.hold_all():
+            yield
+
+    # Захватить полосы ингредиентов, которые используют рецепты
+    @contextmanager
+    def _stock_locked(self, recipe_names):
+        while True:
+            stock = self.stock
+            ingredient_ids = []
+            for recipe_name in recipe_names:
+                recipe = self.get_recipe_by_name(recipe_name)
+                if recipe:
+                    ingredient_ids.extend(ingredient_id for ingredient_id, _ in recipe.ingredients)
+            with self.stock_locks.hold(ingredient_ids):
+                # Пока ждали, склад могли перестроить (reload) с другим составом рецептов
+                if self.stock is stock:
+                    yield
+                    return
+
+    # Сообщить подписчикам об изменении; вызывается под полосой изменённых данных.
+    # Подписчики из разных полос вызываются параллельно и должны быть потокобезопасны
+    def _record_mutation(self, op, **fields):
+        if not self.mutation_listeners:
+            return
+        record = {"op": op}
+        record.update(fields)
+        for listener in self.mutation_listeners:
+            listener(record)
+
+    # Применить запись журнала без повторной публикации (используется при восстановлении)
+    def apply_mutation(self, record):
+        op = record["op"]
+        if op == "reserve" or op == "release":
+            with self.hall_locks.for_key(record["hall_id"]):
+                table = self.get_table(record["hall_id"], record["table_id"])
+                if table:
+                    table.set_status("reserved" if op == "reserve" else "free")
+        elif op in ("deduct", "order", "order_batch"):
+            # Сами заказы не хранятся в снимке; в журналах до объединения записей
+            # у "order" нет changes - списание шло отдельной записью "deduct"
+            changes = record.get("changes", ())
+            with self.stock_locks.hold(ingredient_id for _, ingredient_id, _ in changes):
+                for warehouse_id, ingredient_id, amount in changes:
+                    self.stock.adjust(warehouse_id, ingredient_id, -amount)
+        else:
+            raise ValueError(f"Unknown mutation: {op}")
+
+    # Перечитать файл конфигурации, сохранив стеки заказов сотрудников
+    def reload(self):
+        with self.exclusive():
+            previous = dict(self.employees_by_id)
+            # Конвейер меняется только перезапуском: в работе заказы на его этапах
+            pipeline = self.pipeline
+            self.load_data()
+            self.pipeline = pipeline
+            # Заказы в работе держат ссылки на прежние объекты сотрудников и по ним
+            # завершаются, поэтому оставшиеся сотрудники остаются теми же объектами:
+            # обновляются только поля из конфигурации, а нагрузка попадает в новый индекс
+            loaded = self.employees
+            self.employees = []
+            self.employees_by_id = {}
+            self.employees_by_name = {}
+            self.employees_by_role = {}
+            self.employee_loads = EmployeeLoadIndex()
+            for employee in loaded:
+                current = previous.get(employee.id)
+                if current is not None:
+                    current.name = employee.name
+                    current.role = employee.role
+                    current.performance = employee.performance
+                    employee = current
+                self.add_employee(employee)
 
     #вернуть все залы
     def get_halls(self):
@@ -160,80 +441,90 @@ class RestaurantDatabase:
 
     #вернуть зал по ID
     def get_hall(self, hall_id):
-        return next((hall for hall in self.halls if hall.id == hall_id), None)
+        return self.halls_by_id.get(hall_id)
     
     #вернуть зал по имени
     def get_hall_by_name(self, name):
-        # Находит и возвращает зал по имени
-        for hall in self.halls:
-            if hall.name == name:
-                return hall
-        return None  # Если зал с таким именем не найден
+        return self.halls_by_name.get(name)  # None, если зал с таким именем не найден
 
     #вернуть стол в определенном зале с определеннымм индексом
     def get_table(self, hall_id, table_id):
         hall = self.get_hall(hall_id)
+        if not hall:
+            return None
         return hall.get_table(table_id)
+
+    #вернуть ID столов зала с указанным статусом (по вторичному индексу, без перебора)
+    def get_tables_by_status(self, hall_id, status):
+        hall = self.get_hall(hall_id)
+        if not hall:
+            return None
+        with self.hall_locks.for_key(hall_id):
+            return sorted(hall.get_tables_by_status(status))
+
+    #вернуть ID свободных столов зала
+    def get_free_tables(self, hall_id):
+        return self.get_tables_by_status(hall_id, "free")
     
     #резервируем стол
     def reserve_table(self, hall_id, table_id):
-        hall = self.get_hall(hall_id)
-        if hall:
-            table = hall.get_table(table_id)
-            if table and table.status == "free":
-                table.set_status("reserved")
-                return True
-        return False
+        with self.hall_locks.for_key(hall_id):
+            hall = self.get_hall(hall_id)
+            if hall:
+                table = hall.get_table(table_id)
+                if table and table.status == "free":
+                    table.set_status("reserved")
+                    self._record_mutation("reserve", hall_id=hall_id, table_id=table_id)
+                    return True
+            return False
 
     def release_table(self, hall_id, table_id):
-        hall = self.get_hall(hall_id)
-        if hall:
-            table = hall.get_table(table_id)
-            if table and table.status == "reserved":
-                table.set_status("free")
-                return True
-        return False
+        with self.hall_locks.for_key(hall_id):
+            hall = self.get_hall(hall_id)
+            if hall:
+                table = hall.get_table(table_id)
+                if table and table.status == "reserved":
+                    table.set_status("free")
+                    self._record_mutation("release", hall_id=hall_id, table_id=table_id)
+                    return True
+            return False
     
 
     # Получить ингредиент по ID
     def get_ingredient_by_id(self, ingredient_id):
-        for ingredient in self.ingredients:
-            if ingredient.id == ingredient_id:
-                return ingredient
-        return None
+        return self.ingredients_by_id.get(ingredient_id)
 
     # Получить рецепт по имени
     def get_recipe_by_name(self, recipe_name):
-        for recipe in self.recipes:
-            if recipe.name == recipe_name:
-                return recipe
-        return None
+        return self.recipes_by_name.get(recipe_name)
 
     # Получить склад по ID
     def get_warehouse_by_id(self, warehouse_id):
-        for warehouse in self.warehouses:
-            if warehouse.id == warehouse_id:
-                return warehouse
-        return None
+        return self.warehouses_by_id.get(warehouse_id)
+
+    # Получить сотрудника по ID
+    def get_employee_by_id(self, employee_id):
+        return self.employees_by_id.get(employee_id)
 
-    # Проверить, достаточно ли ингредиентов для рецепта
+    # Проверить, достаточно ли ингредиентов для рецепта (суммарно по всем складам)
     def check_ingredients_for_recipe(self, recipe_name, quantity):
-        recipe = self.get_recipe_by_name(recipe_name)
-        if recipe:
-            for ingredient_id, amount_needed in recipe.ingredients:
-                ingredient = self.get_ingredient_by_id(ingredient_id)
-                if ingredient:
-                    total_needed = amount_needed * quantity
-                    # Проверяем, есть ли нужное количество ингредиентов на складе
-                    for warehouse in self.warehouses:
-                        for warehouse_ingredient_id, warehouse_amount in warehouse.ingredients:
-                            if warehouse_ingredient_id == ingredient.id:
-                                if warehouse_amount < total_needed:
-                                    return False  # Не хватает ингредиентов
-        return True
-
-    # Обработать заказ
-    def process_order(self, recipe_name, quantity):
+        requirement = self.recipe_requirements.get(recipe_name)
+        if requirement is None:
+            return True
+        return self.stock.can_fulfil(requirement * quantity)
+
+    # Выдать новый ID заказа
+    def next_order_id(self):
+        return next(self._order_ids)
+
+    # Обработать заказ. С assign=False заказ не ставится в очередь повара:
+    # так делает ProcessManager, который назначает исполнителя сам
+    def process_order(self, recipe_name, quantity, order_id=None, assign=True):
+        # Проверка склада и списание выполняются атомарно под полосами ингредиентов рецепта
+        with self._stock_locked([recipe_name]):
+            return self._process_order(recipe_name, quantity, order_id, assign)
+
+    def _process_order(self, recipe_name, quantity, order_id, assign):
         recipe = self.get_recipe_by_name(recipe_name)
         if not recipe:
             return {"error": "Recipe not found"}
@@ -242,49 +533,118 @@ class RestaurantDatabase:
         if not self.check_ingredients_for_recipe(recipe_name, quantity):
             return {"error": "Not enough ingredients"}
 
-        # Ищем наименее загруженного повара
-        chef = self.get_least_loaded_employee("chef")
+        # Ищем наименее загруженного исполнителя первого этапа (по умолчанию повара)
+        role = self.pipeline.first.role
+        chef = self.get_least_loaded_employee(role)
         if not chef:
-            return {"error": "No available chefs"}
+            return {"error": f"No available {role}s"}
 
         # Рассчитываем время выполнения
-        base_time = recipe.complexity * 10  # 10 минут на единицу сложности
+        base_time = recipe.work
         time_to_complete = base_time / chef.performance
 
         # Вычисляем стоимость заказа
         total_cost = recipe.price * quantity
 
         # Создаём заказ
+        if order_id is None:
+            order_id = self.next_order_id()
         order = {
+            "order_id": order_id,
             "recipe_name": recipe_name,
             "quantity": quantity,
             "time_to_complete": time_to_complete,
+            "work": base_time,
             "total_cost": total_cost
         }
 
-        # Добавляем заказ в стек повара
-        chef.assign_order(order)
-
-        # Списываем ингредиенты
-        self.deduct_ingredients(recipe_name, quantity)
-        return {"status": "success", "time_to_complete": time_to_complete, "chef_id": chef.id, "total_cost": total_cost}
-
+        # Добавляем заказ в очередь повара
+        if assign:
+            chef.assign_order(order)
+
+        # Списываем ингредиенты; списание входит в запись заказа, чтобы хранилище
+        # применило их вместе (в SQLite - одной транзакцией)
+        requirement = self.recipe_requirements.get(recipe_name)
+        changes = self.stock.deduct(requirement * quantity) if requirement is not None else []
+        self._record_mutation("order", recipe_name=recipe_name, quantity=quantity, total_cost=total_cost,
+                              changes=changes)
+        return {"status": "success", "order_id": order_id, "time_to_complete": time_to_complete,
+                "work": base_time, "chef_id": chef.id, "total_cost": total_cost}
+
+
+    # Обработать чек из нескольких позиций: принимается целиком или отклоняется целиком
+    def process_order_batch(self, items, assign=True):
+        with self._stock_locked([item["recipe_name"] for item in items]):
+            recipes = []
+            for item in items:
+                recipe = self.get_recipe_by_name(item["recipe_name"])
+                if not recipe:
+                    return {"error": "Recipe not found", "recipe_name": item["recipe_name"]}
+                recipes.append(recipe)
+
+            # Суммарная потребность всего чека проверяется за один проход
+            requirement = sum(
+                self.recipe_requirements[recipe.name] * item["quantity"] for recipe, item in zip(recipes, items)
+            )
+            if not self.stock.can_fulfil(requirement):
+                return {"error": "Not enough ingredients"}
+
+            role = self.pipeline.first.role
+            if not self.get_least_loaded_employee(role):
+                return {"error": f"No available {role}s"}
+
+            # С assign=True повара назначаются здесь же: каждое назначение обновляет
+            # кучу, и следующая позиция достаётся новому наименее загруженному. С
+            # assign=False исполнителей выбирает менеджер процессов, куча не меняется,
+            # и time_to_complete - оценка по текущему наименее загруженному повару,
+            # поэтому chef_id в ответ не попадает
+            results = []
+            for recipe, item in zip(recipes, items):
+                chef = self.get_least_loaded_employee(role)
+                order_id = self.next_order_id()
+                base_time = recipe.work
+                time_to_complete = base_time / chef.performance
+                total_cost = recipe.price * item["quantity"]
+                if assign:
+                    chef.assign_order({
+                        "order_id": order_id,
+                        "recipe_name": recipe.name,
+                        "quantity": item["quantity"],
+                        "time_to_complete": time_to_complete,
+                        "work": base_time,
+                        "total_cost": total_cost
+                    })
+                result = {
+                    "order_id": order_id,
+                    "recipe_name": recipe.name,
+                    "quantity": item["quantity"],
+                    "time_to_complete": time_to_complete,
+                    "work": base_time,
+                    "total_cost": total_cost
+                }
+                if assign:
+                    result["chef_id"] = chef.id
+                results.append(result)
+
+            # Одно списание на весь чек и одна запись вместе с его заказами
+            changes = self.stock.deduct(requirement)
+            self._record_mutation("order_batch", changes=changes, orders=[
+                {"recipe_name": result["recipe_name"], "quantity": result["quantity"],
+                 "total_cost": result["total_cost"]}
+                for result in results
+            ])
+            return {"status": "success", "items": results,
+                    "total_cost": sum(result["total_cost"] for result in results)}
 
     # Списать ингредиенты с запасов
     def deduct_ingredients(self, recipe_name, quantity):
-        recipe = self.get_recipe_by_name(recipe_name)
-        if recipe:
-            for ingredient_id, amount_needed in recipe.ingredients:
-                ingredient = self.get_ingredient_by_id(ingredient_id)
-                if ingredient:
-                    total_needed = amount_needed * quantity
-                    # Списываем ингредиенты с соответствующих складов
-                    for warehouse in self.warehouses:
-                        for index, (warehouse_ingredient_id, warehouse_amount) in enumerate(warehouse.ingredients):
-                            if warehouse_ingredient_id == ingredient.id:
-                                new_amount = warehouse_amount - total_needed
-                                warehouse.ingredients[index] = (warehouse_ingredient_id, new_amount)
-        return True
+        with self._stock_locked([recipe_name]):
+            requirement = self.recipe_requirements.get(recipe_name)
+            if requirement is not None:
+                changes = self.stock.deduct(requirement * quantity)  # (warehouse_id, ingredient_id, amount)
+                if changes:
+                    self._record_mutation("deduct", changes=changes)
+            return True
     # Расчет выручки
     def get_total_revenue(self):
         return sum(recipe.price * order["quantity"] for recipe in self.recipes for order in recipe.orders)
@@ -297,20 +657,18 @@ class RestaurantDatabase:
              for emp in self.employees
     ]
     #Найти наименее загруженного сотрудника по роли.
+    #Вершина кучи роли, O(1); куча обновляется при каждом изменении нагрузки
     def get_least_loaded_employee(self, role):
-        employees = [emp for emp in self.employees if emp.role == role]
-        if not employees:
-            return None
-        return min(employees, key=lambda emp: emp.get_load())
+        return self.employee_loads.least_loaded(role)
 
 
-    #Завершить заказ для указанного сотрудника
-    def complete_order(self, employee_id):
-        employee = next((emp for emp in self.employees if emp.id == employee_id), None)
+    #Завершить заказ для указанного сотрудника (первый в очереди или указанный по ID)
+    def complete_order(self, employee_id, order_id=None):
+        employee = self.get_employee_by_id(employee_id)
         if not employee:
             return {"error": "Employee not found"}
 
-        completed_order = employee.complete_order()
+        completed_order = employee.complete_order(order_id)
         if not completed_order:
             return {"error": "No orders to complete"}
     
@@ -318,6 +676,12 @@ class RestaurantDatabase:
 
     #Сохраняет изменения в файл конфигурации.
     def save_changes(self):
+        with self.exclusive():
+            data = self.to_dict()
+        self.storage.save(data)
+
+    #Текущее состояние в формате файла конфигурации
+    def to_dict(self):
         data = {
             "halls": [
                 {
@@ -342,7 +706,8 @@ class RestaurantDatabase:
                     "ingredients": [
                         {"ingredient_id": ing_id, "amount": amount}
                         for ing_id, amount in recipe.ingredients
-                    ]
+                    ],
+                    **({"batch_factor": recipe.batch_factor} if recipe.batch_factor is not None else {}),
                 } for recipe in self.recipes
             ],
             "warehouses": [
@@ -360,8 +725,11 @@ class RestaurantDatabase:
             for emp in self.employees
         ]
         }
-        with open(self.config_file, 'w', encoding='utf-8') as file:
-            json.dump(data, file, indent=4, ensure_ascii=False)
+        if self.pipeline.configured:
+            data["pipeline"] = self.pipeline.to_config()
+        if self.journal_seq:
+            data["journal_seq"] = self.journal_seq
+        return data
 
 
 '''
@@ -0,0 +1,316 @@
+# Прогноз времени выполнения нового заказа методом Монте-Карло на NumPy
+import threading
+import time
+
+import numpy as np
+
+from scheduling import (EarliestCompletionPolicy, RoundRobinPolicy, WeightedShortestProcessingTimePolicy, order_id_of,
+                        order_work)
+
+# Шумовая величина длительности, как в ProcessManager.add_order
+NOISE_LOW, NOISE_HIGH = 0.8, 1.2
+
+
+class EtaForecaster:
+    """Прогноз времени до доставки нового заказа при текущих очередях.
+
+    Снимок очередей берётся один раз; затем samples сценариев разыгрываются
+    векторно дискретно-событийной моделью конвейера: на каждом шаге в каждом
+    сценарии обрабатывается самое раннее событие - заказ пришёл на этап или
+    доставлен. Поэтому на этапе новый заказ опережают только заказы,
+    пришедшие на этот этап раньше него. Сотрудник этапа выбирается, как это
+    сделал бы менеджер процессов: least_loaded - с наименьшим числом заказов,
+    round_robin - по кругу с текущей позиции, earliest_completion и wspt -
+    кто раньше закончит, AsyncProcessManager - кто раньше освободится.
+
+    Шум длительности каждого заказа неизвестен и разыгрывается так же, как в
+    ProcessManager.add_order (для начатого этапа - с учётом прошедшего
+    времени). Очереди сотрудников считаются FIFO; при wspt новый заказ с
+    весом quantity пропускает вперёд только ожидающие заказы с не меньшим
+    отношением веса к длительности. Длительность этапа - work / performance,
+    как в ProcessManager, и от числа порций не зависит. Заказы, которые
+    придут после нового, не моделируются; партия в очереди - одна работа.
+
+    Прогнозы кэшируются по рецепту и числу порций до изменения очередей
+    (номер версии растёт с каждым событием конвейера), но не дольше max_age секунд.
+    """
+
+    def __init__(self, manager, samples=2000, max_age=1.0, seed=None, clock=time.monotonic):
+        self.manager = manager
+        self.database = manager.database
+        self.pipeline = manager.pipeline
+        self.policy = self._policy_kind(getattr(manager, "policy", None))
+        self.samples = samples
+        self.max_age = max_age
+        self.clock = clock
+        self.random = np.random.default_rng(seed)
+        self.lock = threading.Lock()
+        self.version = 0  # Версия состояния очередей
+        self._cache = {}  # (рецепт, порции) -> (версия, момент расчёта, прогноз)
+        manager.add_event_listener(self._on_event)
+
+    @staticmethod
+    def _policy_kind(policy):
+        if policy is None:
+            return "earliest_free"  # Очередь роли в asyncio: заказ берёт первый освободившийся
+        if isinstance(policy, WeightedShortestProcessingTimePolicy):
+            return "wspt"
+        if isinstance(policy, EarliestCompletionPolicy):
+            return "earliest_completion"
+        if isinstance(policy, RoundRobinPolicy):
+            return "round_robin"
+        return "least_loaded"
+
+    def _on_event(self, event, order, employee, now):
+        with self.lock:
+            self.version += 1
+
+    def forecast(self, recipe, quantity=1):
+        """Перцентили времени до доставки заказа рецепта; словарь с error, если некому его выполнить."""
+        key = (recipe.name, quantity)
+        with self.lock:
+            version = self.version
+            cached = self._cache.get(key)
+        if cached is not None and cached[0] == version and self.clock() - cached[1] < self.max_age:
+            return dict(cached[2], cached=True)
+
+        computed_at = self.clock()
+        state = self._snapshot()
+        for role, count in zip(self.pipeline.roles, state["role_sizes"]):
+            if not count:
+                return {"error": f"No available {role}s"}
+        completion = self._simulate(recipe.work, quantity, state) - state["now"]
+        p50, p90, p99 = np.percentile(completion, [50, 90, 99])
+        result = {
+            "p50": float(p50),
+            "p90": float(p90),
+            "p99": float(p99),
+            "mean": float(completion.mean()),
+            "samples": self.samples,
+            "queue_version": version,
+        }
+        with self.lock:
+            self._cache[key] = (version, computed_at, result)
+        return dict(result, cached=False)
+
+    def _snapshot(self):
+        # Сотрудники по ролям, их очереди и незавершённые заказы; под exclusive(),
+        # чтобы очереди не менялись во время обхода
+        stage_index = {stage.name: index for index, stage in enumerate(self.pipeline.stages)}
+        with self.manager.exclusive():
+            now = self.manager.now()
+            employees, roles, role_sizes = [], [], []
+            for role_index, role in enumerate(self.pipeline.roles):
+                staff = self.database.employees_by_role.get(role, [])
+                employees.extend(staff)
+                roles.extend([role_index] * len(staff))
+                role_sizes.append(len(staff))
+            jobs = {}  # ID заказа -> номер заказа в массивах модели
+            nominal, weights, stages = [], [], []
+            for order in self.manager.orders.values():
+                jobs[order.order_id] = len(nominal)
+                recipe = self.database.get_recipe_by_name(order.recipe_name)
+                nominal.append(recipe.work if recipe is not None else order.base_work)
+                weights.append(getattr(order, "weight", order.quantity))
+                stages.append(stage_index[order.stage])
+            # Очередь сотрудника: (номера заказов, известная работа или None, сколько этап уже идёт)
+            queues, queued = [], set()
+            for employee in employees:
+                items = []
+                for item in employee.orders:
+                    members = getattr(item, "orders", None)  # batching.KitchenBatch
+                    ids = [jobs[order_id_of(member)] for member in (members if members is not None else [item])
+                           if order_id_of(member) in jobs]
+                    if not ids:
+                        continue  # Запись, назначенная в обход менеджера: её никто не выполнит
+                    # Работу заказа разыгрываем; у партии она уже известна
+                    work = None if members is None else order_work(item)
+                    started_at = getattr(item, "stage_started_at", None)
+                    items.append((ids, work, None if started_at is None else now - started_at))
+                    queued.update(ids)
+                queues.append(items)
+            rotation = getattr(getattr(self.manager, "policy", None), "counters", {})
+        return {
+            "now": now,
+            "performance": np.array([employee.performance for employee in employees], dtype=np.float64),
+            "roles": np.array(roles, dtype=np.int64),
+            "role_sizes": role_sizes,
+            "queues": queues,
+            # Заказы, ещё не назначенные сотруднику своего этапа, приходят на этап сейчас
+            "unassigned": [index for order_id, index in jobs.items() if index not in queued],
+            "nominal": np.array(nominal, dtype=np.float64),
+            "weights": np.array(weights, dtype=np.float64),
+            "stages": np.array(stages, dtype=np.int64),
+            "rotation": [rotation.get(role, 0) for role in self.pipeline.roles],
+        }
+
+    def _simulate(self, recipe_work, quantity, state):
+        samples, now = self.samples, state["now"]
+        rows = np.arange(samples)
+        stage_count = len(self.pipeline.stages)
+        factors = np.array([stage.work_factor for stage in self.pipeline.stages])
+        role_of_stage = np.array([self.pipeline.roles.index(stage.role) for stage in self.pipeline.stages])
+        performance = state["performance"]
+        role_sizes = np.array(state["role_sizes"])
+        role_start = np.concatenate(([0], np.cumsum(role_sizes)[:-1]))
+        in_role = state["roles"][None, :] == np.arange(len(role_sizes))[:, None]  # Роль x сотрудник
+
+        # Новый заказ - последний: из пришедших одновременно он встаёт в очередь после остальных
+        nominal = np.append(state["nominal"], recipe_work)
+        weights = np.append(state["weights"], quantity)
+        new = len(nominal) - 1
+        base = nominal * self.random.uniform(NOISE_LOW, NOISE_HIGH, (samples, len(nominal)))  # Работа с шумом
+        work = np.zeros((samples, len(nominal)))  # Работа текущего этапа
+        stage = np.tile(np.append(state["stages"], 0), (samples, 1))
+        owner = np.full((samples, len(nominal)), -1)  # В чьей очереди заказ
+        waiting = np.zeros((samples, len(nominal)), dtype=bool)
+        job_count, staff_count = len(nominal), len(performance)
+        staff = (samples, staff_count)
+        busy = np.zeros(staff, dtype=bool)
+        busy_until = np.full(staff, now)
+        serving = np.zeros(staff, dtype=np.int64)  # Заказ, который сотрудник выполняет
+        backlog = np.zeros(staff)  # Работа ожидающих в очереди
+        load = np.zeros(staff)  # Заказов в очереди, как Employee.get_load()
+        # Ожидающие заказы по сотрудникам в порядке постановки (кольцевой буфер)
+        capacity = len(nominal) + 1
+        queue = np.zeros(staff + (capacity,), dtype=np.int32)
+        head = np.zeros(staff, dtype=np.int64)
+        tail = np.zeros(staff, dtype=np.int64)
+        rotation = np.tile(np.array(state["rotation"]), (samples, 1))
+        followers = {}  # Первый заказ партии -> остальные её заказы
+        delivered = np.full(samples, np.nan)
+        # Ячейки (сценарий, сотрудник) и (сценарий, заказ) адресуются плоскими индексами через
+        # одномерные представления массивов: так NumPy индексирует заметно быстрее, чем парой массивов
+        busy_, busy_until_, serving_, backlog_, load_, head_, tail_ = (
+            array.reshape(-1) for array in (busy, busy_until, serving, backlog, load, head, tail))
+        base_, work_, stage_, owner_, waiting_ = (array.reshape(-1) for array in (base, work, stage, owner, waiting))
+        queue_, rotation_ = queue.reshape(-1), rotation.reshape(-1)
+
+        def start(where, employee, job, at):
+            cell, slot = where * staff_count + employee, where * job_count + job
+            busy_[cell] = True
+            busy_until_[cell] = at + work_[slot] / performance[employee]
+            serving_[cell] = job
+
+        def wait(where, employee, job):
+            cell, slot = where * staff_count + employee, where * job_count + job
+            waiting_[slot] = True
+            backlog_[cell] += work_[slot]
+            queue_[cell * capacity + tail_[cell] % capacity] = job
+            tail_[cell] += 1
+
+        def start_next(where, employee, at):
+            # Освободившийся сотрудник берёт следующий заказ очереди, как policy.next_order
+            cell = where * staff_count + employee
+            found = head_[cell] < tail_[cell]
+            where, employee, at, cell = where[found], employee[found], at[found], cell[found]
+            if not where.size:
+                return
+            first = cell * capacity + head_[cell] % capacity
+            if self.policy == "wspt":
+                # Правило Смита: наибольшее отношение веса к длительности, из равных - раньше вставший
+                positions = (head_[cell][:, None] + np.arange(capacity)) % capacity
+                ahead = queue_[cell[:, None] * capacity + positions]
+                live = np.arange(capacity) < (tail_[cell] - head_[cell])[:, None]
+                ratio = np.where(live, weights[ahead] / np.maximum(work_[where[:, None] * job_count + ahead], 1e-9),
+                                 -np.inf)
+                taken = ratio.argmax(axis=1)  # Из равных argmax берёт первый, то есть раньше вставший
+                job = ahead[np.arange(len(where)), taken]
+                # Взятый заказ меняется местами с головой очереди
+                queue_[cell * capacity + positions[np.arange(len(where)), taken]] = queue_[first]
+            else:
+                job = queue_[first]
+            head_[cell] += 1
+            slot = where * job_count + job
+            waiting_[slot] = False
+            backlog_[cell] -= work_[slot]
+            start(where, employee, job, at)
+
+        def arrive(where, job, at):
+            # Заказ пришёл на этап: сотрудник выбирается по политике менеджера
+            slot = where * job_count + job
+            target = stage_[slot]
+            role = role_of_stage[target]
+            work_[slot] = base_[slot] * factors[target]
+            if self.policy == "round_robin":
+                turn = where * len(role_sizes) + role
+                chosen = role_start[role] + rotation_[turn] % role_sizes[role]
+                rotation_[turn] += 1
+            else:
+                if self.policy == "least_loaded":
+                    key = load[where]
+                elif self.policy == "earliest_free":
+                    key = np.maximum(busy_until[where], at[:, None]) + backlog[where] / performance
+                else:
+                    key = (np.maximum(busy_until[where] - at[:, None], 0.0)
+                           + (backlog[where] + work_[slot][:, None]) / performance)
+                chosen = np.where(in_role[role], key, np.inf).argmin(axis=1)
+            owner_[slot] = chosen
+            cell = where * staff_count + chosen
+            load_[cell] += 1
+            idle = ~busy_[cell]
+            start(where[idle], chosen[idle], job[idle], at[idle])
+            wait(where[~idle], chosen[~idle], job[~idle])
+
+        def advance(where, job, at):
+            # Этап закончен: заказ сразу приходит на следующий этап или доставлен
+            slot = where * job_count + job
+            following = stage_[slot] + 1
+            last = following >= stage_count
+            owner_[slot] = -1
+            mine = last & (job == new)
+            delivered[where[mine]] = at[mine]
+            going = ~last
+            stage_[slot[going]] = following[going]
+            arrive(where[going], job[going], at[going])
+            for carrier, members in followers.items():
+                batch = job == carrier
+                if batch.any():
+                    # Заказы партии идут дальше по одному, в порядке партии
+                    for member in members:
+                        advance(where[batch], np.full(batch.sum(), member), at[batch])
+
+        for employee, items in enumerate(state["queues"]):
+            everyone = np.full(samples, employee)
+            load[:, employee] = len(items)
+            for ids, known_work, elapsed in items:
+                carrier = np.full(samples, ids[0])
+                if len(ids) > 1:
+                    followers[ids[0]] = ids[1:]
+                owner[:, ids[0]] = employee
+                factor = factors[state["stages"][ids[0]]]
+                if known_work is not None:
+                    work[:, ids[0]] = known_work
+                elif elapsed is not None:
+                    # Этап идёт уже elapsed секунд: шум не меньше уже прошедшей доли работы.
+                    # Шум у заказа один на все этапы, поэтому он же и для следующих этапов
+                    low = np.clip(elapsed * performance[employee] / (nominal[ids[0]] * factor), NOISE_LOW, NOISE_HIGH)
+                    base[:, ids[0]] = nominal[ids[0]] * self.random.uniform(low, NOISE_HIGH, samples)
+                    work[:, ids[0]] = base[:, ids[0]] * factor
+                else:
+                    work[:, ids[0]] = base[:, ids[0]] * factor
+                if elapsed is not None:
+                    start(rows, everyone, carrier, np.full(samples, now - elapsed))
+                    busy_until[:, employee] = np.maximum(busy_until[:, employee], now)
+                else:
+                    wait(rows, everyone, carrier)
+            if items and not busy[0, employee]:
+                start_next(rows, everyone, np.full(samples, now))
+        for index in state["unassigned"] + [new]:
+            arrive(rows, np.full(samples, index), np.full(samples, now))
+
+        active = rows
+        while active.size:
+            # Следующее событие сценария - ближайшее завершение этапа у кого-то из сотрудников
+            finish = np.where(busy[active], busy_until[active], np.inf)
+            employee = finish.argmin(axis=1)
+            at = finish[np.arange(len(active)), employee]
+            cell = active * staff_count + employee
+            job = serving_[cell]
+            load_[cell] -= 1
+            busy_[cell] = False
+            # Как в complete_order: сотрудник берёт следующий заказ, затем готовый идёт дальше
+            start_next(active, employee, at)
+            advance(active, job, at)
+            active = active[np.isnan(delivered[active])]
+        return delivered
@@ -0,0 +1,234 @@
+# Журнал изменений (write-ahead log) с периодическим сжатием в снимок
+import json
+import os
+import threading
+import time
+from logs import get_logger
+from storage import atomic_write_json
+
+logger = get_logger("journal")
+
+
+class MutationJournal:
+    """Журнал изменений состояния ресторана.
+
+    Каждое изменение (бронь, освобождение стола, списание, заказ) получает номер
+    и одной компактной JSON-строкой попадает в буфер в памяти. В файл буфер
+    дописывает и сбрасывает через fsync фоновый поток раз в fsync_interval
+    секунд или сразу после fsync_batch записей, либо flush() для подтверждения
+    записи; одновременные flush() разных потоков обходятся одним fsync.
+    Ввод-вывод идёт вне блокировок данных базы. Фоновый компактор периодически
+    атомарно переписывает снимок (файл конфигурации) и начинает журнал заново.
+    on_write(kind, seconds) вызывается после каждого fsync ("journal_fsync") и
+    снимка ("journal_snapshot").
+    """
+
+    def __init__(self, database, journal_file=None, fsync_interval=0.05, fsync_batch=64,
+                 compact_threshold=1000, compact_interval=60.0, on_write=None):
+        self.database = database
+        self.snapshot_file = database.config_file
+        self.journal_file = journal_file or self.snapshot_file + ".journal"
+        self.fsync_interval = fsync_interval
+        self.fsync_batch = fsync_batch
+        self.compact_threshold = compact_threshold  # Сжимать после стольких записей
+        self.compact_interval = compact_interval  # ...или не реже, чем раз в столько секунд
+        self.on_write = on_write
+        self.lock = threading.Lock()  # Номера и буфер; под ней нет ввода-вывода
+        self._io_lock = threading.Lock()  # Запись буфера в файл, fsync и ротация
+        # Сжатия идут по одному: иначе второе перезаписало бы .old первого, а снимок
+        # первого мог бы лечь на диск после снимка второго. Порядок: _compact_lock ->
+        # блокировки базы -> _io_lock -> lock
+        self._compact_lock = threading.Lock()
+        self.seq = database.journal_seq
+        self.synced_seq = self.seq  # Записи до этого номера уже на диске
+        self._written_seq = self.seq  # ...а до этого - в файле (меняется под _io_lock)
+        self._synced = threading.Condition(self.lock)
+        self.records_since_snapshot = 0
+        self.pending_sync = 0  # Записано, но ещё не сброшено на диск через fsync
+        self._buffer = []  # Строки, ещё не записанные в файл, в порядке номеров
+        self.last_compaction = time.monotonic()
+        self._file = None
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread = None
+
+    # ==== Восстановление ====
+
+    def _rotated_file(self):
+        return self.journal_file + ".old"
+
+    def _read_records(self, path):
+        records = []
+        if not os.path.exists(path):
+            return records
+        with open(path, 'r', encoding='utf-8') as file:
+            for line in file:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # Оборванная последняя строка после сбоя: всё до неё уже применено
+                    logger.warning(f"Skipping truncated journal record in {path}")
+                    break
+        return records
+
+    def replay(self):
+        """Применить к загруженному снимку хвост журнала. Возвращает число записей."""
+        applied = 0
+        # Журнал .old остался от сжатия, прерванного до записи снимка
+        rotated = os.path.exists(self._rotated_file())
+        with self.database.exclusive(), self._io_lock:
+            # Повторное чтение при reload должно видеть буферизованные записи
+            self._drain_locked()
+            if self._file is not None:
+                self._file.flush()
+            with self.lock:
+                for path in (self._rotated_file(), self.journal_file):
+                    for record in self._read_records(path):
+                        if record["seq"] <= self.database.journal_seq:
+                            continue  # Уже вошло в снимок
+                        self.database.apply_mutation(record)
+                        self.seq = max(self.seq, record["seq"])
+                        applied += 1
+                self.seq = max(self.seq, self.database.journal_seq)
+                self.synced_seq = self._written_seq = self.seq
+                self.records_since_snapshot = applied
+        if rotated:
+            # Сразу пишем снимок и удаляем .old: иначе следующее сжатие перезапишет
+            # его текущим журналом, и после ещё одного сбоя записи из .old пропадут
+            self.compact()
+        return applied
+
+    # ==== Запись ====
+
+    def open(self):
+        self._file = open(self.journal_file, 'a', encoding='utf-8')
+        self.database.add_mutation_listener(self.append)
+        return self
+
+    def append(self, record):
+        """Добавить запись об изменении в буфер. Вызывается базой под блокировкой изменённых данных.
+
+        Здесь только номер и сериализация: иначе запись на диск под блокировкой
+        журнала выстроила бы в одну очередь изменения всех залов и ингредиентов.
+        """
+        with self.lock:
+            self.seq += 1
+            record = dict(record, seq=self.seq)
+            self._buffer.append(json.dumps(record, separators=(",", ":"), ensure_ascii=False) + "\n")
+            self.records_since_snapshot += 1
+            seq, full = self.seq, len(self._buffer) >= self.fsync_batch
+        if full:
+            self._wake.set()
+        return seq
+
+    def _drain_locked(self):
+        # Вызывается под _io_lock: буфер уходит в файл целиком, порядок номеров сохраняется
+        with self.lock:
+            lines, self._buffer = self._buffer, []
+            self._written_seq = self.seq
+        if lines and self._file is not None:
+            self._file.write("".join(lines))
+            self.pending_sync += len(lines)
+
+    def _sync_locked(self):
+        # Вызывается под _io_lock
+        self._drain_locked()
+        if self._file is not None and self.pending_sync:
+            started = time.perf_counter()
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.pending_sync = 0
+            if self.on_write is not None:
+                self.on_write("journal_fsync", time.perf_counter() - started)
+        with self.lock:
+            self.synced_seq = self._written_seq
+            self._synced.notify_all()
+
+    def flush(self):
+        """Вернуться, когда все уже добавленные записи сброшены на диск."""
+        with self.lock:
+            target = self.seq
+            # Пока другой поток делает fsync, ждём его: он, скорее всего, унесёт и наши
+            # записи. Иначе каждый поток выстоял бы за _io_lock на свой fsync
+            while self.synced_seq < target and self._io_lock.locked():
+                self._synced.wait(self.fsync_interval)
+            if self.synced_seq >= target:
+                return
+        with self._io_lock:
+            self._sync_locked()
+
+    # ==== Сжатие ====
+
+    def compact(self):
+        """Записать атомарный снимок текущего состояния и начать журнал заново."""
+        with self._compact_lock:
+            return self._compact()
+
+    def _compact(self):
+        with self.database.exclusive():
+            # Под блокировкой базы новых изменений нет, поэтому снимок
+            # в точности соответствует записи с номером seq
+            with self._io_lock:
+                self._sync_locked()
+                with self.lock:
+                    seq = self.seq
+                    self.records_since_snapshot = 0
+                if self._file is not None:
+                    self._file.close()
+                    os.replace(self.journal_file, self._rotated_file())
+                    self._file = open(self.journal_file, 'a', encoding='utf-8')
+            self.database.journal_seq = seq
+            data = self.database.to_dict()
+        # Запись на диск идёт вне блокировок базы и журнала; при сбое здесь остаётся
+        # старый снимок и журнал .old, из которых состояние восстановится
+        started = time.perf_counter()
+        atomic_write_json(self.snapshot_file, data, indent=4)
+        if self.on_write is not None:
+            self.on_write("journal_snapshot", time.perf_counter() - started)
+        if os.path.exists(self._rotated_file()):
+            os.remove(self._rotated_file())
+        self.last_compaction = time.monotonic()
+        return seq
+
+    def _needs_compaction(self):
+        if self.records_since_snapshot >= self.compact_threshold:
+            return True
+        return (self.records_since_snapshot > 0
+                and time.monotonic() - self.last_compaction >= self.compact_interval)
+
+    # ==== Фоновый поток ====
+
+    def _run(self):
+        while not self._stopping:
+            self._wake.wait(self.fsync_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+                if self._needs_compaction():
+                    self.compact()
+            except OSError as e:
+                logger.error(f"Ошибка записи журнала: {e}")
+
+    def start(self):
+        if self._file is None:
+            self.open()
+        self._thread = threading.Thread(target=self._run, name="journal-writer", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        """Остановить фоновый поток, сбросить журнал и записать итоговый снимок."""
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.database.remove_mutation_listener(self.append)
+        if self._file is not None:
+            self.compact()
+            with self._io_lock:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,38 @@
+# Полосатые блокировки (lock striping): много независимых блокировок вместо одной общей
+import threading
+from contextlib import ExitStack, contextmanager
+
+
+class LockStripes:
+    """Набор из count реентерабельных блокировок; ключ попадает в полосу hash(key) % count.
+
+    Операции над разными ключами (залами, ингредиентами) почти всегда берут
+    разные блокировки и не мешают друг другу. Несколько полос всегда
+    захватываются по возрастанию номера, поэтому взаимная блокировка
+    невозможна. hold_all() захватывает все полосы - для перезагрузки и
+    снимков состояния.
+    """
+
+    def __init__(self, count=64):
+        self.locks = [threading.RLock() for _ in range(count)]
+
+    def index(self, key):
+        return hash(key) % len(self.locks)
+
+    def for_key(self, key):
+        return self.locks[self.index(key)]
+
+    @contextmanager
+    def hold(self, keys):
+        """Захватить полосы всех ключей по возрастанию номера."""
+        with ExitStack() as stack:
+            for index in sorted({self.index(key) for key in keys}):
+                stack.enter_context(self.locks[index])
+            yield
+
+    @contextmanager
+    def hold_all(self):
+        with ExitStack() as stack:
+            for lock in self.locks:
+                stack.enter_context(lock)
+            yield
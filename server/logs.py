@@ -0,0 +1,244 @@
+# Структурированный журнал сервера: JSON-строки с ротацией и чтение страниц с конца файла
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+
+# Корневой логгер сервера; компонент записи - имя логгера без этого префикса
+ROOT_LOGGER = "restaurant"
+
+# Размер блока при чтении файла с конца
+READ_BLOCK = 64 * 1024
+
+
+def get_logger(component):
+    """Логгер компонента, например get_logger("persistence") -> restaurant.persistence."""
+    return logging.getLogger(f"{ROOT_LOGGER}.{component}")
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Одна запись - одна JSON-строка: ts, level, component, message и поля из extra={"fields": {...}}."""
+
+    def format(self, record):
+        component = record.name
+        if component.startswith(ROOT_LOGGER + "."):
+            component = component[len(ROOT_LOGGER) + 1:]
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "component": component,
+            "message": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging(path, max_bytes=10 * 1024 * 1024, backup_count=5, level=logging.INFO):
+    """Писать записи логгеров restaurant.* в path с ротацией по размеру.
+
+    Возвращает обработчик; его нужно снять через close_logging при остановке.
+    """
+    handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count,
+                                                   encoding='utf-8')
+    handler.setFormatter(JsonLinesFormatter())
+    logger = logging.getLogger(ROOT_LOGGER)
+    logger.setLevel(level)
+    logger.addHandler(handler)
+    return handler
+
+
+def close_logging(handler):
+    logging.getLogger(ROOT_LOGGER).removeHandler(handler)
+    handler.close()
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, который никогда не ждёт: при полной очереди запись отбрасывается."""
+
+    def __init__(self, record_queue):
+        super().__init__(record_queue)
+        self.dropped = 0  # Отброшено записей
+        self._dropped_lock = threading.Lock()
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+
+class _Listener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # При остановке ждём места в очереди, а не падаем на полной
+        self.queue.put(self._sentinel)
+
+
+class QueueLogging:
+    """Вывод логгера через ограниченную очередь и фоновый поток.
+
+    Потоки, которые пишут в логгер, только кладут запись в очередь; файл и
+    консоль пишет поток QueueListener. Если очередь заполнена (вывод не
+    успевает), запись отбрасывается и учитывается в dropped, поэтому
+    горячие потоки никогда не ждут ввода-вывода.
+    """
+
+    def __init__(self, logger_name, handlers, maxsize=10000):
+        self.logger = logging.getLogger(logger_name)
+        self.queue = queue.Queue(maxsize)
+        self.handler = DroppingQueueHandler(self.queue)
+        self.listener = _Listener(self.queue, *handlers, respect_handler_level=True)
+
+    @property
+    def dropped(self):
+        return self.handler.dropped
+
+    def start(self):
+        self.listener.start()
+        self.logger.addHandler(self.handler)
+        self.logger.propagate = False  # Иначе записи ушли бы в обработчики restaurant ещё и напрямую
+        return self
+
+    def stop(self):
+        """Отключить очередь и дописать всё, что в ней осталось."""
+        self.logger.removeHandler(self.handler)
+        if not self.logger.handlers:
+            self.logger.propagate = True
+        self.listener.stop()
+
+
+# ==== Чтение ====
+
+def _log_files(path):
+    """Файл журнала и его архивы path.1, path.2, ... от новых к старым."""
+    files = [path] if os.path.exists(path) else []
+    index = 1
+    while os.path.exists(f"{path}.{index}"):
+        files.append(f"{path}.{index}")
+        index += 1
+    return files
+
+
+def _reverse_lines(file, end):
+    """Строки файла до смещения end в обратном порядке: (смещение начала, байты строки)."""
+    position = end
+    tail = b""
+    while position > 0:
+        size = min(READ_BLOCK, position)
+        position -= size
+        file.seek(position)
+        chunk = file.read(size) + tail
+        lines = chunk.split(b"\n")
+        # Первая строка блока может начинаться в предыдущем блоке
+        tail = lines.pop(0)
+        offset = position + len(tail) + 1
+        starts = []
+        for line in lines:
+            starts.append(offset)
+            offset += len(line) + 1
+        for start, line in reversed(list(zip(starts, lines))):
+            if line.strip():
+                yield start, line
+    if tail.strip():
+        yield 0, tail
+
+
+def _parse(line):
+    try:
+        entry = json.loads(line)
+    except ValueError:
+        entry = None
+    if not isinstance(entry, dict):
+        # Строки старого текстового журнала
+        return {"level": None, "component": None, "message": line.decode('utf-8', 'replace').rstrip("\r")}
+    return entry
+
+
+def _matches(entry, min_level, component):
+    if min_level is not None:
+        level = logging.getLevelName(entry.get("level") or "")
+        if not isinstance(level, int) or level < min_level:
+            return False
+    if component is not None:
+        value = entry.get("component") or ""
+        if value != component and not value.startswith(component + "."):
+            return False
+    return True
+
+
+def read_page(path, limit=50, cursor=None, level=None, component=None):
+    """Страница записей журнала от новых к старым.
+
+    Файл читается с конца блоками, поэтому стоимость зависит от размера
+    страницы (и доли записей, проходящих фильтры), а не от размера файла.
+    cursor - значение next_cursor предыдущей страницы: номер inode файла и
+    смещение, так что листание продолжается в архивах и после ротации.
+    level - наименьший уровень (WARNING - предупреждения и ошибки),
+    component - компонент или его родитель (kitchen совпадает с kitchen.chef).
+    Возвращает {"logs": [...], "next_cursor": ... или None в начале журнала}.
+    """
+    min_level = None
+    if level is not None:
+        min_level = logging.getLevelName(level.upper())
+        if not isinstance(min_level, int):
+            raise ValueError(f"Unknown log level: {level}")
+    files = [(name, os.stat(name)) for name in _log_files(path)]
+    start_index, end = 0, None
+    if cursor is not None:
+        try:
+            inode, offset = (int(part) for part in cursor.split(":"))
+        except ValueError:
+            raise ValueError(f"Invalid cursor: {cursor}")
+        start_index = next((index for index, (_, stat) in enumerate(files) if stat.st_ino == inode), None)
+        if start_index is None:
+            raise ValueError("Cursor has expired: the log file was rotated away")
+        end = offset
+
+    entries = []
+    for name, stat in files[start_index:]:
+        file_end = stat.st_size if end is None else min(end, stat.st_size)
+        end = None
+        with open(name, 'rb') as file:
+            if file_end == stat.st_size and file_end > 0:
+                # Незавершённая последняя строка (запись ещё идёт) пропускается
+                file.seek(file_end - 1)
+                if file.read(1) != b"\n":
+                    file_end = _last_newline(file, file_end)
+            for start, line in _reverse_lines(file, file_end):
+                entry = _parse(line)
+                if _matches(entry, min_level, component):
+                    entries.append(entry)
+                    if len(entries) == limit:
+                        return {"logs": entries, "next_cursor": f"{stat.st_ino}:{start}" if start else
+                                _next_file_cursor(files, name)}
+    return {"logs": entries, "next_cursor": None}
+
+
+def _last_newline(file, end):
+    """Смещение сразу после последнего перевода строки до end (0, если его нет)."""
+    position = end
+    while position > 0:
+        size = min(READ_BLOCK, position)
+        position -= size
+        file.seek(position)
+        found = file.read(size).rfind(b"\n")
+        if found >= 0:
+            return position + found + 1
+    return 0
+
+
+def _next_file_cursor(files, name):
+    # Страница закончилась ровно на начале файла: продолжаем со следующего архива
+    names = [file_name for file_name, _ in files]
+    index = names.index(name) + 1
+    if index >= len(files):
+        return None
+    stat = files[index][1]
+    return f"{stat.st_ino}:{stat.st_size}"
+
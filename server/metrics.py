@@ -0,0 +1,296 @@
+# Метрики сервера в текстовом формате Prometheus без внешних зависимостей
+import bisect
+import threading
+import time
+
+# Границы корзин гистограмм задержек, секунды
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Число шардов у каждой серии: поток пишет в шард по своему номеру
+SHARDS = 16
+
+
+def _shard_index():
+    # Номера потоков ОС идут подряд, поэтому потоки равномерно расходятся по шардам
+    return threading.get_native_id() % SHARDS
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _CounterShard:
+    __slots__ = ("lock", "value")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0
+
+
+class _HistogramShard:
+    __slots__ = ("lock", "counts", "sum")
+
+    def __init__(self, buckets):
+        self.lock = threading.Lock()
+        self.counts = [0] * (len(buckets) + 1)  # Последняя корзина - +Inf
+        self.sum = 0.0
+
+
+class CounterChild:
+    """Одна серия счётчика (один набор значений меток)."""
+
+    def __init__(self):
+        self.shards = [_CounterShard() for _ in range(SHARDS)]
+
+    def inc(self, amount=1):
+        shard = self.shards[_shard_index()]
+        with shard.lock:
+            shard.value += amount
+
+    def value(self):
+        return sum(shard.value for shard in self.shards)
+
+
+class HistogramChild:
+    """Одна серия гистограммы (один набор значений меток)."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.shards = [_HistogramShard(buckets) for _ in range(SHARDS)]
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        shard = self.shards[_shard_index()]
+        with shard.lock:
+            shard.counts[index] += 1
+            shard.sum += value
+
+    def totals(self):
+        """Накопленные счётчики корзин, сумма и число наблюдений."""
+        counts = [0] * (len(self.buckets) + 1)
+        total = 0.0
+        for shard in self.shards:
+            with shard.lock:
+                shard_counts = list(shard.counts)
+                total += shard.sum
+            for index, count in enumerate(shard_counts):
+                counts[index] += count
+        cumulative, running = [], 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return cumulative, total, running
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.lock = threading.Lock()  # Только для создания новых серий
+        self.children = {}
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """Серия для значений меток; повторные вызовы возвращают тот же объект."""
+        key = tuple(str(value) for value in values)
+        child = self.children.get(key)
+        if child is None:
+            if len(key) != len(self.label_names):
+                raise ValueError(f"{self.name}: expected labels {self.label_names}")
+            with self.lock:
+                child = self.children.setdefault(key, self._new_child())
+        return child
+
+    def _series(self):
+        with self.lock:
+            return sorted(self.children.items())
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def _new_child(self):
+        return CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def render(self):
+        return [f"{self.name}{_format_labels(self.label_names, values)} {_format_value(child.value())}"
+                for values, child in self._series()]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def render(self):
+        lines = []
+        for values, child in self._series():
+            cumulative, total, count = child.totals()
+            for bound, running in zip(self.buckets + (float("inf"),), cumulative):
+                labels = _format_labels(self.label_names, values, ("le", _format_value(float(bound))))
+                lines.append(f"{self.name}_bucket{labels} {running}")
+            labels = _format_labels(self.label_names, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class TimedLock:
+    """Обёртка над threading.Lock, которая замеряет ожидание и удержание блокировки."""
+
+    def __init__(self, wait, hold):
+        self._lock = threading.Lock()
+        self._wait = wait
+        self._hold = hold
+        self._acquired_at = 0.0
+
+    def acquire(self, blocking=True, timeout=-1):
+        started = time.perf_counter()
+        if not self._lock.acquire(blocking, timeout):
+            return False
+        self._acquired_at = acquired = time.perf_counter()
+        self._wait.observe(acquired - started)
+        return True
+
+    def release(self):
+        held = time.perf_counter() - self._acquired_at
+        self._lock.release()
+        self._hold.observe(held)
+
+    def locked(self):
+        return self._lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class MetricsRegistry:
+    """Метрики процесса и их вывод для GET /metrics.
+
+    Счётчики и гистограммы обновляются в горячих путях, поэтому у каждой
+    серии SHARDS шардов со своими блокировками: поток пишет только в шард по
+    своему номеру и почти никогда не ждёт, а при чтении шарды складываются.
+    Мгновенные значения (глубины очередей, загрузка сотрудников) не
+    обновляются вовсе - их считают сборщики add_collector во время чтения.
+    """
+
+    def __init__(self, prefix="restaurant_"):
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.collectors = []
+        self.http_requests = self.counter("http_requests_total", "HTTP requests by route and status",
+                                          ("method", "route", "status"))
+        self.http_duration = self.histogram("http_request_duration_seconds", "HTTP request latency by route",
+                                            ("method", "route"))
+        self.lock_wait = self.histogram("lock_wait_seconds", "Time spent waiting for order engine locks",
+                                        ("lock",))
+        self.lock_hold = self.histogram("lock_hold_seconds", "Time order engine locks are held", ("lock",))
+        self.persistence_write = self.histogram("persistence_write_seconds", "Duration of writes to disk",
+                                                ("kind",))
+
+    def _register(self, metric):
+        with self.lock:
+            if metric.name in self.metrics:
+                raise ValueError(f"Duplicate metric: {metric.name}")
+            self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self._register(Counter(self.prefix + name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(self.prefix + name, help, labels, buckets))
+
+    def add_collector(self, collector):
+        """Добавить сборщик мгновенных значений.
+
+        collector() возвращает список (имя, описание, [(метки, значение), ...]),
+        метки - словарь; значения выводятся как gauge.
+        """
+        with self.lock:
+            self.collectors.append(collector)
+
+    def timed_lock(self, name):
+        return TimedLock(self.lock_wait.labels(name), self.lock_hold.labels(name))
+
+    def observe_write(self, kind, seconds):
+        self.persistence_write.labels(kind).observe(seconds)
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus 0.0.4."""
+        with self.lock:
+            metrics = list(self.metrics.values())
+            collectors = list(self.collectors)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render())
+        for collector in collectors:
+            for name, help, samples in collector():
+                name = self.prefix + name
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} gauge")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def instrument_app(app, registry):
+    """Считать запросы и их задержки по маршрутам приложения Flask."""
+    from flask import g, request
+
+    @app.before_request
+    def start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def remember_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def record_request(exc):
+        # teardown вызывается и после необработанного исключения (тогда after_request нет) - это 500
+        started = g.pop("metrics_started", None)
+        if started is not None:
+            # Шаблон маршрута, а не путь: /halls/<int:hall_id>, а не /halls/1
+            route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+            registry.http_requests.labels(request.method, route, g.pop("metrics_status", 500)).inc()
+            registry.http_duration.labels(request.method, route).observe(time.perf_counter() - started)
+
+    return app
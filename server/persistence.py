@@ -0,0 +1,144 @@
+# Отложенная групповая запись состояния в файл конфигурации
+import threading
+import time
+from logs import get_logger
+from storage import atomic_write_json
+
+logger = get_logger("persistence")
+
+
+class PersistenceWriter:
+    """Фоновый поток, который единолично пишет файл конфигурации.
+
+    Обработчики запросов только помечают состояние как изменённое. Поток
+    собирает изменения в течение окна window секунд (или пока их не наберётся
+    max_pending) и записывает один снимок на всё окно. Каждое изменение
+    получает номер поколения; wait_for(generation) блокирует вызывающего,
+    пока не будет записан снимок, включающий это поколение. on_write(kind,
+    seconds) вызывается после записи каждого снимка.
+    """
+
+    def __init__(self, database, window=0.05, max_pending=100, on_write=None):
+        self.database = database
+        self.config_file = database.config_file
+        self.window = window
+        self.max_pending = max_pending
+        self.on_write = on_write
+        self.condition = threading.Condition()
+        self.generation = 0  # Номер последнего изменения
+        self.committed_generation = 0  # Номер последнего изменения, записанного на диск
+        self.first_dirty_at = None  # Момент первого несохранённого изменения в текущем окне
+        self.commits = 0
+        self.last_error = None
+        self._stopping = False
+        self._thread = None
+        # Снимки пишутся по одному, иначе более ранний мог бы лечь поверх более позднего.
+        # Порядок блокировок: _commit_lock -> блокировки базы -> condition
+        self._commit_lock = threading.Lock()
+
+    def mark_dirty(self, record=None):
+        """Отметить изменение состояния. Возвращает номер его поколения."""
+        with self.condition:
+            self.generation += 1
+            if self.first_dirty_at is None:
+                self.first_dirty_at = time.monotonic()
+            self.condition.notify_all()
+            return self.generation
+
+    def _pending(self):
+        return self.generation - self.committed_generation
+
+    def _commit(self):
+        with self._commit_lock:
+            with self.database.exclusive():
+                if not self._pending():
+                    return  # Всё уже записано (reload_database)
+                generation, data = self._snapshot()
+            self._write(generation, data)
+
+    def _snapshot(self):
+        # Вызывается под блокировкой базы, поэтому снимок содержит ровно
+        # изменения до generation включительно
+        with self.condition:
+            generation = self.generation
+            self.first_dirty_at = None
+        return generation, self.database.to_dict()
+
+    def _write(self, generation, data):
+        started = time.perf_counter()
+        atomic_write_json(self.config_file, data, indent=4)
+        if self.on_write is not None:
+            self.on_write("writer_snapshot", time.perf_counter() - started)
+        with self.condition:
+            self.committed_generation = max(self.committed_generation, generation)
+            self.commits += 1
+            self.condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self._pending() and not self._stopping:
+                    self.condition.wait()
+                if not self._pending():
+                    return  # Остановка и всё записано
+                # Ждём конца окна, если изменений пока мало. first_dirty_at сбрасывается,
+                # если снимок уже пишет reload_database
+                while not self._stopping and self._pending() < self.max_pending and self.first_dirty_at is not None:
+                    remaining = self.first_dirty_at + self.window - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+            try:
+                self._commit()
+            except OSError as e:
+                logger.error(f"Ошибка записи состояния: {e}")
+                with self.condition:
+                    self.last_error = e
+                    self.condition.notify_all()
+                time.sleep(self.window)
+
+    def reload_database(self):
+        """Перечитать файл конфигурации, сначала записав в него все накопленные изменения.
+
+        Запись и перезагрузка идут под одной блокировкой базы: подтверждённые
+        изменения, которые поток ещё не успел записать, не теряются.
+        """
+        with self._commit_lock, self.database.exclusive():
+            if self._pending():
+                self._write(*self._snapshot())
+            self.database.reload()
+
+    def wait_for(self, generation, timeout=None):
+        """Дождаться записи снимка, содержащего изменение generation."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while self.committed_generation < generation:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+        return True
+
+    def flush(self, timeout=None):
+        """Записать все накопленные изменения и дождаться записи."""
+        with self.condition:
+            generation = self.generation
+            self.first_dirty_at = time.monotonic() - self.window  # Не ждём конца окна
+            self.condition.notify_all()
+        return self.wait_for(generation, timeout)
+
+    def start(self):
+        self.database.add_mutation_listener(self.mark_dirty)
+        self._thread = threading.Thread(target=self._run, name="persistence-writer", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        """Остановить поток, предварительно записав все изменения."""
+        self.database.remove_mutation_listener(self.mark_dirty)
+        with self.condition:
+            self._stopping = True
+            self.condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,169 @@
+# Конвейер заказа: этапы, пулы сотрудников по ролям и метрики очередей этапов
+import threading
+
+# Прежний конвейер повар -> официант, если в конфигурации нет "pipeline"
+DEFAULT_STAGES = [{"name": "chef", "role": "chef"}, {"name": "waiter", "role": "waiter"}]
+
+
+class Stage:
+    """Этап конвейера.
+
+    role - роль сотрудников, выполняющих этап (по умолчанию совпадает с
+    именем этапа); work_factor - доля работы заказа на этапе: этап длится
+    order.base_work * work_factor / performance.
+    """
+
+    def __init__(self, name, role=None, work_factor=1.0):
+        if work_factor <= 0:
+            raise ValueError(f"Stage {name}: work_factor must be positive")
+        self.name = name
+        self.role = role or name
+        self.work_factor = work_factor
+
+    def to_dict(self):
+        data = {"name": self.name, "role": self.role}
+        if self.work_factor != 1.0:
+            data["work_factor"] = self.work_factor
+        return data
+
+
+class Pipeline:
+    """Упорядоченные этапы заказа, например prep -> grill -> plating -> delivery.
+
+    В конфигурации задаётся списком
+    "pipeline": [{"name": "grill", "role": "cook", "work_factor": 0.5}, ...].
+    У каждой роли свой пул сотрудников и своя очередь; несколько этапов
+    могут выполняться одной ролью.
+    """
+
+    def __init__(self, stages, configured=True):
+        self.stages = list(stages)
+        if not self.stages:
+            raise ValueError("Pipeline must have at least one stage")
+        self.stages_by_name = {}
+        for stage in self.stages:
+            if stage.name in self.stages_by_name:
+                raise ValueError(f"Duplicate pipeline stage: {stage.name}")
+            self.stages_by_name[stage.name] = stage
+        self._next = {stage.name: following.name for stage, following in zip(self.stages, self.stages[1:])}
+        # Роли в порядке первого появления; в этом порядке берутся их блокировки
+        self.roles = list(dict.fromkeys(stage.role for stage in self.stages))
+        self.configured = configured  # Задан ли конвейер в конфигурации явно
+
+    @classmethod
+    def from_config(cls, data):
+        """Построить конвейер из списка этапов конфигурации (None - повар -> официант)."""
+        stages = [
+            Stage(stage_data["name"], stage_data.get("role"), stage_data.get("work_factor", 1.0))
+            for stage_data in (data if data is not None else DEFAULT_STAGES)
+        ]
+        return cls(stages, configured=data is not None)
+
+    @property
+    def first(self):
+        return self.stages[0]
+
+    def stage(self, name):
+        return self.stages_by_name[name]
+
+    def role_of(self, name):
+        return self.stages_by_name[name].role
+
+    def next_stage(self, name):
+        """Имя следующего этапа или None, если name - последний."""
+        return self._next.get(name)
+
+    def to_config(self):
+        return [stage.to_dict() for stage in self.stages]
+
+
+class _Timing:
+    """Число, сумма и максимум длительностей."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def to_dict(self):
+        return {"mean": self.total / self.count if self.count else 0.0, "max": self.max}
+
+
+class _StageStats:
+    def __init__(self):
+        self.waiting = 0  # В очереди этапа
+        self.in_service = 0  # Выполняются
+        self.max_waiting = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.wait = _Timing()  # От входа на этап до начала выполнения
+        self.service = _Timing()  # От начала до завершения
+
+    def enter(self):
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+
+
+class StageMetrics:
+    """Метрики этапов конвейера по событиям менеджера процессов.
+
+    Для каждого этапа ведутся глубина очереди (текущая и наибольшая), число
+    выполняемых заказов, время ожидания от входа на этап до начала и время
+    обслуживания. Узкое место - этап с наибольшим средним ожиданием.
+    """
+
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        self.lock = threading.Lock()
+        self.stats = {stage.name: _StageStats() for stage in pipeline.stages}
+
+    def attach(self, manager):
+        manager.add_event_listener(self._on_event)
+        return self
+
+    def _on_event(self, event, order, employee, now):
+        with self.lock:
+            stats = self.stats[order.stage]
+            if event == "queued":
+                stats.enter()
+            elif event == "started":
+                stats.waiting -= 1
+                stats.in_service += 1
+                stats.wait.add(now - order.stage_entered_at)
+            elif event == "completed":
+                stats.in_service -= 1
+                stats.completed += 1
+                stats.service.add(now - order.stage_started_at)
+                next_stage = self.pipeline.next_stage(order.stage)
+                if next_stage is not None:
+                    self.stats[next_stage].enter()
+            elif event == "cancelled":
+                if order.stage_started_at is not None:
+                    stats.in_service -= 1
+                else:
+                    stats.waiting -= 1
+                stats.cancelled += 1
+
+    def snapshot(self):
+        with self.lock:
+            stages = [
+                {
+                    "name": stage.name,
+                    "role": stage.role,
+                    "queue_depth": self.stats[stage.name].waiting,
+                    "max_queue_depth": self.stats[stage.name].max_waiting,
+                    "in_service": self.stats[stage.name].in_service,
+                    "completed": self.stats[stage.name].completed,
+                    "cancelled": self.stats[stage.name].cancelled,
+                    "wait_time": self.stats[stage.name].wait.to_dict(),
+                    "service_time": self.stats[stage.name].service.to_dict(),
+                }
+                for stage in self.pipeline.stages
+            ]
+        bottleneck = max(stages, key=lambda stage: stage["wait_time"]["mean"])
+        return {"stages": stages, "bottleneck": bottleneck["name"] if bottleneck["wait_time"]["mean"] else None}
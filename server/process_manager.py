@@ -1,89 +1,507 @@
+import logging
 import threading
-import time
 import random
-from queue import PriorityQueue
+from contextlib import ExitStack, contextmanager
+from queue import Empty, PriorityQueue
+from batching import KitchenBatch
 from database import RestaurantDatabase
+from logs import get_logger
+from pipeline import StageMetrics
+from scheduling import make_policy
+from timers import TimerScheduler
+
+logger = get_logger("kitchen")
 
 class Order:
-    def __init__(self, order_id, recipe_name, quantity, time_to_complete, stage="chef"):
+    def __init__(self, order_id, recipe_name, quantity, time_to_complete, stage=None, work=None):
         self.order_id = order_id
         self.recipe_name = recipe_name
         self.quantity = quantity
-        self.time_to_complete = time_to_complete
-        self.stage = stage  # chef -> waiter
+        self.time_to_complete = time_to_complete  # Оценка при приёме заказа
+        # Полная работа заказа у сотрудника с производительностью 1
+        self.base_work = work if work is not None else time_to_complete
+        # Работа текущего этапа (base_work * work_factor этапа); этап длится work / performance
+        self.work = self.base_work
+        self.weight = quantity  # Вес для политики wspt
+        self.stage = stage  # Имя этапа конвейера; задаётся при постановке в очередь
+        self.stage_entered_at = None  # Когда заказ попал в очередь текущего этапа
+        self.employee = None  # Кто выполняет текущий этап
+        self.timer = None  # Запланированное завершение текущего этапа
+        self.cancelled = False
+        self.created_at = None  # Время по часам планировщика
+        self.stage_started_at = None
+        self.batch = None  # batching.KitchenBatch, в составе которой готовится заказ
 
     def __lt__(self, other):
+        if not isinstance(other, Order):
+            return NotImplemented
         return self.time_to_complete < other.time_to_complete
 
 
+class _Shutdown:
+    """Сигнал остановки диспетчера; в очереди с приоритетом идёт раньше любого заказа."""
+
+    def __lt__(self, other):
+        return True
+
+    def __gt__(self, other):
+        return False
+
+
 class ProcessManager:
-    def __init__(self, database: RestaurantDatabase):
+    """Конвейер заказов по этапам pipeline.Pipeline (по умолчанию повар -> официант).
+
+    Каждый этап выполняет пул сотрудников своей роли. Каждый сотрудник выполняет заказы из своей очереди по одному: таймер
+    этапа запускается, когда заказ становится первым в очереди сотрудника.
+
+    scheduler задаёт часы: по умолчанию TimerScheduler в реальном времени,
+    для моделирования - simulation.VirtualScheduler. С synchronous=True
+    отдельный поток диспетчера не запускается, и заказы распределяются
+    сразу при постановке в очередь (режим дискретно-событийной симуляции).
+    rng - источник шумовой величины (random.Random(seed) для воспроизводимости),
+    verbose=False отключает вывод сообщений о ходе заказов, admission -
+    admission.AdmissionController, который может отклонить заказ до списания.
+    policy - политика распределения из scheduling.POLICIES (имя или объект):
+    кому из сотрудников роли достаётся заказ и в каком порядке сотрудник
+    выполняет свою очередь. Этап длится order.work / performance сотрудника.
+    batching - batching.BatchCooking: заказы одного рецепта, пришедшие на первый
+    этап в пределах окна, выполняются одной партией и затем по одному идут дальше.
+    Партия набирается, только пока все повара заняты: при свободном поваре заказ
+    готовится сразу, а освободившийся повар сразу берёт набираемую партию.
+    pipeline - конвейер этапов (по умолчанию database.pipeline из конфигурации;
+    перезагрузка конфигурации его не меняет). Глубина очередей, ожидание и
+    обслуживание по этапам - в stage_metrics.
+    """
+
+    def __init__(self, database: RestaurantDatabase, scheduler=None, rng=None, synchronous=False, verbose=True,
+                 admission=None, policy="least_loaded", batching=None, pipeline=None, metrics=None):
         self.database = database
-        self.lock = threading.Lock()
+        self.pipeline = pipeline or database.pipeline
+        self.policy = make_policy(policy)
+        # Порядок блокировок: role_locks по порядку pipeline.roles -> orders_lock
+        # -> блокировки базы (см. RestaurantDatabase) -> блокировки подписчиков на события.
+        # Блокировка роли защищает очереди её сотрудников и заказы на её этапе:
+        # этап заказа меняется только под блокировкой текущей роли. Сообщения
+        # о ходе заказов выводятся уже после освобождения блокировок.
+        # С metrics (metrics.MetricsRegistry) замеряются ожидание и удержание блокировок.
+        new_lock = metrics.timed_lock if metrics is not None else lambda name: threading.Lock()
+        self.role_locks = {role: new_lock(f"role:{role}") for role in self.pipeline.roles}
+        self.orders_lock = new_lock("orders")  # Только для словаря orders
         self.orders_queue = PriorityQueue()
-        self.active_threads = []
+        self.orders = {}  # ID -> Order для всех незавершённых заказов
+        # Завершения этапов планируются в одном потоке вместо отдельного потока на этап
+        self.scheduler = scheduler or TimerScheduler()
+        self.random = rng or random
+        self.synchronous = synchronous
+        self.verbose = verbose
+        self.event_listeners = []  # Подписчики на события конвейера
+        self._dispatcher = None
+        self.stage_metrics = StageMetrics(self.pipeline).attach(self)
+        self.admission = admission
+        if admission is not None:
+            admission.attach(self)
+        self.batching = batching
+        self.forming = {}  # Рецепт -> набираемая партия; под блокировкой роли повара
+
+    def _log(self, message, level=logging.INFO, **fields):
+        # Запись с полями (order_id, stage, employee_id, длительности) уходит в очередь
+        # logs.QueueLogging; сам поток не ждёт ни файла, ни консоли
+        if self.verbose and logger.isEnabledFor(level):
+            logger.log(level, message, extra={"fields": fields})
+
+    def add_event_listener(self, listener):
+        """Подписаться на события: listener(event, order, employee, now).
+
+        event - "queued", "started", "completed" (этап), "delivered" или "cancelled"
+        (в том числе заказ, снятый из-за того, что на этапе нет сотрудников).
+        """
+        self.event_listeners.append(listener)
+
+    def now(self):
+        """Текущее время по часам конвейера."""
+        return self.scheduler.now()
+
+    def _emit(self, event, order, employee=None):
+        if not self.event_listeners:
+            return
+        now = self.scheduler.now()
+        for listener in self.event_listeners:
+            listener(event, order, employee, now)
+
+    @contextmanager
+    def exclusive(self):
+        """Остановить все изменения конвейера (для перезагрузки конфигурации)."""
+        with ExitStack() as stack:
+            for role in self.pipeline.roles:
+                stack.enter_context(self.role_locks[role])
+            stack.enter_context(self.orders_lock)
+            yield
 
     def add_order(self, recipe_name, quantity):
-        with self.lock:
-            result = self.database.process_order(recipe_name, quantity)
-            if "error" in result:
-                return result
+        rejection = self._check_admission(1)
+        if rejection:
+            return rejection
+        # База сама блокирует нужные ингредиенты; исполнителя назначает диспетчер,
+        # поэтому в очередь повара база заказ не ставит
+        try:
+            result = self.database.process_order(recipe_name, quantity, assign=False)
+        except Exception:
+            self._release_admission(1)
+            raise
+        if "error" in result:
+            self._release_admission(1)
+            return result
+
+        noise_factor = self.random.uniform(0.8, 1.2)  # Добавляем шумовую величину
+        time_to_complete = result["time_to_complete"] * noise_factor
 
-            noise_factor = random.uniform(0.8, 1.2)  # Добавляем шумовую величину
-            time_to_complete = result["time_to_complete"] * noise_factor
+        order = Order(
+            order_id=result["order_id"],
+            recipe_name=recipe_name,
+            quantity=quantity,
+            time_to_complete=time_to_complete,
+            work=result["work"] * noise_factor,
+        )
+        self._enqueue(order)
+        self._log(f"Заказ {order.order_id} добавлен в очередь.", order_id=order.order_id, recipe=recipe_name,
+                  quantity=quantity, stage=order.stage)
+        self._after_enqueue()
+        return {
+            "status": "Order added to the queue",
+            "order_id": order.order_id,
+            "time_to_complete": time_to_complete,
+            "total_cost": result["total_cost"],
+        }
 
+    def add_order_batch(self, items):
+        """Принять чек из нескольких позиций целиком или отклонить его целиком."""
+        rejection = self._check_admission(len(items))
+        if rejection:
+            return rejection
+        try:
+            result = self.database.process_order_batch(items, assign=False)
+        except Exception:
+            self._release_admission(len(items))
+            raise
+        if "error" in result:
+            self._release_admission(len(items))
+            return result
+
+        order_ids = []
+        for item in result["items"]:
+            noise_factor = self.random.uniform(0.8, 1.2)
+            item["time_to_complete"] *= noise_factor
             order = Order(
-                order_id=len(self.active_threads) + 1,
-                recipe_name=recipe_name,
-                quantity=quantity,
-                time_to_complete=time_to_complete,
+                order_id=item["order_id"],
+                recipe_name=item["recipe_name"],
+                quantity=item["quantity"],
+                time_to_complete=item["time_to_complete"],
+                work=item["work"] * noise_factor,
             )
-            self.orders_queue.put(order)
-            print(f"Заказ {order.order_id} добавлен в очередь.")
-            return {"status": "Order added to the queue", "order_id": order.order_id}
+            order_ids.append(order.order_id)
+            self._enqueue(order)
+        self._log(f"Заказы {order_ids} добавлены в очередь.", order_ids=order_ids)
+        self._after_enqueue()
+        return {
+            "status": "Orders added to the queue",
+            "order_ids": order_ids,
+            "items": result["items"],
+            "total_cost": result["total_cost"],
+        }
+
+    def _check_admission(self, count):
+        # Быстрый отказ до проверки и списания ингредиентов
+        if self.admission is None:
+            return None
+        return self.admission.check(count)
+
+    def _release_admission(self, count):
+        if self.admission is not None:
+            self.admission.release(count)
+
+    def _enter_stage(self, order, stage_name):
+        # Перевести заказ на этап конвейера (под блокировкой роли прежнего этапа)
+        order.stage = stage_name
+        order.work = order.base_work * self.pipeline.stage(stage_name).work_factor
+        order.stage_entered_at = self.scheduler.now()
+        order.stage_started_at = None
+
+    def _enqueue(self, order):
+        order.created_at = self.scheduler.now()
+        self._enter_stage(order, self.pipeline.first.name)
+        with self.orders_lock:
+            self.orders[order.order_id] = order
+        if self.admission is not None:
+            self.admission.record(order)
+        # Событие до постановки в очередь: иначе диспетчер может успеть сообщить started раньше queued
+        self._emit("queued", order)
+        self.orders_queue.put(order)
+
+    def _after_enqueue(self):
+        # В синхронном режиме нет потока диспетчера: распределяем сразу, уже без блокировки
+        if self.synchronous:
+            self.dispatch_pending()
+
+    def cancel_order(self, order_id):
+        """Отменить незавершённый заказ.
+
+        Заказ снимается с сотрудника за O(1); если он ещё ждёт в общей
+        очереди, диспетчер пропустит его при извлечении. Списанные
+        ингредиенты не возвращаются.
+        """
+        with self.orders_lock:
+            order = self.orders.get(order_id)
+        if order is None:
+            return {"error": "Order not found"}
+        while True:
+            stage = order.stage
+            with self.role_locks[self.pipeline.role_of(stage)]:
+                if order.stage != stage:
+                    continue  # Этап сменился, пока ждали блокировку
+                with self.orders_lock:
+                    if self.orders.pop(order_id, None) is None:
+                        return {"error": "Order not found"}  # Успели доставить или отменить
+                order.cancelled = True
+                if order.batch is not None:
+                    # Из партии заказ просто выбывает; сама партия снимается, только если опустела
+                    job = order.batch
+                    job.remove(order)
+                    if job.orders:
+                        job = None
+                    else:
+                        job.cancelled = True
+                        if job.flush_timer is not None:
+                            job.flush_timer.cancel()
+                        if self.forming.get(job.recipe_name) is job:
+                            del self.forming[job.recipe_name]
+                else:
+                    job = order
+                employee = order.employee
+                started = batch = None
+                if job is not None:
+                    employee = job.employee
+                    if job.timer is not None:
+                        job.timer.cancel()
+                        job.timer = None
+                    if employee is not None:
+                        employee.cancel_order(job.order_id)
+                        # Если отменили выполняемый заказ, сотрудник берётся за следующий
+                        started = self._start_next(employee)
+                        batch = self._batch_for_idle(employee)
+                self._emit("cancelled", order, employee)
+                break
+        self._log(f"Заказ {order_id} отменён (этап: {stage}).", order_id=order_id, stage=stage)
+        self._log_started(started, employee)
+        if batch is not None:
+            self._flush_batch(batch)
+        return {"status": "Order canceled", "order_id": order_id}
+
+    def employees_changed(self):
+        """Сотрудники перечитаны из конфигурации: распределение и так идёт по индексу загрузки базы."""
 
     def process_orders(self):
+        # Блокирующее ожидание: пока очередь пуста, поток спит и не занимает ни процессор, ни GIL
         while True:
-            if not self.orders_queue.empty():
-                with self.lock:
-                    order = self.orders_queue.get()
-                self.assign_order_to_employee(order)
+            order = self.orders_queue.get()
+            if isinstance(order, _Shutdown):
+                break
+            if order.cancelled:
+                continue
+            self.assign_order_to_employee(order)
+
+    def dispatch_pending(self):
+        """Распределить все заказы, ожидающие в общей очереди (без блокирующего ожидания)."""
+        while True:
+            try:
+                order = self.orders_queue.get_nowait()
+            except Empty:
+                return
+            if isinstance(order, _Shutdown) or order.cancelled:
+                continue
+            self.assign_order_to_employee(order)
 
     def assign_order_to_employee(self, order):
-        employee_role = "chef" if order.stage == "chef" else "waiter"
-        employee = self.database.get_least_loaded_employee(employee_role)
+        if self.batching is not None and order.stage == self.pipeline.first.name and not isinstance(order, KitchenBatch):
+            if self._add_to_batch(order):
+                return
+        employee_role = self.pipeline.role_of(order.stage)
+        employee = self.policy.select(self.database, employee_role, order, self.scheduler.now())
         if not employee:
-            print(f"Нет доступных сотрудников с ролью {employee_role}.")
+            self._log(f"Нет доступных сотрудников с ролью {employee_role}. Заказ {order.order_id} снят.",
+                      logging.WARNING, order_id=order.order_id, stage=order.stage, role=employee_role)
+            self._drop(order)
             return
 
-        print(f"Назначаем заказ {order.order_id} сотруднику {employee.name} ({employee.role}).")
-        employee.assign_order(order)
+        self._log(f"Назначаем заказ {order.order_id} сотруднику {employee.name} ({employee.role}).",
+                  order_id=order.order_id, stage=order.stage, employee_id=employee.id)
+        with self.role_locks[employee_role]:
+            if order.cancelled:
+                return
+            order.employee = employee
+            employee.assign_order(order)
+            started = self._start_next(employee)
+        self._log_started(started, employee)
+
+    def _drop(self, job):
+        # Снять заказ (или все заказы партии), который некому выполнить: для подписчиков
+        # это отмена, поэтому контроль приёма и метрики этапов освобождают его место
+        with self.role_locks[self.pipeline.role_of(job.stage)]:
+            if job.cancelled:
+                return
+            job.cancelled = True
+            members = _members(job)
+            for member in members:
+                member.cancelled = True
+                with self.orders_lock:
+                    self.orders.pop(member.order_id, None)
+                self._emit("cancelled", member)
+
+    def _add_to_batch(self, order):
+        # Положить заказ в набираемую партию его рецепта; False - готовить отдельно
+        recipe = self.database.get_recipe_by_name(order.recipe_name)
+        factor = self.batching.factor_for(recipe)
+        if factor >= 1:
+            return False  # Партия не быстрее заказов по отдельности
+        role = self.pipeline.first.role
+        with self.role_locks[role]:
+            if order.cancelled:
+                return True
+            idle = self._has_idle_employee(role)
+            batch = self.forming.get(order.recipe_name)
+            if batch is None:
+                if idle:
+                    return False  # Свободный повар возьмётся сразу, ждать окно незачем
+                batch = self.forming[order.recipe_name] = KitchenBatch(order.recipe_name, factor, order.stage)
+                batch.flush_timer = self.scheduler.call_later(self.batching.window, self._flush_batch, batch)
+            batch.add(order)
+            ready = idle or len(batch.orders) >= self.batching.max_size
+            if ready:
+                batch.flush_timer.cancel()
+        if ready:
+            self._flush_batch(batch)
+        return True
+
+    def _has_idle_employee(self, role):
+        employee = self.database.get_least_loaded_employee(role)
+        return employee is not None and employee.get_load() == 0
+
+    def _batch_for_idle(self, employee):
+        # Вызывается под блокировкой роли: освободившийся повар забирает самую старую
+        # набираемую партию, не дожидаясь конца её окна
+        if self.batching is None or employee.role != self.pipeline.first.role or employee.get_load():
+            return None
+        for batch in self.forming.values():
+            batch.flush_timer.cancel()
+            return batch
+        return None
 
-        thread = threading.Thread(target=self.complete_order, args=(employee, order))
-        thread.start()
-        self.active_threads.append(thread)
+    def _flush_batch(self, batch):
+        # Окно набора истекло или партия заполнена: передать её повару как один заказ
+        with self.role_locks[self.pipeline.first.role]:
+            if self.forming.get(batch.recipe_name) is batch:
+                del self.forming[batch.recipe_name]
+            if batch.sealed or batch.cancelled:
+                return
+            batch.seal()
+        order_ids = [order.order_id for order in batch.orders]
+        self._log(f"Партия {batch.order_id}: заказы {order_ids}.", order_id=batch.order_id, order_ids=order_ids,
+                  work=batch.work)
+        self.assign_order_to_employee(batch)
+
+    def _start_next(self, employee):
+        # Вызывается под блокировкой роли сотрудника: запустить таймер для первого
+        # заказа в его очереди. Возвращает запущенный заказ или None
+        order = self.policy.next_order(employee)
+        if order is None or order.timer is not None:
+            return None  # Сотрудник свободен или уже занят этим заказом
+        order.stage_started_at = self.scheduler.now()
+        duration = order.work / employee.performance
+        order.timer = self.scheduler.call_later(duration, self.complete_order, employee, order)
+        for member in _members(order):
+            member.employee = employee
+            member.stage_started_at = order.stage_started_at
+            self._emit("started", member, employee)
+        return order
+
+    def _log_started(self, order, employee):
+        if order is not None:
+            self._log(f"Сотрудник {employee.name} начал выполнение заказа {order.order_id} (этап: {order.stage}).",
+                      order_id=order.order_id, stage=order.stage, employee_id=employee.id,
+                      duration=order.work / employee.performance)
 
     def complete_order(self, employee, order):
-        print(f"Сотрудник {employee.name} начал выполнение заказа {order.order_id} (этап: {order.stage}).")
-        time.sleep(order.time_to_complete)
-        with self.lock:
-            completed_order = employee.complete_order()
-            if completed_order:
-                if order.stage == "chef":
-                    print(f"Повар {employee.name} завершил заказ {order.order_id}. Передаем официанту.")
-                    order.stage = "waiter"
-                    self.orders_queue.put(order)
-                elif order.stage == "waiter":
-                    print(f"Официант {employee.name} завершил заказ {order.order_id}.")
+        # Вызывается планировщиком, когда истекло время этапа
+        with self.role_locks[employee.role]:
+            if order.cancelled:
+                return  # Заказ уже снят с сотрудника в cancel_order
+            # Снимаем именно этот заказ, а не голову очереди
+            completed_order = employee.complete_order(order.order_id)
+            stage = order.stage
+            started = None
+            next_stage = self.pipeline.next_stage(stage)
+            if order.stage_started_at is not None:
+                service_time = self.scheduler.now() - order.stage_started_at
             else:
-                print(f"Ошибка: Заказ {order.order_id} не найден в стеке сотрудника {employee.name}.")
+                service_time = None
+            members = _members(order) if completed_order else []
+            if completed_order:
+                order.employee = None
+                order.timer = None
+                # Партия расходится по заказам: каждый сам идёт на следующий этап
+                for member in members:
+                    member.employee = None
+                    self._emit("completed", member, employee)
+                    member.batch = None
+                    if next_stage is not None:
+                        self._enter_stage(member, next_stage)
+                        self.orders_queue.put(member)
+                    else:
+                        with self.orders_lock:
+                            self.orders.pop(member.order_id, None)
+                        self._emit("delivered", member, employee)
+                started = self._start_next(employee)
+            batch = self._batch_for_idle(employee)
+        if not completed_order:
+            self._log(f"Ошибка: Заказ {order.order_id} не найден в стеке сотрудника {employee.name}.", logging.ERROR,
+                      order_id=order.order_id, stage=stage, employee_id=employee.id)
+        elif next_stage is not None:
+            for member in members:
+                self._log(f"{employee.name} завершил этап {stage} заказа {member.order_id}. Передаем на этап {next_stage}.",
+                          order_id=member.order_id, stage=stage, next_stage=next_stage, employee_id=employee.id,
+                          service_time=service_time)
+        else:
+            self._log(f"{employee.name} завершил заказ {order.order_id}.", order_id=order.order_id, stage=stage,
+                      employee_id=employee.id, service_time=service_time)
+        self._log_started(started, employee)
+        if batch is not None:
+            self._flush_batch(batch)
+        self._after_enqueue()
 
-    def monitor_threads(self):
-        while True:
-            with self.lock:
-                self.active_threads = [t for t in self.active_threads if t.is_alive()]
-            time.sleep(1)
+    def is_running(self):
+        if self.synchronous:
+            return self.scheduler.is_running()
+        return self._dispatcher is not None and self._dispatcher.is_alive()
 
     def start(self):
-        threading.Thread(target=self.process_orders, daemon=True).start()
-        threading.Thread(target=self.monitor_threads, daemon=True).start()
+        if self.is_running():
+            return
+        self.scheduler.start()
+        if self.synchronous:
+            return
+        self._dispatcher = threading.Thread(target=self.process_orders, name="order-dispatcher", daemon=True)
+        self._dispatcher.start()
+
+    def stop(self, timeout=None):
+        """Остановить диспетчер и планировщик. Заказы в очереди и незавершённые этапы дождутся следующего start()."""
+        if not self.is_running():
+            return
+        if self._dispatcher is not None:
+            self.orders_queue.put(_Shutdown())
+            self._dispatcher.join(timeout)
+            self._dispatcher = None
+        self.scheduler.stop(timeout)
+
+
+def _members(job):
+    """Заказы, которые выполняются в рамках job: состав партии или сам заказ."""
+    return list(job.orders) if isinstance(job, KitchenBatch) else [job]
@@ -0,0 +1,277 @@
+# Профилирование выбранных запросов по требованию: cProfile или выборка стеков
+import cProfile
+import io
+import itertools
+import json
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+PROFILE_MODES = ("cprofile", "sampling")
+
+# Допустимые ключи сортировки текстового отчёта: все, что принимает Stats.sort_stats,
+# включая сокращения tottime, cumtime, ncalls и module
+SORT_KEYS = tuple(sorted(pstats.Stats.sort_arg_dict_default))
+
+# Заголовок, которым клиент просит профилировать свой запрос (если allow_header)
+PROFILE_HEADER = "X-Profile"
+
+
+class StackSampler:
+    """Выборочный профилировщик одного потока.
+
+    Фоновый поток каждые interval секунд снимает стек профилируемого потока
+    через sys._current_frames() и считает одинаковые стеки. Сам поток запроса
+    не замедляется, поэтому подходит для медленных запросов, где cProfile
+    исказил бы время. Результат - свёрнутые стеки (формат flamegraph.pl).
+    """
+
+    def __init__(self, thread_id, interval=0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        if stack:
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def collapse_pstats(stats):
+    """Свёрнутые пары вызывающий;вызываемый из pstats (у cProfile нет полных стеков)."""
+    lines = []
+    for (filename, line, name), (_, _, _, _, callers) in stats.stats.items():
+        callee = f"{name} ({os.path.basename(filename)}:{line})"
+        for (caller_file, caller_line, caller_name), caller_stats in callers.items():
+            caller = f"{caller_name} ({os.path.basename(caller_file)}:{caller_line})"
+            # Собственное время вызываемой функции при вызовах из caller, микросекунды
+            lines.append(f"{caller};{callee} {max(1, int(caller_stats[2] * 1e6))}\n")
+    return "".join(sorted(lines))
+
+
+class RequestProfiler:
+    """Профили выбранных запросов в каталоге directory с ротацией.
+
+    Включается во время работы (POST /admin/profiling): профилируется доля
+    sample_rate запросов к маршрутам routes (пусто - к любым) и, если
+    allow_header, каждый запрос с заголовком X-Profile: 1. Одновременно
+    профилируется не больше одного запроса: cProfile и выборка стеков
+    рассчитаны на один профилируемый поток, а остальные запросы в это время
+    просто не профилируются.
+
+    Для каждого профиля пишутся файл метаданных .json и, в зависимости от
+    mode, .pstats (cProfile) или только .collapsed (выборка стеков);
+    свёрнутые стеки пишутся в обоих режимах. Хранятся последние max_profiles
+    профилей, старые удаляются.
+    """
+
+    def __init__(self, directory, max_profiles=100, sample_interval=0.001, rng=None):
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self.sample_interval = sample_interval
+        self.random = rng or random.Random()
+        self.lock = threading.Lock()
+        self.enabled = False
+        self.sample_rate = 1.0
+        self.routes = set()
+        self.allow_header = False
+        self.mode = "cprofile"
+        self.profiles = {}  # ID -> метаданные, в порядке записи
+        self._active = threading.Lock()  # Занят, пока идёт профилирование запроса
+        self._ids = itertools.count(1)
+        self._load_index()
+
+    def _load_index(self):
+        if not os.path.isdir(self.directory):
+            return
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                try:
+                    with open(os.path.join(self.directory, name), 'r', encoding='utf-8') as file:
+                        entries.append(json.load(file))
+                except (OSError, ValueError):
+                    continue
+        for entry in sorted(entries, key=lambda entry: entry["started_at"]):
+            self.profiles[entry["id"]] = entry
+
+    def configure(self, enabled=None, sample_rate=None, routes=None, allow_header=None, mode=None):
+        if sample_rate is not None and not 0 <= sample_rate <= 1:
+            raise ValueError("sample_rate must be between 0 and 1")
+        if mode is not None and mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profiling mode: {mode}")
+        with self.lock:
+            if enabled is not None:
+                self.enabled = bool(enabled)
+            if sample_rate is not None:
+                self.sample_rate = sample_rate
+            if routes is not None:
+                self.routes = set(routes)
+            if allow_header is not None:
+                self.allow_header = bool(allow_header)
+            if mode is not None:
+                self.mode = mode
+        return self.config()
+
+    def config(self):
+        with self.lock:
+            return {
+                "enabled": self.enabled,
+                "sample_rate": self.sample_rate,
+                "routes": sorted(self.routes),
+                "allow_header": self.allow_header,
+                "mode": self.mode,
+                "directory": self.directory,
+                "max_profiles": self.max_profiles,
+            }
+
+    def should_profile(self, route, header):
+        if self.allow_header and header == "1":
+            return True
+        if not self.enabled or (self.routes and route not in self.routes):
+            return False
+        return self.random.random() < self.sample_rate
+
+    def start(self):
+        """Начать профилирование текущего потока; None, если уже профилируется другой запрос."""
+        if not self._active.acquire(blocking=False):
+            return None
+        try:
+            if self.mode == "sampling":
+                return StackSampler(threading.get_ident(), self.sample_interval).start()
+            profile = cProfile.Profile()
+            profile.enable()
+            return profile
+        except Exception:
+            self._active.release()
+            raise
+
+    def stop(self, profiler, request_info):
+        """Остановить профилирование и записать профиль; возвращает его метаданные."""
+        try:
+            if isinstance(profiler, StackSampler):
+                profiler.stop()
+            else:
+                profiler.disable()
+        finally:
+            self._active.release()
+        profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{next(self._ids):06d}"
+        entry = dict(request_info, id=profile_id, mode="sampling" if isinstance(profiler, StackSampler) else "cprofile")
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, profile_id)
+        if isinstance(profiler, StackSampler):
+            collapsed = profiler.collapsed()
+            entry["samples"] = sum(profiler.stacks.values())
+        else:
+            stats = pstats.Stats(profiler)
+            stats.dump_stats(base + ".pstats")
+            collapsed = collapse_pstats(stats)
+            entry["calls"] = stats.total_calls
+        with open(base + ".collapsed", 'w', encoding='utf-8') as file:
+            file.write(collapsed)
+        with open(base + ".json", 'w', encoding='utf-8') as file:
+            json.dump(entry, file, ensure_ascii=False)
+        with self.lock:
+            self.profiles[profile_id] = entry
+            expired = list(self.profiles)[:-self.max_profiles] if len(self.profiles) > self.max_profiles else []
+            for old_id in expired:
+                del self.profiles[old_id]
+        for old_id in expired:
+            for extension in (".json", ".pstats", ".collapsed"):
+                try:
+                    os.remove(os.path.join(self.directory, old_id + extension))
+                except FileNotFoundError:
+                    pass
+        return entry
+
+    def slowest(self, count=10):
+        """Метаданные count самых медленных сохранённых профилей."""
+        with self.lock:
+            entries = list(self.profiles.values())
+        return sorted(entries, key=lambda entry: entry["duration"], reverse=True)[:count]
+
+    def get(self, profile_id):
+        with self.lock:
+            return self.profiles.get(profile_id)
+
+    def path(self, profile_id, extension):
+        """Путь к файлу профиля или None, если такого профиля или файла нет."""
+        if self.get(profile_id) is None:
+            return None
+        path = os.path.join(self.directory, profile_id + extension)
+        return path if os.path.exists(path) else None
+
+    def report(self, profile_id, sort="cumulative", limit=40):
+        """Текстовый отчёт pstats по профилю cProfile."""
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Unknown sort key: {sort}")
+        path = self.path(profile_id, ".pstats")
+        if path is None:
+            return None
+        output = io.StringIO()
+        pstats.Stats(path, stream=output).sort_stats(sort).print_stats(limit)
+        return output.getvalue()
+
+
+def profile_app(app, profiler):
+    """Профилировать выбранные запросы приложения Flask (см. RequestProfiler)."""
+    from flask import g, request
+
+    @app.before_request
+    def start_profile():
+        route = request.url_rule.rule if request.url_rule is not None else None
+        if route is None or not profiler.should_profile(route, request.headers.get(PROFILE_HEADER)):
+            return
+        active = profiler.start()
+        if active is not None:
+            g.profile = (active, route, time.time(), time.perf_counter())
+
+    @app.after_request
+    def remember_status(response):
+        if "profile" in g:
+            g.profile_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def finish_profile(exc):
+        profile = g.pop("profile", None)
+        if profile is None:
+            return
+        active, route, started_at, started = profile
+        profiler.stop(active, {
+            "method": request.method,
+            "route": route,
+            "path": request.full_path.rstrip("?"),
+            "status": g.pop("profile_status", 500),
+            "started_at": started_at,
+            "duration": time.perf_counter() - started,
+        })
+
+    return app
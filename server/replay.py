@@ -0,0 +1,268 @@
+# Воспроизведение записанного потока запросов к API для планирования мощностей
+#
+# Запросы из JSONL-файла отправляются в приложение внутри процесса через
+# тестовый клиент Flask в моменты, указанные в файле, ускоренные в --speedup
+# раз (во столько же раз сокращены этапы кухни). Работа идёт на копии
+# конфигурации во временном каталоге, так что исходные файлы не меняются.
+# Запуск из корня репозитория:
+#     python server/replay.py traffic.jsonl --speedup 60 --staffing chef=3,waiter=2 --output report.json
+#     python server/replay.py --synthetic 2000 --interval 3 --speedup 100
+# Строка файла - вызов API в момент time (секунды от начала записи):
+#     {"time": 0.0, "op": "reserve", "hall_id": 1, "table_id": 3}
+#     {"time": 1.5, "op": "order", "recipe_name": "Burger", "quantity": 2}
+#     {"time": 2.0, "op": "release", "hall_id": 1, "table_id": 3}
+#     {"time": 2.5, "op": "batch", "items": [{"recipe_name": "Burger", "quantity": 1}]}
+#     {"time": 3.0, "method": "GET", "path": "/orders/eta?recipe=Burger"}
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+from werkzeug.exceptions import HTTPException
+
+from server import create_app
+from simulation import parse_staffing, percentile, set_staffing
+
+
+def to_request(event):
+    """Метод, путь и тело запроса для строки файла."""
+    op = event.get("op")
+    if op is None:
+        return event.get("method", "GET").upper(), event["path"], event.get("json")
+    if op == "reserve" or op == "release":
+        return "POST", f"/halls/{event['hall_id']}/tables/{event['table_id']}/{op}", None
+    if op == "order":
+        return "POST", "/orders", {"recipe_name": event["recipe_name"], "quantity": event.get("quantity", 1)}
+    if op == "batch":
+        return "POST", "/orders/batch", {"items": event["items"]}
+    if op == "cancel":
+        return "POST", f"/orders/{event['order_id']}/cancel", None
+    raise ValueError(f"Unknown operation: {op}")
+
+
+def load_traffic(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        events = [json.loads(line) for line in file if line.strip()]
+    return sorted(events, key=lambda event: event["time"])
+
+
+def synthetic_traffic(database, count, interval, seed=1):
+    """Случайный поток: заказы, брони и освобождения столов с пуассоновскими интервалами."""
+    rng = random.Random(seed)
+    recipes = [recipe.name for recipe in database.recipes]
+    tables = [(hall.id, table.id) for hall in database.halls for table in hall.tables]
+    reserved = []
+    events = []
+    now = 0.0
+    for _ in range(count):
+        now += rng.expovariate(1.0 / interval)
+        roll = rng.random()
+        if roll < 0.5 or not tables:
+            events.append({"time": now, "op": "order", "recipe_name": rng.choice(recipes),
+                           "quantity": rng.randint(1, 3)})
+        elif roll < 0.75 or not reserved:
+            hall_id, table_id = rng.choice(tables)
+            reserved.append((hall_id, table_id))
+            events.append({"time": now, "op": "reserve", "hall_id": hall_id, "table_id": table_id})
+        else:
+            hall_id, table_id = reserved.pop(rng.randrange(len(reserved)))
+            events.append({"time": now, "op": "release", "hall_id": hall_id, "table_id": table_id})
+    return events
+
+
+class Replay:
+    """Прогон потока запросов через приложение с замером задержек и снятием состояния.
+
+    Время в отчёте - время записи (реальное время прогона, умноженное на
+    speedup); задержки запросов - реальные, в миллисекундах. Каждые
+    sample_interval секунд времени записи запоминаются глубины очередей по
+    этапам, число заказов в работе и остатки ингредиентов.
+    """
+
+    def __init__(self, config_file, speedup=1.0, staffing=None, sample_interval=60.0, **app_options):
+        self.workdir = tempfile.mkdtemp(prefix="replay-")
+        work_config = os.path.join(self.workdir, os.path.basename(config_file))
+        shutil.copy(config_file, work_config)
+        self.app = create_app(work_config, **app_options)
+        self.state = self.app.extensions["restaurant_state"]
+        self.state.process_manager.verbose = False
+        self.database = self.state.db
+        self.speedup = speedup
+        if staffing:
+            set_staffing(self.database, staffing)
+            self.state.process_manager.employees_changed()
+        # Этапы кухни сокращаются так же, как интервалы между запросами
+        for recipe in self.database.recipes:
+            recipe.complexity /= speedup
+        self.sample_interval = sample_interval
+        self.client = self.app.test_client()
+        self.adapter = self.app.url_map.bind("localhost")
+        self.latencies = defaultdict(list)  # Маршрут -> задержки, мс
+        self.statuses = defaultdict(lambda: defaultdict(int))  # Маршрут -> код ответа -> число
+        self.timeline = []
+        self.order_latencies = []
+        self.max_lag = 0.0
+        self.started = None
+        self.state.process_manager.add_event_listener(self._on_event)
+
+    def _clock(self):
+        # Время записи, прошедшее с начала прогона
+        return (time.monotonic() - self.started) * self.speedup
+
+    def _on_event(self, event, order, employee, now):
+        if event == "delivered":
+            self.order_latencies.append((now - order.created_at) * self.speedup)
+
+    def _route(self, method, path):
+        try:
+            rule, _ = self.adapter.match(path.split("?", 1)[0], method=method, return_rule=True)
+            return f"{method} {rule.rule}"
+        except HTTPException:
+            return f"{method} {path}"
+
+    def _sample(self):
+        manager = self.state.process_manager
+        stock = self.database.stock
+        self.timeline.append({
+            "time": self._clock(),
+            "in_progress": len(manager.orders),
+            "queue_depth": {stage["name"]: stage["queue_depth"] for stage in manager.stage_metrics.snapshot()["stages"]},
+            "stock": {
+                self.database.ingredients_by_id[ingredient_id].name: float(amount)
+                for ingredient_id, amount in zip(stock.ingredient_ids, stock.totals)
+                if ingredient_id in self.database.ingredients_by_id
+            },
+        })
+
+    def _sampler(self, stop):
+        while not stop.wait(self.sample_interval / self.speedup):
+            self._sample()
+
+    def run(self, events, drain=True, drain_timeout=60.0):
+        stop = threading.Event()
+        sampler = threading.Thread(target=self._sampler, args=(stop,), name="replay-sampler", daemon=True)
+        self.started = time.monotonic()
+        self._sample()
+        sampler.start()
+        first = events[0]["time"] if events else 0.0
+        try:
+            for event in events:
+                delay = (event["time"] - first) / self.speedup - (time.monotonic() - self.started)
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    self.max_lag = max(self.max_lag, -delay * self.speedup)
+                method, path, body = to_request(event)
+                route = self._route(method, path)
+                request_started = time.perf_counter()
+                response = self.client.open(path, method=method, json=body)
+                self.latencies[route].append((time.perf_counter() - request_started) * 1000)
+                self.statuses[route][response.status_code] += 1
+            replay_end = self._clock()
+            if drain:
+                deadline = time.monotonic() + drain_timeout
+                while self.state.process_manager.orders and time.monotonic() < deadline:
+                    time.sleep(0.01)
+        finally:
+            stop.set()
+            sampler.join()
+        self._sample()
+        return self.report(len(events), replay_end)
+
+    def report(self, requests, replay_end):
+        elapsed = self._clock()
+        return {
+            "requests": requests,
+            "replay_time": replay_end,
+            "elapsed": elapsed,
+            "throughput": requests / replay_end if replay_end else None,  # Запросов в секунду записи
+            "max_lag": self.max_lag,  # Насколько отставала отправка запросов от записи
+            "routes": {
+                route: {
+                    "count": len(latencies),
+                    "statuses": dict(self.statuses[route]),
+                    "p50_ms": percentile(latencies, 0.5),
+                    "p90_ms": percentile(latencies, 0.9),
+                    "p99_ms": percentile(latencies, 0.99),
+                    "max_ms": max(latencies),
+                }
+                for route, latencies in sorted(self.latencies.items())
+            },
+            "orders": {
+                "delivered": len(self.order_latencies),
+                "in_progress": len(self.state.process_manager.orders),
+                "p50_latency": percentile(self.order_latencies, 0.5) if self.order_latencies else None,
+                "p90_latency": percentile(self.order_latencies, 0.9) if self.order_latencies else None,
+            },
+            "stages": self.state.process_manager.stage_metrics.snapshot(),
+            "timeline": self.timeline,
+        }
+
+    def close(self):
+        self.state.close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def print_summary(report):
+    print(f"requests: {report['requests']}, replay time: {report['replay_time']:.0f}s, "
+          f"throughput: {report['throughput'] or 0:.2f} req/s, max lag: {report['max_lag']:.1f}s")
+    print(f"{'route':<55} {'count':>6} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8}  statuses")
+    for route, stats in report["routes"].items():
+        print(f"{route:<55} {stats['count']:>6} {stats['p50_ms']:>8.2f} {stats['p90_ms']:>8.2f} "
+              f"{stats['p99_ms']:>8.2f}  {stats['statuses']}")
+    orders = report["orders"]
+    print(f"orders delivered: {orders['delivered']}, still in progress: {orders['in_progress']}, "
+          f"latency p50/p90: {orders['p50_latency'] or 0:.0f}/{orders['p90_latency'] or 0:.0f}s")
+    peak = {}
+    for sample in report["timeline"]:
+        for stage, depth in sample["queue_depth"].items():
+            peak[stage] = max(peak.get(stage, 0), depth)
+    print(f"peak queue depth by stage: {peak}, bottleneck: {report['stages']['bottleneck']}")
+    first, last = report["timeline"][0]["stock"], report["timeline"][-1]["stock"]
+    used = sorted(((first[name] - last[name], name) for name in first), reverse=True)[:5]
+    print("most used ingredients: " + ", ".join(f"{name} {first[name]:g} -> {last[name]:g}" for _, name in used))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a JSONL stream of API calls against an in-process app")
+    parser.add_argument("traffic", nargs="?", help="JSONL-файл запросов")
+    parser.add_argument("--config", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json"))
+    parser.add_argument("--speedup", type=float, default=1.0, help="Во сколько раз ускорить время")
+    parser.add_argument("--staffing", type=parse_staffing, help="Заменить персонал, например chef=3,waiter=2")
+    parser.add_argument("--engine", choices=("threads", "asyncio"), default="threads")
+    parser.add_argument("--persistence", choices=("journal", "writer", "file", "sqlite"), default="journal")
+    parser.add_argument("--sample-interval", type=float, default=60.0, help="Шаг снятия состояния, секунды записи")
+    parser.add_argument("--synthetic", type=int, help="Вместо файла - столько случайных запросов")
+    parser.add_argument("--interval", type=float, default=5.0, help="Средний интервал случайных запросов")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--no-drain", action="store_true", help="Не ждать завершения заказов после потока")
+    parser.add_argument("--output", help="Сохранить полный отчёт (с временными рядами) в JSON")
+    args = parser.parse_args()
+    if not args.traffic and not args.synthetic:
+        parser.error("traffic file or --synthetic is required")
+
+    replay = Replay(args.config, args.speedup, args.staffing, args.sample_interval,
+                    persistence=args.persistence, engine=args.engine)
+    try:
+        if args.traffic:
+            events = load_traffic(args.traffic)
+        else:
+            events = synthetic_traffic(replay.database, args.synthetic, args.interval, args.seed)
+        report = replay.run(events, drain=not args.no_drain)
+    finally:
+        replay.close()
+    print_summary(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,47 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, current_app, send_file
 import logging
-import random
+import math
+from logs import read_page
+from profiling import SORT_KEYS
 
 # Инициализация Blueprint
 api_blueprint = Blueprint('api', __name__)
 
-def create_process_manager():
-    from server.process_manager import ProcessManager
-    return ProcessManager
+def get_state():
+    # Общее состояние создаётся в create_app() и живёт всё время работы процесса
+    return current_app.extensions["restaurant_state"]
+
+def get_process_manager():
+    return get_state().process_manager
 
 def get_db():
-    from database import RestaurantDatabase  # Отложенный импорт, чтобы избежать кругового импорта
-    return RestaurantDatabase("server/config.json")
+    return get_state().db
+
+def is_durable_request():
+    # ?durable=1 - ответить только после записи изменений на диск
+    return request.args.get("durable", "").lower() in ("1", "true", "yes")
+
+def persist_changes():
+    if not get_state().persist(durable=is_durable_request()):
+        return jsonify({"error": "Changes were not persisted in time"}), 503
+    return None
+
+def is_valid_quantity(quantity):
+    # Количество - целое положительное число (bool в JSON - не количество)
+    return isinstance(quantity, int) and not isinstance(quantity, bool) and quantity > 0
+
+# Коды ответа при отказе контроля приёма: 429 - слишком частые заказы, 503 - кухня перегружена
+ADMISSION_STATUS = {"rate_limited": 429, "queue_full": 503}
+
+def order_error(result):
+    status = ADMISSION_STATUS.get(result.get("reason"))
+    if status is None:
+        return jsonify(result), 400
+    response = jsonify(result)
+    response.status_code = status
+    if result.get("retry_after") is not None:
+        response.headers["Retry-After"] = str(max(1, math.ceil(result["retry_after"])))
+    return response
 
 # ==== ДИНАМИЧЕСКОЕ ОБНОВЛЕНИЕ СТАТУСОВ (WebSocket) ====
 # Для интеграции WebSocket потребуется отдельный сервер или использование Flask-SocketIO.
@@ -34,12 +64,24 @@ def get_hall(hall_id):
         return jsonify({"error": "Hall not found"}), 404
     return jsonify({"id": hall.id, "name": hall.name, "tables": [{"id": table.id, "status": table.status} for table in hall.tables]})
 
+@api_blueprint.route("/halls/<int:hall_id>/tables", methods=["GET"])
+def get_hall_tables(hall_id):
+    db = get_db()
+    """Получить ID столов зала с указанным статусом (по умолчанию свободных)."""
+    status = request.args.get("status", "free")
+    table_ids = db.get_tables_by_status(hall_id, status)
+    if table_ids is None:
+        return jsonify({"error": "Hall not found"}), 404
+    return jsonify({"hall_id": hall_id, "status": status, "tables": table_ids})
+
 @api_blueprint.route("/halls/<int:hall_id>/tables/<int:table_id>/reserve", methods=["POST"])
 def reserve_table(hall_id, table_id):
     db = get_db()
     """Забронировать столик."""
     if db.reserve_table(hall_id, table_id):
-        db.save_changes()
+        error = persist_changes()
+        if error:
+            return error
         return jsonify({"status": "Table reserved successfully"}), 200
     return jsonify({"error": "Table is not available"}), 400
 
@@ -48,7 +90,9 @@ def release_table(hall_id, table_id):
     db = get_db()
     """Освободить столик."""
     if db.release_table(hall_id, table_id):
-        db.save_changes()
+        error = persist_changes()
+        if error:
+            return error
         return jsonify({"status": "Table released successfully"}), 200
     return jsonify({"error": "Table is not reserved"}), 400
 
@@ -88,7 +132,7 @@ def get_orders():
 
 @api_blueprint.route("/orders/<int:order_id>/cancel", methods=["POST"])
 def cancel_order(order_id):
-    process_manager = create_process_manager()
+    process_manager = get_process_manager()
     result = process_manager.cancel_order(order_id)
     if "error" in result:
         return jsonify(result), 400
@@ -96,27 +140,82 @@ def cancel_order(order_id):
 
 @api_blueprint.route("/orders", methods=["POST"])
 def process_order():
-    db = get_db()
     """Создать заказ."""
-    data = request.get_json()
+    data = request.get_json(silent=True) or {}
     recipe_name = data.get("recipe_name")
     quantity = data.get("quantity")
 
-    if not recipe_name or not quantity:
+    if not recipe_name or quantity is None:
         return jsonify({"error": "Missing recipe_name or quantity"}), 400
+    if not is_valid_quantity(quantity):
+        return jsonify({"error": "quantity must be a positive integer"}), 400
 
-    # Обработка шумовой величины
-    noise = random.uniform(-0.1, 0.1)  # Шум в пределах -10% до +10%
-    result = db.process_order(recipe_name, quantity, noise)
+    # Менеджер процессов сам проверяет склад, списывает ингредиенты и добавляет шумовую величину
+    result = get_process_manager().add_order(recipe_name, quantity)
     if "error" in result:
-        return jsonify(result), 400
+        return order_error(result)
 
-    process_manager = create_process_manager()
-    process_manager.add_order(recipe_name, quantity)
+    error = persist_changes()
+    if error:
+        return error
+    return jsonify(result)
 
-    db.save_changes()
+@api_blueprint.route("/orders/batch", methods=["POST"])
+def process_order_batch():
+    """Создать заказ из нескольких позиций (все позиции принимаются или отклоняются вместе)."""
+    data = request.get_json(silent=True) or {}
+    items = data.get("items")
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "Missing items"}), 400
+    for item in items:
+        if not isinstance(item, dict) or not item.get("recipe_name") or item.get("quantity") is None:
+            return jsonify({"error": "Each item needs recipe_name and quantity"}), 400
+        if not is_valid_quantity(item["quantity"]):
+            return jsonify({"error": "quantity must be a positive integer"}), 400
+
+    result = get_process_manager().add_order_batch(
+        [{"recipe_name": item["recipe_name"], "quantity": item["quantity"]} for item in items]
+    )
+    if "error" in result:
+        return order_error(result)
+
+    # Одно сохранение на весь чек
+    error = persist_changes()
+    if error:
+        return error
     return jsonify(result)
 
+@api_blueprint.route("/orders/admission", methods=["GET"])
+def get_admission_stats():
+    """Глубина очередей по ролям, ожидаемое время ожидания и счётчики отказов."""
+    return jsonify(get_state().admission.stats())
+
+@api_blueprint.route("/orders/eta", methods=["GET"])
+def get_order_eta():
+    """Прогноз времени до доставки нового заказа: p50/p90/p99 в секундах при текущих очередях."""
+    recipe_name = request.args.get("recipe")
+    quantity = request.args.get("quantity", 1, type=int)
+    if not recipe_name or not quantity or quantity < 1:
+        return jsonify({"error": "Missing recipe or quantity"}), 400
+    db = get_db()
+    recipe = db.get_recipe_by_name(recipe_name)
+    if not recipe:
+        return jsonify({"error": "Recipe not found"}), 404
+    result = get_state().eta.forecast(recipe, quantity)
+    if "error" in result:
+        return jsonify(result), 503
+    return jsonify({
+        "recipe_name": recipe_name,
+        "quantity": quantity,
+        "ingredients_available": db.check_ingredients_for_recipe(recipe_name, quantity),
+        **result,
+    })
+
+@api_blueprint.route("/orders/stages", methods=["GET"])
+def get_stage_metrics():
+    """Глубина очередей, время ожидания и обслуживания по этапам конвейера и узкое место."""
+    return jsonify(get_process_manager().stage_metrics.snapshot())
+
 # ==== ИНГРЕДИЕНТЫ ====
 
 @api_blueprint.route("/ingredients/<int:ingredient_id>", methods=["GET"])
@@ -156,12 +255,80 @@ def get_revenue():
 
 # ==== ЛОГИ ====
 
+# Наибольший размер страницы журнала
+MAX_LOG_PAGE = 1000
+
 @api_blueprint.route("/logs", methods=["GET"])
 def get_logs():
-    """Получить последние записи логов."""
-    with open("server.log", "r") as log_file:
-        logs = log_file.readlines()
-    return jsonify({"logs": logs[-50:]})  # Последние 50 записей
+    """Записи журнала от новых к старым: ?limit=50&cursor=...&level=WARNING&component=kitchen."""
+    limit = request.args.get("limit", 50, type=int)
+    if not limit or not 1 <= limit <= MAX_LOG_PAGE:
+        return jsonify({"error": f"limit must be between 1 and {MAX_LOG_PAGE}"}), 400
+    try:
+        page = read_page(get_state().log_file, limit, cursor=request.args.get("cursor"),
+                         level=request.args.get("level"), component=request.args.get("component"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(page)
+
+# ==== МЕТРИКИ ====
+
+@api_blueprint.route("/metrics", methods=["GET"])
+def get_metrics():
+    """Метрики сервера в текстовом формате Prometheus."""
+    return Response(get_state().metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+# ==== ПРОФИЛИРОВАНИЕ ====
+
+@api_blueprint.route("/admin/profiling", methods=["GET"])
+def get_profiling():
+    """Настройки профилирования и самые медленные запросы с профилями (?top=N)."""
+    profiler = get_state().profiler
+    top = request.args.get("top", 10, type=int)
+    return jsonify({"config": profiler.config(), "slowest": profiler.slowest(top)})
+
+@api_blueprint.route("/admin/profiling", methods=["POST"])
+def configure_profiling():
+    """Включить или выключить профилирование: enabled, sample_rate, routes, allow_header, mode."""
+    data = request.get_json(silent=True) or {}
+    try:
+        config = get_state().profiler.configure(
+            enabled=data.get("enabled"),
+            sample_rate=data.get("sample_rate"),
+            routes=data.get("routes"),
+            allow_header=data.get("allow_header"),
+            mode=data.get("mode"),
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(config), 200
+
+# Форматы выдачи профиля: расширение файла и тип содержимого
+PROFILE_FORMATS = {"pstats": (".pstats", "application/octet-stream"), "collapsed": (".collapsed", "text/plain")}
+
+@api_blueprint.route("/admin/profiling/<profile_id>", methods=["GET"])
+def get_profile(profile_id):
+    """Профиль запроса: ?format=text (отчёт pstats, по умолчанию), pstats или collapsed."""
+    profiler = get_state().profiler
+    entry = profiler.get(profile_id)
+    if entry is None:
+        return jsonify({"error": "Profile not found"}), 404
+    output_format = request.args.get("format", "text")
+    if output_format == "text":
+        sort = request.args.get("sort", "cumulative")
+        if sort not in SORT_KEYS:
+            return jsonify({"error": f"Unknown sort key: {sort}", "sort_keys": list(SORT_KEYS)}), 400
+        report = profiler.report(profile_id, sort=sort)
+        if report is None:
+            return jsonify({"error": "Text report is available for cprofile profiles only"}), 404
+        return Response(report, content_type="text/plain; charset=utf-8")
+    if output_format not in PROFILE_FORMATS:
+        return jsonify({"error": f"Unknown format: {output_format}"}), 400
+    extension, mimetype = PROFILE_FORMATS[output_format]
+    path = profiler.path(profile_id, extension)
+    if path is None:
+        return jsonify({"error": "Profile file not found"}), 404
+    return send_file(path, mimetype=mimetype, as_attachment=True, download_name=profile_id + extension)
 
 # ==== ТЕСТОВЫЕ ЭНДПОИНТЫ ====
 
@@ -184,7 +351,12 @@ def handle_not_found(e):
 
 @api_blueprint.route("/save", methods=["POST"])
 def save_changes():
-    db = get_db()
     """Сохранить изменения в конфигурационный файл."""
-    db.save_changes()
+    get_state().save()
     return jsonify({"status": "Changes saved successfully"}), 200
+
+@api_blueprint.route("/reload", methods=["POST"])
+def reload_config():
+    """Перечитать конфигурационный файл без перезапуска сервера."""
+    get_state().reload()
+    return jsonify({"status": "Configuration reloaded"}), 200
@@ -0,0 +1,304 @@
+# Структуры для выбора сотрудника при распределении заказов
+import threading
+from collections import OrderedDict
+
+
+class IndexedMinHeap:
+    """Двоичная min-куча с индексом позиций.
+
+    Помимо push/pop поддерживает изменение ключа и удаление произвольного
+    элемента по его идентификатору за O(log n); минимум доступен за O(1).
+    """
+
+    def __init__(self):
+        self._heap = []  # Список [key, item_id]
+        self._position = {}  # item_id -> индекс в self._heap
+        self._items = {}  # item_id -> объект
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __contains__(self, item_id):
+        return item_id in self._position
+
+    def push(self, item_id, key, item):
+        if item_id in self._position:
+            raise KeyError(f"Item {item_id} is already in the heap")
+        self._heap.append([key, item_id])
+        self._position[item_id] = len(self._heap) - 1
+        self._items[item_id] = item
+        self._sift_up(len(self._heap) - 1)
+
+    def peek(self):
+        """Вернуть (key, item) с наименьшим ключом, не удаляя его."""
+        if not self._heap:
+            return None
+        key, item_id = self._heap[0]
+        return key, self._items[item_id]
+
+    def pop(self):
+        if not self._heap:
+            return None
+        key, item_id = self._heap[0]
+        item = self._items[item_id]
+        self.remove(item_id)
+        return key, item
+
+    def key_of(self, item_id):
+        return self._heap[self._position[item_id]][0]
+
+    def update(self, item_id, key):
+        index = self._position[item_id]
+        old_key = self._heap[index][0]
+        self._heap[index][0] = key
+        if key < old_key:
+            self._sift_up(index)
+        else:
+            self._sift_down(index)
+
+    def remove(self, item_id):
+        index = self._position.pop(item_id)
+        del self._items[item_id]
+        last = self._heap.pop()
+        if index < len(self._heap):
+            self._heap[index] = last
+            self._position[last[1]] = index
+            self._sift_up(index)
+            self._sift_down(self._position[last[1]])
+
+    def _swap(self, i, j):
+        heap = self._heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self._position[heap[i][1]] = i
+        self._position[heap[j][1]] = j
+
+    def _sift_up(self, index):
+        heap = self._heap
+        while index > 0:
+            parent = (index - 1) // 2
+            if heap[index][0] < heap[parent][0]:
+                self._swap(index, parent)
+                index = parent
+            else:
+                break
+
+    def _sift_down(self, index):
+        heap = self._heap
+        size = len(heap)
+        while True:
+            smallest = index
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < size and heap[child][0] < heap[smallest][0]:
+                    smallest = child
+            if smallest == index:
+                break
+            self._swap(index, smallest)
+            index = smallest
+
+
+class EmployeeLoadIndex:
+    """Кучи сотрудников по ролям, упорядоченные по текущей нагрузке.
+
+    Ключ сотрудника - (key(employee), порядковый номер): при равной нагрузке
+    выбирается тот, кто раньше добавлен, как и при прежнем min() по списку.
+    Сотрудники сообщают об изменении нагрузки через refresh(), что стоит
+    O(log n) вместо перебора всех сотрудников роли.
+    """
+
+    def __init__(self, key=None):
+        self.key = key or (lambda employee: employee.get_load())
+        self.heaps = {}  # Роль -> IndexedMinHeap
+        self.locks = {}  # Роль -> блокировка своей кучи
+        self._order = {}  # ID сотрудника -> порядковый номер добавления
+
+    def add(self, employee):
+        heap = self.heaps.get(employee.role)
+        if heap is None:
+            heap = self.heaps[employee.role] = IndexedMinHeap()
+            self.locks[employee.role] = threading.Lock()
+        order = self._order.setdefault(employee.id, len(self._order))
+        with self.locks[employee.role]:
+            heap.push(employee.id, (self.key(employee), order), employee)
+
+    def remove(self, employee):
+        heap = self.heaps.get(employee.role)
+        if heap is None:
+            return
+        with self.locks[employee.role]:
+            if employee.id in heap:
+                heap.remove(employee.id)
+
+    def refresh(self, employee):
+        """Пересчитать ключ сотрудника после изменения его нагрузки."""
+        heap = self.heaps.get(employee.role)
+        if heap is None:
+            return
+        with self.locks[employee.role]:
+            if employee.id in heap:
+                heap.update(employee.id, (self.key(employee), self._order[employee.id]))
+
+    def least_loaded(self, role):
+        heap = self.heaps.get(role)
+        if heap is None:
+            return None
+        with self.locks[role]:
+            top = heap.peek()
+        return top[1] if top else None
+
+
+def order_id_of(order):
+    """ID заказа: атрибут order_id у Order или ключ "order_id" у словаря."""
+    if isinstance(order, dict):
+        return order.get("order_id")
+    return getattr(order, "order_id", None)
+
+
+def order_work(order):
+    """Объём работы заказа - длительность этапа у сотрудника с производительностью 1."""
+    if isinstance(order, dict):
+        return order.get("work", order.get("time_to_complete", 0.0))
+    return getattr(order, "work", 0.0)
+
+
+class OrderQueue:
+    """Очередь заказов сотрудника с индексом по ID заказа.
+
+    Построена на OrderedDict (хеш-таблица поверх двусвязного списка):
+    добавление в конец, извлечение из головы и удаление любого заказа по ID
+    выполняются за O(1).
+    """
+
+    def __init__(self, orders=()):
+        self._orders = OrderedDict()
+        self._anonymous = 0  # Ключи для заказов без ID
+        for order in orders:
+            self.append(order)
+
+    def __len__(self):
+        return len(self._orders)
+
+    def __iter__(self):
+        return iter(self._orders.values())
+
+    def __contains__(self, order_id):
+        return order_id in self._orders
+
+    def append(self, order):
+        order_id = order_id_of(order)
+        if order_id is None:
+            self._anonymous += 1
+            order_id = ("anonymous", self._anonymous)
+        self._orders[order_id] = order
+
+    def peek(self):
+        if not self._orders:
+            return None
+        return next(iter(self._orders.values()))
+
+    def popleft(self):
+        if not self._orders:
+            return None
+        return self._orders.popitem(last=False)[1]
+
+    def remove(self, order_id):
+        """Удалить заказ по ID; None, если такого заказа в очереди нет."""
+        return self._orders.pop(order_id, None)
+
+    def move_to_front(self, order_id):
+        """Поставить заказ первым в очередь (для политик, меняющих порядок выполнения)."""
+        self._orders.move_to_end(order_id, last=False)
+
+
+# ==== Политики распределения заказов ====
+
+class LeastLoadedPolicy:
+    """Сотрудник с наименьшим числом заказов в очереди (вершина кучи, O(1)); порядок FIFO."""
+
+    name = "least_loaded"
+
+    def select(self, database, role, order, now):
+        return database.get_least_loaded_employee(role)
+
+    def next_order(self, employee):
+        """Заказ, который сотрудник выполняет следующим (или уже выполняет)."""
+        return employee.orders.peek()
+
+
+class EarliestCompletionPolicy(LeastLoadedPolicy):
+    """Сотрудник, который раньше всех закончит этот заказ с учётом своей очереди и производительности.
+
+    Ожидаемое завершение - (оставшаяся работа очереди + работа заказа) / performance;
+    перебираются все сотрудники роли.
+    """
+
+    name = "earliest_completion"
+
+    def select(self, database, role, order, now):
+        work = order_work(order)
+        best, best_finish = None, None
+        for employee in database.employees_by_role.get(role, ()):
+            finish = (remaining_work(employee, now) + work) / employee.performance
+            if best_finish is None or finish < best_finish:
+                best, best_finish = employee, finish
+        return best
+
+
+class WeightedShortestProcessingTimePolicy(EarliestCompletionPolicy):
+    """Распределение как у earliest_completion, но свободный сотрудник берёт из своей
+    очереди заказ с наибольшим отношением веса к длительности (правило Смита).
+
+    Вес заказа - order.weight (по умолчанию число порций).
+    """
+
+    name = "wspt"
+
+    def next_order(self, employee):
+        head = employee.orders.peek()
+        if head is None or getattr(head, "timer", None) is not None:
+            return head  # Очередь пуста или сотрудник уже занят заказом
+        best = max(employee.orders, key=lambda order: getattr(order, "weight", 1.0) / max(order_work(order), 1e-9))
+        if best is not head:
+            employee.orders.move_to_front(order_id_of(best))
+        return best
+
+
+class RoundRobinPolicy(LeastLoadedPolicy):
+    """Сотрудники роли получают заказы по кругу, независимо от загрузки."""
+
+    name = "round_robin"
+
+    def __init__(self):
+        self.counters = {}  # Роль -> число выданных заказов (по нему же прогноз eta знает, чья очередь)
+
+    def select(self, database, role, order, now):
+        employees = database.employees_by_role.get(role)
+        if not employees:
+            return None
+        issued = self.counters.get(role, 0)
+        self.counters[role] = issued + 1
+        return employees[issued % len(employees)]
+
+
+POLICIES = {
+    policy.name: policy
+    for policy in (LeastLoadedPolicy, EarliestCompletionPolicy, WeightedShortestProcessingTimePolicy, RoundRobinPolicy)
+}
+
+
+def make_policy(policy):
+    """Политика по имени из POLICIES или готовый объект политики."""
+    if isinstance(policy, str):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown scheduling policy: {policy}")
+        return POLICIES[policy]()
+    return policy
+
+
+def remaining_work(employee, now):
+    """Работа, оставшаяся в очереди сотрудника, с учётом уже сделанной части текущего заказа."""
+    work = employee.queued_work
+    head = employee.orders.peek()
+    started_at = getattr(head, "stage_started_at", None)
+    if head is not None and getattr(head, "timer", None) is not None and started_at is not None:
+        work -= min((now - started_at) * employee.performance, order_work(head))
+    return max(work, 0.0)
@@ -1,26 +1,34 @@
+import os
 from flask import Flask
 
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json")
 
-# Инициализация Flask
-app = Flask(__name__)
 
-# Настройка менеджера процессов
-def create_app():
-    from routes import api_blueprint  # Импортируем после создания приложения, чтобы избежать кругового импорта
-    from database import RestaurantDatabase
-    from process_manager import ProcessManager
-    # Настройки базы данных
-    db = RestaurantDatabase("server/config.json")
+# Настройка приложения, базы данных и менеджера процессов
+def create_app(config_file=CONFIG_FILE, persistence="journal", **state_options):
+    from metrics import instrument_app
+    from profiling import profile_app
+    from routes import api_blueprint  # Импортируем внутри функции, чтобы избежать кругового импорта
+    from state import RestaurantState, init_app
 
-    # Настройка менеджера процессов
-    process_manager = ProcessManager(db)
-    process_manager.start()
+    # Инициализация Flask
+    app = Flask(__name__)
+
+    # Общее состояние загружается один раз на процесс и переиспользуется всеми запросами
+    state = RestaurantState(config_file, persistence=persistence, **state_options).load()
+    init_app(app, state)
 
     # Подключение маршрутов
     app.register_blueprint(api_blueprint)
 
+    # Число и задержки запросов по маршрутам для GET /metrics
+    instrument_app(app, state.metrics)
+    # Профилирование выбранных запросов, включается через /admin/profiling
+    profile_app(app, state.profiler)
+
     return app
 
 if __name__ == "__main__":
     app = create_app()
-    app.run(debug=True)
+    # Перезагрузчик отладки запустил бы второй процесс со своим состоянием
+    app.run(debug=True, use_reloader=False)
@@ -0,0 +1,235 @@
+# Дискретно-событийное моделирование кухни на виртуальных часах
+#
+# Прогон потока заказов за день занимает секунды: время не ждётся, а
+# перескакивает к следующему событию. Запуск из корня репозитория:
+#     python server/simulation.py orders.jsonl --staffing chef=2,waiter=1 --staffing chef=3,waiter=2
+# Строка файла заказов: {"time": 12.5, "recipe_name": "Burger", "quantity": 2}
+# (время прихода в тех же единицах, что и time_to_complete). Без файла
+# генерируется случайный поток (--orders, --interval).
+import argparse
+import heapq
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+from collections import defaultdict
+
+from batching import BatchCooking
+from database import Employee, RestaurantDatabase
+from process_manager import ProcessManager
+from scheduling import POLICIES
+from timers import TimerHandle
+
+
+class VirtualScheduler:
+    """Планировщик с тем же интерфейсом, что TimerScheduler, но на виртуальном времени.
+
+    Вызовы выполняются в run() строго по возрастанию срока, а часы
+    переводятся на срок очередного события.
+    """
+
+    def __init__(self, start_time=0.0):
+        self.time = start_time
+        self._heap = []  # (deadline, seq, handle)
+        self._seq = itertools.count()
+        self._running = False
+
+    def now(self):
+        return self.time
+
+    def call_later(self, delay, callback, *args):
+        return self.call_at(self.time + delay, callback, *args)
+
+    def call_at(self, deadline, callback, *args):
+        handle = TimerHandle(max(deadline, self.time), callback, args)
+        heapq.heappush(self._heap, (handle.deadline, next(self._seq), handle))
+        return handle
+
+    def pending(self):
+        return sum(1 for _, _, handle in self._heap if not handle.cancelled)
+
+    def run(self, until=None):
+        """Выполнять события, пока они есть (или до момента until). Возвращает число событий."""
+        processed = 0
+        while self._heap:
+            deadline, _, handle = self._heap[0]
+            if until is not None and deadline > until:
+                self.time = until
+                break
+            heapq.heappop(self._heap)
+            if handle.cancelled:
+                continue
+            self.time = deadline
+            handle.callback(*handle.args)
+            processed += 1
+        return processed
+
+    def is_running(self):
+        return self._running
+
+    def start(self):
+        self._running = True
+
+    def stop(self, timeout=None):
+        self._running = False
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class KitchenSimulation:
+    """Прогон потока заказов через ProcessManager на виртуальных часах.
+
+    Используются те же распределение по сотрудникам, этапы конвейера из
+    конфигурации и шумовая величина, что и в работающем сервере.
+    """
+
+    def __init__(self, database, seed=None, policy="least_loaded", batching=None):
+        self.database = database
+        self.scheduler = VirtualScheduler()
+        self.manager = ProcessManager(
+            database, scheduler=self.scheduler, rng=random.Random(seed), synchronous=True, verbose=False,
+            policy=policy, batching=batching,
+        )
+        self.manager.add_event_listener(self._on_event)
+        self.arrivals = []
+        self.rejected = []
+        self.delivered = {}  # ID заказа -> (время поступления, время доставки)
+        self.busy_time = defaultdict(float)  # ID сотрудника -> суммарное время работы
+
+    def submit(self, at, recipe_name, quantity):
+        """Запланировать поступление заказа в момент at."""
+        self.scheduler.call_at(at, self._arrive, recipe_name, quantity)
+
+    def load_stream(self, path):
+        with open(path, 'r', encoding='utf-8') as file:
+            for line in file:
+                line = line.strip()
+                if line:
+                    event = json.loads(line)
+                    self.submit(event["time"], event["recipe_name"], event.get("quantity", 1))
+
+    def _arrive(self, recipe_name, quantity):
+        self.arrivals.append(self.scheduler.now())
+        result = self.manager.add_order(recipe_name, quantity)
+        if "error" in result:
+            self.rejected.append((self.scheduler.now(), recipe_name, result["error"]))
+
+    def _on_event(self, event, order, employee, now):
+        if event == "completed":
+            # Время партии делится поровну между её заказами
+            share = len(order.batch.orders) if order.batch is not None else 1
+            self.busy_time[employee.id] += (now - order.stage_started_at) / share
+        elif event == "delivered":
+            self.delivered[order.order_id] = (order.created_at, now)
+
+    def run(self, until=None):
+        self.manager.start()
+        self.scheduler.run(until)
+        self.manager.stop()
+        return self.report()
+
+    def report(self):
+        latencies = [done - created for created, done in self.delivered.values()]
+        start = min(self.arrivals) if self.arrivals else 0.0
+        end = max((done for _, done in self.delivered.values()), default=start)
+        makespan = end - start
+        return {
+            "orders": len(self.arrivals),
+            "delivered": len(self.delivered),
+            "rejected": len(self.rejected),
+            "in_progress": len(self.manager.orders),
+            "makespan": makespan,
+            "mean_latency": statistics.mean(latencies) if latencies else None,
+            "p50_latency": percentile(latencies, 0.5) if latencies else None,
+            "p90_latency": percentile(latencies, 0.9) if latencies else None,
+            "max_latency": max(latencies) if latencies else None,
+            "utilization": {
+                employee.name: (self.busy_time[employee.id] / makespan if makespan else 0.0)
+                for employee in self.database.employees
+            },
+            # Очереди по этапам конвейера: где заказы ждут дольше всего
+            **self.manager.stage_metrics.snapshot(),
+        }
+
+
+def set_staffing(database, staffing):
+    """Заменить персонал: staffing = {"chef": 3, "waiter": 2}.
+
+    Производительность новых сотрудников равна средней по роли в конфигурации.
+    """
+    performance = {}
+    for role, employees in database.employees_by_role.items():
+        performance[role] = statistics.mean(employee.performance for employee in employees)
+    employees = []
+    next_id = itertools.count(1)
+    for role, count in staffing.items():
+        for number in range(1, count + 1):
+            employees.append(Employee(next(next_id), f"{role.capitalize()} {number}", role, performance.get(role, 1.0)))
+    database.set_employees(employees)
+
+
+def parse_staffing(text):
+    staffing = {}
+    for part in text.split(","):
+        role, count = part.split("=")
+        staffing[role.strip()] = int(count)
+    return staffing
+
+
+def random_stream(database, count, interval, seed):
+    """Пуассоновский поток из count заказов со средним интервалом interval."""
+    rng = random.Random(seed)
+    recipes = [recipe.name for recipe in database.recipes]
+    time = 0.0
+    for _ in range(count):
+        time += rng.expovariate(1.0 / interval)
+        yield time, rng.choice(recipes), rng.randint(1, 3)
+
+
+def simulate(config_file, staffing=None, stream_file=None, orders=200, interval=5.0, seed=1, ignore_stock=False,
+             policy="least_loaded", batching=None):
+    database = RestaurantDatabase(config_file)
+    if staffing:
+        set_staffing(database, staffing)
+    if ignore_stock:
+        database.stock.fill(float("inf"))
+    simulation = KitchenSimulation(database, seed=seed, policy=policy, batching=batching)
+    if stream_file:
+        simulation.load_stream(stream_file)
+    else:
+        for at, recipe_name, quantity in random_stream(database, orders, interval, seed):
+            simulation.submit(at, recipe_name, quantity)
+    return simulation.run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Discrete-event simulation of the kitchen pipeline")
+    parser.add_argument("stream", nargs="?", help="JSONL-файл заказов (по умолчанию случайный поток)")
+    parser.add_argument("--config", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json"))
+    parser.add_argument("--staffing", action="append", type=parse_staffing,
+                        help="Вариант штата, например chef=3,waiter=2; можно указать несколько")
+    parser.add_argument("--orders", type=int, default=200, help="Число случайных заказов")
+    parser.add_argument("--interval", type=float, default=5.0, help="Средний интервал между заказами")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--ignore-stock", action="store_true", help="Не ограничивать заказы остатками склада")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="least_loaded", help="Политика распределения")
+    parser.add_argument("--batch-window", type=float, help="Готовить партиями: окно набора партии")
+    parser.add_argument("--batch-size", type=int, default=8, help="Наибольший размер партии")
+    args = parser.parse_args()
+
+    batching = BatchCooking(args.batch_window, args.batch_size) if args.batch_window else None
+    for staffing in args.staffing or [None]:
+        report = simulate(args.config, staffing, args.stream, args.orders, args.interval, args.seed, args.ignore_stock,
+                          args.policy, batching)
+        label = ",".join(f"{role}={count}" for role, count in staffing.items()) if staffing else "config"
+        print(json.dumps({"staffing": label, "policy": args.policy, **report}, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,233 @@
+# Общее состояние сервера: одна база данных и один менеджер процессов на процесс
+import atexit
+import logging
+import os
+import sys
+import threading
+import time
+from admission import AdmissionController
+from async_engine import AsyncProcessManager
+from batching import BatchCooking
+from database import RestaurantDatabase
+from eta import EtaForecaster
+from journal import MutationJournal
+from logs import QueueLogging, close_logging, get_logger, setup_logging
+from metrics import MetricsRegistry
+from persistence import PersistenceWriter
+from process_manager import ProcessManager
+from profiling import RequestProfiler
+from storage import SQLiteStorage, read_config_files
+
+# Способы сохранения состояния на диск:
+# journal - журнал изменений со снимками, writer - отложенная групповая запись файла,
+# file - синхронная перезапись файла в каждом запросе,
+# sqlite - построчные изменения в базе SQLite
+PERSISTENCE_MODES = ("journal", "writer", "file", "sqlite")
+
+logger = get_logger("state")
+
+# Движки обработки заказов: threads - ProcessManager с потоком диспетчера и
+# планировщиком таймеров, asyncio - AsyncProcessManager в одном цикле событий
+ENGINES = {"threads": ProcessManager, "asyncio": AsyncProcessManager}
+
+# Сколько ждать записи на диск запросу с durable
+DURABLE_TIMEOUT = 10.0
+
+
+class RestaurantState:
+    def __init__(self, config_file, persistence="journal", writer_window=0.05, writer_max_pending=100,
+                 database_url=None, engine="threads", queue_limits=None, admission_rate=None,
+                 admission_burst=None, scheduling_policy="least_loaded", batch_window=None, batch_size=8,
+                 profile_dir=None, log_file=None):
+        if persistence not in PERSISTENCE_MODES:
+            raise ValueError(f"Unknown persistence mode: {persistence}")
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown order engine: {engine}")
+        self.engine = engine
+        # Политика распределения заказов (scheduling.POLICIES); движок asyncio раздаёт
+        # заказы освободившимся сотрудникам сам и политик не поддерживает
+        if engine != "threads" and scheduling_policy != "least_loaded":
+            raise ValueError("Scheduling policies are supported by the threads engine only")
+        self.scheduling_policy = scheduling_policy
+        # Готовка партиями: окно набора партии в секундах (None - каждый заказ отдельно)
+        if engine != "threads" and batch_window:
+            raise ValueError("Batch cooking is supported by the threads engine only")
+        self.batching = BatchCooking(batch_window, batch_size) if batch_window else None
+        # Контроль приёма заказов: лимиты очередей по ролям и ведро токенов (None - без ограничений)
+        self.admission = AdmissionController(queue_limits, admission_rate, admission_burst)
+        self.config_file = config_file
+        self.persistence = persistence
+        self.lock = threading.Lock()
+        self.db = None
+        self.process_manager = None
+        self.eta = None  # Прогноз времени выполнения новых заказов
+        self.journal = None
+        self.writer = None
+        self.writer_window = writer_window
+        self.writer_max_pending = writer_max_pending
+        # По умолчанию база SQLite лежит рядом с файлом конфигурации
+        self.database_url = database_url or os.path.join(
+            os.path.dirname(os.path.abspath(config_file)), "restaurant.db")
+        self.storage = None
+        # Структурированный журнал сервера (JSON-строки с ротацией), по умолчанию рядом с конфигурацией
+        self.log_file = log_file or os.path.join(os.path.dirname(os.path.abspath(config_file)), "server.log")
+        self.log_handler = None
+        self.kitchen_log = None  # Очередь записей движка заказов (logs.QueueLogging)
+        # Метрики для GET /metrics; мгновенные значения кухни считаются при чтении
+        self.metrics = MetricsRegistry()
+        self.metrics.add_collector(self._kitchen_metrics)
+        # Профилирование запросов по требованию; по умолчанию выключено, профили лежат рядом с конфигурацией
+        self.profiler = RequestProfiler(profile_dir or os.path.join(
+            os.path.dirname(os.path.abspath(config_file)), "profiles"))
+
+    def _timed_write(self, kind, write, *args):
+        started = time.perf_counter()
+        result = write(*args)
+        self.metrics.observe_write(kind, time.perf_counter() - started)
+        return result
+
+    def _apply_to_storage(self, record):
+        self._timed_write("sqlite", self.storage.apply, record)
+
+    def _kitchen_metrics(self):
+        manager = self.process_manager
+        if manager is None:
+            return []
+        stages = manager.stage_metrics.snapshot()["stages"]
+        employees = [employee for role in list(self.db.employees_by_role.values()) for employee in list(role)]
+        families = [
+            ("orders_in_flight", "Orders accepted and not yet delivered or cancelled", [({}, len(manager.orders))]),
+            ("stage_queue_depth", "Orders waiting in the queue of a pipeline stage",
+             [({"stage": stage["name"], "role": stage["role"]}, stage["queue_depth"]) for stage in stages]),
+            ("stage_in_service", "Orders being worked on at a pipeline stage",
+             [({"stage": stage["name"], "role": stage["role"]}, stage["in_service"]) for stage in stages]),
+            # Метка - ID сотрудника: имена могут совпадать и меняться при перезагрузке
+            ("employee_orders", "Orders in the queue of an employee",
+             [({"employee_id": employee.id, "role": employee.role}, len(employee.orders)) for employee in employees]),
+            ("employee_queued_work", "Work queued to an employee, seconds at performance 1",
+             [({"employee_id": employee.id, "role": employee.role}, employee.queued_work)
+              for employee in employees]),
+        ]
+        if self.kitchen_log is not None:
+            families.append(("log_records_dropped", "Kitchen log records dropped because the log queue was full",
+                             [({}, self.kitchen_log.dropped)]))
+        if hasattr(manager, "orders_queue"):
+            families.append(("dispatch_queue_depth", "Orders waiting for the dispatcher thread",
+                             [({}, manager.orders_queue.qsize())]))
+        return families
+
+    def load(self):
+        """Загрузить конфигурацию и запустить менеджер процессов."""
+        with self.lock:
+            self.log_handler = setup_logging(self.log_file)
+            # События кухни пишутся часто и из горячих потоков: в файл и консоль их
+            # выводит отдельный поток, при переполнении очереди записи отбрасываются
+            console = logging.StreamHandler(sys.stdout)
+            console.setFormatter(logging.Formatter("%(message)s"))
+            self.kitchen_log = QueueLogging(get_logger("kitchen").name, [self.log_handler, console]).start()
+            if self.persistence == "sqlite":
+                self.storage = SQLiteStorage(self.database_url)
+                if self.storage.is_empty():
+                    # Первый запуск: однократно переносим данные из JSON
+                    self.storage.save(read_config_files([self.config_file]))
+                self.db = RestaurantDatabase(storage=self.storage)
+                self.db.add_mutation_listener(self._apply_to_storage)
+            else:
+                self.db = RestaurantDatabase(self.config_file)
+            if self.persistence == "journal":
+                # Снимок уже загружен, догоняем его хвостом журнала
+                self.journal = MutationJournal(self.db, on_write=self.metrics.observe_write)
+                self.journal.replay()
+                self.journal.start()
+            elif self.persistence == "writer":
+                self.writer = PersistenceWriter(
+                    self.db, window=self.writer_window, max_pending=self.writer_max_pending,
+                    on_write=self.metrics.observe_write
+                ).start()
+            options = {"policy": self.scheduling_policy, "batching": self.batching} if self.engine == "threads" else {}
+            self.process_manager = ENGINES[self.engine](self.db, admission=self.admission, metrics=self.metrics,
+                                                        **options)
+            self.eta = EtaForecaster(self.process_manager)
+            self.process_manager.start()
+            logger.info(f"Состояние загружено: {self.persistence}, движок {self.engine}",
+                        extra={"fields": {"persistence": self.persistence, "engine": self.engine}})
+        atexit.register(self.close)
+        return self
+
+    def reload(self):
+        """Перечитать конфигурацию, не теряя очереди заказов сотрудников."""
+        with self.lock:
+            if self.db is None:
+                raise RuntimeError("State is not loaded")
+            # База перезагружается на месте, поэтому менеджер процессов
+            # продолжает работать с тем же объектом
+            with self.process_manager.exclusive():
+                if self.writer is not None:
+                    # Иначе несохранённое поколение писателя пропало бы при перечитывании файла
+                    self.writer.reload_database()
+                else:
+                    self.db.reload()
+                if self.journal is not None:
+                    self.journal.replay()
+            self.process_manager.employees_changed()
+        logger.info("Конфигурация перечитана")
+        return self
+
+    def persist(self, durable=False):
+        """Сохранить изменения, сделанные обработчиком запроса.
+
+        С durable=True вызов возвращается только после того, как изменения
+        запроса попали на диск. Возвращает False, если запись не успела.
+        """
+        if self.journal is not None:
+            # Изменение уже в буфере журнала, запишет и сбросит его фоновый поток
+            if durable:
+                self.journal.flush()
+            return True
+        if self.writer is not None:
+            if durable:
+                # Текущее поколение не меньше поколения изменений этого запроса
+                return self.writer.wait_for(self.writer.generation, timeout=DURABLE_TIMEOUT)
+            return True
+        if self.storage is not None:
+            return True  # Строки уже обновлены в транзакции самого изменения
+        self._timed_write("file", self.db.save_changes)
+        return True
+
+    def save(self):
+        """Записать полный снимок состояния."""
+        if self.journal is not None:
+            self.journal.compact()
+        elif self.writer is not None:
+            self.writer.mark_dirty()
+            self.writer.flush(timeout=DURABLE_TIMEOUT)
+        else:
+            self._timed_write("sqlite_snapshot" if self.storage is not None else "file", self.db.save_changes)
+
+    def close(self):
+        """Сбросить на диск всё несохранённое перед завершением процесса."""
+        with self.lock:
+            if self.process_manager is not None:
+                self.process_manager.stop(timeout=5)
+            if self.journal is not None:
+                self.journal.close()
+                self.journal = None
+            if self.writer is not None:
+                self.writer.close()
+                self.writer = None
+            if self.storage is not None:
+                self.db.remove_mutation_listener(self._apply_to_storage)
+                self.storage.close()
+                self.storage = None
+            if self.kitchen_log is not None:
+                self.kitchen_log.stop()
+                self.kitchen_log = None
+            if self.log_handler is not None:
+                close_logging(self.log_handler)
+                self.log_handler = None
+
+
+def init_app(app, state):
+    """Привязать общее состояние к приложению Flask."""
+    app.extensions["restaurant_state"] = state
+    return state
@@ -0,0 +1,87 @@
+# Матрица складских остатков (склады × ингредиенты) на NumPy
+import numpy as np
+
+
+class StockMatrix:
+    """Остатки всех складов в одном массиве stock[склад, ингредиент].
+
+    Рецепт компилируется в вектор потребности по ингредиентам, поэтому
+    проверка наличия - одно сравнение векторов, а списание - одно
+    векторное вычитание, распределённое по складам в порядке их следования.
+    Проверка и списание читают и пишут только столбцы ингредиентов из
+    потребности, так что операции над разными ингредиентами можно
+    выполнять параллельно под разными блокировками.
+    """
+
+    def __init__(self, warehouse_ids, ingredient_ids):
+        self.warehouse_ids = list(warehouse_ids)
+        self.ingredient_ids = list(ingredient_ids)
+        self.warehouse_index = {warehouse_id: row for row, warehouse_id in enumerate(self.warehouse_ids)}
+        self.ingredient_index = {ingredient_id: col for col, ingredient_id in enumerate(self.ingredient_ids)}
+        shape = (len(self.warehouse_ids), len(self.ingredient_ids))
+        self.stock = np.zeros(shape, dtype=np.float64)
+        self.present = np.zeros(shape, dtype=bool)  # Какие ингредиенты вообще хранятся на складе
+        self.totals = np.zeros(len(self.ingredient_ids), dtype=np.float64)  # Сумма по всем складам
+
+    def set(self, warehouse_id, ingredient_id, amount):
+        row = self.warehouse_index[warehouse_id]
+        col = self.ingredient_index[ingredient_id]
+        self.totals[col] += amount - self.stock[row, col]
+        self.stock[row, col] = amount
+        self.present[row, col] = True
+
+    def adjust(self, warehouse_id, ingredient_id, delta):
+        """Изменить остаток; False, если ингредиент на этом складе не хранится."""
+        row = self.warehouse_index.get(warehouse_id)
+        col = self.ingredient_index.get(ingredient_id)
+        if row is None or col is None or not self.present[row, col]:
+            return False
+        self.stock[row, col] += delta
+        self.totals[col] += delta
+        return True
+
+    def fill(self, amount):
+        """Установить одинаковый остаток во всех ячейках, где ингредиент хранится."""
+        self.stock[self.present] = amount
+        self.totals = self.stock.sum(axis=0)
+
+    def warehouse_items(self, warehouse_id):
+        """Остатки склада в виде списка (ingredient_id, amount), как в файле конфигурации."""
+        row = self.warehouse_index[warehouse_id]
+        items = []
+        for col in np.flatnonzero(self.present[row]):
+            amount = float(self.stock[row, col])
+            items.append((self.ingredient_ids[col], int(amount) if amount.is_integer() else amount))
+        return items
+
+    def requirement_vector(self, ingredients):
+        """Скомпилировать список (ingredient_id, amount) в вектор потребности."""
+        vector = np.zeros(len(self.ingredient_ids), dtype=np.float64)
+        for ingredient_id, amount in ingredients:
+            vector[self.ingredient_index[ingredient_id]] += amount
+        return vector
+
+    def can_fulfil(self, requirement):
+        cols = np.flatnonzero(requirement)
+        return bool(np.all(self.totals[cols] >= requirement[cols]))
+
+    def deduct(self, requirement):
+        """Списать потребность, забирая с каждого склада сколько есть по порядку.
+
+        Возвращает список (warehouse_id, ingredient_id, amount) фактических списаний.
+        """
+        cols = np.flatnonzero(requirement)
+        requirement = requirement[cols]
+        available = np.maximum(self.stock[:, cols], 0)
+        # Сколько уже покрыто складами, стоящими раньше текущего
+        # (сдвинутая накопленная сумма, а не cumsum - available: остатки могут быть бесконечными)
+        covered_before = np.zeros_like(available)
+        np.cumsum(available[:-1], axis=0, out=covered_before[1:])
+        take = np.minimum(np.maximum(requirement - covered_before, 0), available)
+        self.stock[:, cols] -= take
+        self.totals[cols] -= take.sum(axis=0)
+        rows, taken = np.nonzero(take)
+        return [
+            (self.warehouse_ids[row], self.ingredient_ids[cols[col]], float(take[row, col]))
+            for row, col in zip(rows, taken)
+        ]
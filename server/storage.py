@@ -0,0 +1,342 @@
+# Хранилища состояния ресторана: JSON-файл и SQLite
+import json
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import (
+    Column, Float, ForeignKey, Index, Integer, MetaData, String, Table,
+    create_engine, delete, event, func, insert, inspect, select, text, update,
+)
+
+
+# Атомарно записать JSON: временный файл в той же папке и переименование поверх старого
+def atomic_write_json(path, data, indent=None):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".json", dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            json.dump(data, file, indent=indent, ensure_ascii=False)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+# Прочитать один или несколько JSON-файлов конфигурации; разделы из более
+# поздних файлов заменяют одноимённые разделы более ранних
+def read_config_files(paths):
+    data = {}
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as file:
+            data.update(json.load(file))
+    return data
+
+
+class StorageBackend:
+    """Интерфейс хранилища для RestaurantDatabase.
+
+    load() возвращает состояние в формате файла конфигурации, save(data)
+    записывает полный снимок. Хранилища с построчным обновлением
+    (supports_row_updates) получают каждое изменение через apply(record).
+    """
+
+    supports_row_updates = False
+
+    def load(self):
+        raise NotImplementedError
+
+    def save(self, data):
+        raise NotImplementedError
+
+    def apply(self, record):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class JsonFileStorage(StorageBackend):
+    """Один JSON-файл конфигурации (исходный формат)."""
+
+    def __init__(self, config_file):
+        self.config_file = config_file
+
+    def load(self):
+        return read_config_files([self.config_file])
+
+    def save(self, data):
+        atomic_write_json(self.config_file, data, indent=4)
+
+
+# ==== Схема SQLite ====
+
+metadata = MetaData()
+
+halls_table = Table(
+    "halls", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("name", String, nullable=False, unique=True),
+)
+
+tables_table = Table(
+    "tables", metadata,
+    Column("hall_id", Integer, ForeignKey("halls.id"), primary_key=True),
+    Column("table_id", Integer, primary_key=True),
+    Column("status", String, nullable=False),
+    Index("ix_tables_hall_status", "hall_id", "status"),
+)
+
+ingredients_table = Table(
+    "ingredients", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("name", String, nullable=False, unique=True),
+    Column("unit", String, nullable=False),
+)
+
+recipes_table = Table(
+    "recipes", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("name", String, nullable=False, unique=True),
+    Column("complexity", Float, nullable=False),
+    Column("price", Float, nullable=False),
+    Column("batch_factor", Float, nullable=True),
+)
+
+recipe_ingredients_table = Table(
+    "recipe_ingredients", metadata,
+    Column("recipe_id", Integer, ForeignKey("recipes.id"), primary_key=True),
+    Column("ingredient_id", Integer, ForeignKey("ingredients.id"), primary_key=True),
+    Column("amount", Float, nullable=False),
+)
+
+warehouses_table = Table(
+    "warehouses", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("name", String, nullable=False, unique=True),
+)
+
+warehouse_stock_table = Table(
+    "warehouse_stock", metadata,
+    Column("warehouse_id", Integer, ForeignKey("warehouses.id"), primary_key=True),
+    Column("ingredient_id", Integer, ForeignKey("ingredients.id"), primary_key=True),
+    Column("amount", Float, nullable=False),
+    Index("ix_warehouse_stock_ingredient", "ingredient_id"),
+)
+
+employees_table = Table(
+    "employees", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("role", String, nullable=False, index=True),
+    Column("performance", Float, nullable=False),
+)
+
+pipeline_table = Table(
+    "pipeline_stages", metadata,
+    Column("position", Integer, primary_key=True),
+    Column("name", String, nullable=False, unique=True),
+    Column("role", String, nullable=False),
+    Column("work_factor", Float, nullable=False),
+)
+
+orders_table = Table(
+    "orders", metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("recipe_name", String, nullable=False, index=True),
+    Column("quantity", Integer, nullable=False),
+    Column("total_cost", Float, nullable=False),
+    Column("created_at", Float, nullable=False, index=True),
+)
+
+
+class SQLiteStorage(StorageBackend):
+    """SQLite через SQLAlchemy: по строке на стол, остаток и заказ.
+
+    Бронирование стола меняет одну строку, а не весь файл. База работает в
+    режиме WAL, чтобы чтения не блокировали запись; соединения берутся из
+    пула движка, по одному на рабочий поток на время операции.
+    """
+
+    supports_row_updates = True
+
+    def __init__(self, database_url, pool_size=5):
+        if "://" not in database_url:
+            database_url = f"sqlite:///{database_url}"
+        self.database_url = database_url
+        self.engine = create_engine(database_url, pool_size=pool_size, pool_pre_ping=True)
+        event.listen(self.engine, "connect", self._configure_connection)
+        metadata.create_all(self.engine)
+        self._migrate()
+
+    def _migrate(self):
+        # Столбцы, добавленные после создания схемы: create_all не меняет существующие таблицы
+        with self.engine.begin() as conn:
+            columns = {column["name"] for column in inspect(conn).get_columns("recipes")}
+            if "batch_factor" not in columns:
+                conn.execute(text("ALTER TABLE recipes ADD COLUMN batch_factor FLOAT"))
+
+    @staticmethod
+    def _configure_connection(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+    def is_empty(self):
+        with self.engine.connect() as conn:
+            return conn.execute(select(func.count()).select_from(halls_table)).scalar() == 0 and \
+                conn.execute(select(func.count()).select_from(recipes_table)).scalar() == 0
+
+    def load(self):
+        with self.engine.connect() as conn:
+            tables_by_hall = {}
+            for row in conn.execute(select(tables_table).order_by(tables_table.c.hall_id, tables_table.c.table_id)):
+                tables_by_hall.setdefault(row.hall_id, []).append({"id": row.table_id, "status": row.status})
+            ingredients_by_recipe = {}
+            for row in conn.execute(select(recipe_ingredients_table)):
+                ingredients_by_recipe.setdefault(row.recipe_id, []).append(
+                    {"ingredient_id": row.ingredient_id, "amount": row.amount})
+            stock_by_warehouse = {}
+            for row in conn.execute(select(warehouse_stock_table).order_by(warehouse_stock_table.c.ingredient_id)):
+                stock_by_warehouse.setdefault(row.warehouse_id, []).append(
+                    {"ingredient_id": row.ingredient_id, "amount": row.amount})
+            data = {
+                "halls": [
+                    {"id": row.id, "name": row.name, "tables": tables_by_hall.get(row.id, [])}
+                    for row in conn.execute(select(halls_table).order_by(halls_table.c.id))
+                ],
+                "ingredients": [
+                    {"id": row.id, "name": row.name, "unit": row.unit}
+                    for row in conn.execute(select(ingredients_table).order_by(ingredients_table.c.id))
+                ],
+                "recipes": [
+                    {"id": row.id, "name": row.name, "complexity": row.complexity, "price": row.price,
+                     "batch_factor": row.batch_factor, "ingredients": ingredients_by_recipe.get(row.id, [])}
+                    for row in conn.execute(select(recipes_table).order_by(recipes_table.c.id))
+                ],
+                "warehouses": [
+                    {"id": row.id, "name": row.name, "ingredients": stock_by_warehouse.get(row.id, [])}
+                    for row in conn.execute(select(warehouses_table).order_by(warehouses_table.c.id))
+                ],
+                "employees": [
+                    {"id": row.id, "name": row.name, "role": row.role, "performance": row.performance}
+                    for row in conn.execute(select(employees_table).order_by(employees_table.c.id))
+                ],
+            }
+            # Без строк конвейера - прежний повар -> официант
+            stages = [
+                {"name": row.name, "role": row.role, "work_factor": row.work_factor}
+                for row in conn.execute(select(pipeline_table).order_by(pipeline_table.c.position))
+            ]
+            if stages:
+                data["pipeline"] = stages
+            return data
+
+    def save(self, data):
+        """Полностью заменить содержимое базы (используется импортом и /save)."""
+        with self.engine.begin() as conn:
+            for table in (tables_table, recipe_ingredients_table, warehouse_stock_table,
+                          halls_table, recipes_table, warehouses_table, ingredients_table, employees_table,
+                          pipeline_table):
+                conn.execute(delete(table))
+            self._insert_many(conn, halls_table,
+                              [{"id": h["id"], "name": h["name"]} for h in data.get("halls", [])])
+            self._insert_many(conn, tables_table, [
+                {"hall_id": h["id"], "table_id": t["id"], "status": t["status"]}
+                for h in data.get("halls", []) for t in h.get("tables", [])
+            ])
+            self._insert_many(conn, ingredients_table, [
+                {"id": i["id"], "name": i["name"], "unit": i["unit"]} for i in data.get("ingredients", [])
+            ])
+            self._insert_many(conn, recipes_table, [
+                # В старых config_menu.json цены нет
+                {"id": r["id"], "name": r["name"], "complexity": r["complexity"], "price": r.get("price", 0),
+                 "batch_factor": r.get("batch_factor")}
+                for r in data.get("recipes", [])
+            ])
+            self._insert_many(conn, recipe_ingredients_table, [
+                {"recipe_id": r["id"], "ingredient_id": i["ingredient_id"], "amount": i["amount"]}
+                for r in data.get("recipes", []) for i in r["ingredients"]
+            ])
+            self._insert_many(conn, warehouses_table, [
+                {"id": w["id"], "name": w["name"]} for w in data.get("warehouses", [])
+            ])
+            self._insert_many(conn, warehouse_stock_table, [
+                {"warehouse_id": w["id"], "ingredient_id": i["ingredient_id"], "amount": i["amount"]}
+                for w in data.get("warehouses", []) for i in w["ingredients"]
+            ])
+            self._insert_many(conn, employees_table, [
+                {"id": e["id"], "name": e["name"], "role": e["role"], "performance": e["performance"]}
+                for e in data.get("employees", [])
+            ])
+            self._insert_many(conn, pipeline_table, [
+                {"position": position, "name": stage["name"], "role": stage.get("role") or stage["name"],
+                 "work_factor": stage.get("work_factor", 1.0)}
+                for position, stage in enumerate(data.get("pipeline", []))
+            ])
+
+    @staticmethod
+    def _insert_many(conn, table, rows):
+        if rows:
+            conn.execute(insert(table), rows)
+
+    def apply(self, record):
+        """Построчно применить одно изменение из RestaurantDatabase."""
+        op = record["op"]
+        with self.engine.begin() as conn:
+            if op == "reserve" or op == "release":
+                conn.execute(
+                    update(tables_table)
+                    .where(tables_table.c.hall_id == record["hall_id"], tables_table.c.table_id == record["table_id"])
+                    .values(status="reserved" if op == "reserve" else "free")
+                )
+            elif op in ("deduct", "order", "order_batch"):
+                # Списание и строки заказов - в одной транзакции: после сбоя не бывает
+                # списанных ингредиентов без заказа
+                self._deduct(conn, record.get("changes", ()))
+                orders = record["orders"] if op == "order_batch" else [record] if op == "order" else []
+                created_at = time.time()
+                self._insert_many(conn, orders_table, [
+                    {"recipe_name": order["recipe_name"], "quantity": order["quantity"],
+                     "total_cost": order["total_cost"], "created_at": created_at}
+                    for order in orders
+                ])
+            else:
+                raise ValueError(f"Unknown mutation: {op}")
+
+    @staticmethod
+    def _deduct(conn, changes):
+        for warehouse_id, ingredient_id, amount in changes:
+            conn.execute(
+                update(warehouse_stock_table)
+                .where(warehouse_stock_table.c.warehouse_id == warehouse_id,
+                       warehouse_stock_table.c.ingredient_id == ingredient_id)
+                .values(amount=warehouse_stock_table.c.amount - amount)
+            )
+
+    def close(self):
+        self.engine.dispose()
+
+
+# Однократный импорт существующих JSON-файлов в SQLite
+def import_json(database_url, config_files):
+    storage = SQLiteStorage(database_url)
+    try:
+        storage.save(read_config_files(config_files))
+    finally:
+        storage.close()
+
+
+if __name__ == "__main__":
+    # python server/storage.py restaurant.db server/config.json [config_halls.json ...]
+    if len(sys.argv) < 3:
+        print("Usage: storage.py DATABASE CONFIG_JSON [CONFIG_JSON ...]")
+        sys.exit(1)
+    import_json(sys.argv[1], sys.argv[2:])
+    print(f"Imported {', '.join(sys.argv[2:])} into {sys.argv[1]}")
@@ -0,0 +1,40 @@
+# Общие фикстуры тестов: модули сервера импортируются из server/, как при запуске server.py
+import json
+import os
+import sys
+
+import pytest
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+sys.path.insert(0, os.path.join(SERVER_DIR, "benchmarks"))
+
+from venue import generate_venue  # noqa: E402
+
+
+@pytest.fixture
+def venue_file(tmp_path):
+    """Записать синтетическое заведение во временный каталог; возвращает функцию (**параметры) -> путь."""
+    def write(halls=1, tables=4, ingredients=5, recipes=3, warehouses=1, **options):
+        path = tmp_path / "config.json"
+        path.write_text(json.dumps(generate_venue(halls, tables, ingredients, recipes, warehouses, **options)))
+        return str(path)
+    return write
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """Фабрика приложений Flask на временной конфигурации; состояние закрывается после теста."""
+    from server import create_app
+    states = []
+
+    def make(config_file, **options):
+        options.setdefault("log_file", str(tmp_path / "server.log"))
+        app = create_app(config_file, **options)
+        state = app.extensions["restaurant_state"]
+        state.process_manager.verbose = False
+        states.append(state)
+        return app
+    yield make
+    for state in states:
+        state.close()
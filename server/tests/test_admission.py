@@ -0,0 +1,75 @@
+from admission import AdmissionController
+from async_engine import AsyncProcessManager
+from database import RestaurantDatabase
+from process_manager import ProcessManager
+from simulation import VirtualScheduler
+
+
+def test_queue_full_returns_503(venue_file, make_app):
+    app = make_app(venue_file(), queue_limits={"chef": 1})
+    client = app.test_client()
+    assert client.post("/orders", json={"recipe_name": "Recipe 1", "quantity": 1}).status_code == 200
+    response = client.post("/orders", json={"recipe_name": "Recipe 1", "quantity": 1})
+    assert response.status_code == 503
+    assert response.get_json()["reason"] == "queue_full"
+    assert int(response.headers["Retry-After"]) >= 1
+    # Отказ не списывает ингредиенты и не занимает место в очереди
+    assert len(app.extensions["restaurant_state"].process_manager.orders) == 1
+    assert client.get("/orders/admission").get_json()["queue_depth"]["chef"] == 1
+
+
+def test_rate_limited_returns_429(venue_file, make_app):
+    app = make_app(venue_file(), admission_rate=1, admission_burst=2)
+    client = app.test_client()
+    order = {"recipe_name": "Recipe 1", "quantity": 1}
+    assert client.post("/orders", json=order).status_code == 200
+    assert client.post("/orders", json=order).status_code == 200
+    response = client.post("/orders", json=order)
+    assert response.status_code == 429
+    assert response.get_json()["reason"] == "rate_limited"
+    assert response.headers["Retry-After"] == "1"
+    # Чек больше запаса ведра не пройдёт никогда: повторять бессмысленно
+    response = client.post("/orders/batch", json={"items": [order] * 3})
+    assert response.status_code == 429
+    assert "Retry-After" not in response.headers
+
+
+def test_order_dropped_for_lack_of_staff_releases_its_slot(venue_file):
+    # Официантов нет: после повара заказ некому передать, и он снимается
+    database = RestaurantDatabase(venue_file(chefs=1, waiters=0))
+    admission = AdmissionController(queue_limits={"chef": 1, "waiter": 1})
+    scheduler = VirtualScheduler()
+    manager = ProcessManager(database, scheduler=scheduler, synchronous=True, verbose=False, admission=admission)
+    recipe = database.recipes[0].name
+    for _ in range(3):
+        assert "order_id" in manager.add_order(recipe, 1)
+        scheduler.run()
+    assert not manager.orders
+    assert admission.stats()["queue_depth"] == {"chef": 0, "waiter": 0}
+    stages = {stage["name"]: stage for stage in manager.stage_metrics.snapshot()["stages"]}
+    assert stages["waiter"]["cancelled"] == 3
+    assert stages["waiter"]["queue_depth"] == 0
+
+
+def test_cancel_while_async_loop_is_stopped_releases_its_slot(venue_file):
+    database = RestaurantDatabase(venue_file())
+    admission = AdmissionController(queue_limits={"chef": 2})
+    manager = AsyncProcessManager(database, verbose=False, admission=admission)
+    recipe = database.recipes[0].name
+    first = manager.add_order(recipe, 1)["order_id"]
+    manager.start()
+    manager.stop()
+    second = manager.add_order(recipe, 1)["order_id"]
+    assert admission.stats()["queue_depth"]["chef"] == 2
+
+    assert manager.cancel_order(first)["status"] == "Order canceled"
+    assert manager.cancel_order(second)["status"] == "Order canceled"
+    assert admission.stats()["queue_depth"]["chef"] == 0
+    stages = {stage["name"]: stage for stage in manager.stage_metrics.snapshot()["stages"]}
+    assert (stages["chef"]["queue_depth"], stages["chef"]["in_service"], stages["chef"]["cancelled"]) == (0, 0, 2)
+
+    manager.start()
+    try:
+        assert "order_id" in manager.add_order(recipe, 1)
+    finally:
+        manager.stop()
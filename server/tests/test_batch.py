@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from database import RestaurantDatabase
+
+
+def test_batch_without_assignment_does_not_report_chef(venue_file):
+    database = RestaurantDatabase(venue_file(chefs=2))
+    recipe = database.recipes[0].name
+    result = database.process_order_batch([{"recipe_name": recipe, "quantity": 1}] * 2, assign=False)
+    assert all("chef_id" not in item for item in result["items"])
+    assert all(not chef.orders for chef in database.employees_by_role["chef"])
+
+
+def test_batch_with_assignment_spreads_items_across_chefs(venue_file):
+    database = RestaurantDatabase(venue_file(chefs=2))
+    recipe = database.recipes[0].name
+    result = database.process_order_batch([{"recipe_name": recipe, "quantity": 1}] * 2)
+    assert sorted(item["chef_id"] for item in result["items"]) == [1, 2]
+
+
+@pytest.mark.parametrize("bad_item", [
+    {"recipe_name": "No such recipe", "quantity": 1},
+    {"recipe_name": "Recipe 1", "quantity": 10 ** 9},  # Больше, чем есть на складе
+])
+def test_rejected_batch_changes_nothing(venue_file, make_app, bad_item):
+    app = make_app(venue_file())
+    state = app.extensions["restaurant_state"]
+    stock_before = state.db.stock.stock.copy()
+    response = app.test_client().post("/orders/batch", json={"items": [
+        {"recipe_name": "Recipe 2", "quantity": 1},
+        bad_item,
+    ]})
+    assert response.status_code == 400
+    assert np.array_equal(state.db.stock.stock, stock_before)
+    assert not state.process_manager.orders
+    assert state.admission.stats()["queue_depth"]["chef"] == 0
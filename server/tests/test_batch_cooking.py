@@ -0,0 +1,78 @@
+import random
+
+import pytest
+
+from batching import BatchCooking
+from database import RestaurantDatabase
+from process_manager import ProcessManager
+from simulation import VirtualScheduler
+
+
+def kitchen(config_file, window=1000.0, max_size=8):
+    database = RestaurantDatabase(config_file)
+    scheduler = VirtualScheduler()
+    manager = ProcessManager(database, scheduler=scheduler, synchronous=True, verbose=False, rng=random.Random(1),
+                             batching=BatchCooking(window, max_size))
+    started = {}
+    manager.add_event_listener(lambda event, order, employee, now:
+                               event == "started" and employee.role == "chef"
+                               and started.setdefault(order.order_id, now))
+    return manager, scheduler, started
+
+
+def test_idle_chef_cooks_first_order_without_waiting(venue_file):
+    manager, scheduler, started = kitchen(venue_file())
+    order_id = manager.add_order(manager.database.recipes[0].name, 1)["order_id"]
+    assert started == {order_id: 0}
+    assert not manager.forming
+    scheduler.run()
+    assert not manager.orders
+
+
+def test_orders_behind_busy_chef_are_batched_until_chef_frees(venue_file):
+    manager, scheduler, started = kitchen(venue_file())
+    recipe = manager.database.recipes[0].name
+    first = manager.add_order(recipe, 1)["order_id"]
+    first_work = manager.orders[first].work
+    second = manager.add_order(recipe, 1)["order_id"]
+    third = manager.add_order(recipe, 1)["order_id"]
+    batch = manager.forming[recipe]
+    assert [order.order_id for order in batch.orders] == [second, third]
+    works = [manager.orders[second].work, manager.orders[third].work]
+
+    scheduler.run(until=first_work)
+    # Повар освободился задолго до конца окна и сразу взял партию
+    assert started[second] == started[third] == pytest.approx(first_work)
+    assert batch.sealed and not manager.forming
+    assert batch.work == pytest.approx(max(works) * (1 + 0.3))
+    scheduler.run()
+    assert not manager.orders
+
+
+def test_cancelled_order_leaves_forming_batch(venue_file):
+    manager, scheduler, started = kitchen(venue_file())
+    recipe = manager.database.recipes[0].name
+    first = manager.add_order(recipe, 1)["order_id"]
+    second = manager.add_order(recipe, 1)["order_id"]
+    third = manager.add_order(recipe, 1)["order_id"]
+    assert manager.cancel_order(second)["status"] == "Order canceled"
+    assert [order.order_id for order in manager.forming[recipe].orders] == [third]
+
+    scheduler.run()
+    assert set(started) == {first, third}
+    assert not manager.orders
+
+
+def test_full_batch_is_queued_without_waiting_for_window(venue_file):
+    manager, scheduler, started = kitchen(venue_file(), max_size=2)
+    recipe = manager.database.recipes[0].name
+    first = manager.add_order(recipe, 1)["order_id"]
+    first_work = manager.orders[first].work
+    second = manager.add_order(recipe, 1)["order_id"]
+    third = manager.add_order(recipe, 1)["order_id"]
+    assert not manager.forming
+    assert manager.database.get_employee_by_id(1).get_load() == 2  # Заказ в работе и партия за ним
+
+    scheduler.run()
+    assert started[second] == started[third] == pytest.approx(first_work)
+    assert not manager.orders
@@ -0,0 +1,43 @@
+import time
+
+import pytest
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.005)
+
+
+@pytest.mark.parametrize("engine", ["threads", "asyncio"])
+def test_cancel_queued_in_progress_and_unknown_orders(venue_file, make_app, engine):
+    app = make_app(venue_file(chefs=1), engine=engine)
+    state = app.extensions["restaurant_state"]
+    manager = state.process_manager
+    client = app.test_client()
+    order = {"recipe_name": "Recipe 1", "quantity": 1}
+    in_progress = client.post("/orders", json=order).get_json()["order_id"]
+    queued = client.post("/orders", json=order).get_json()["order_id"]
+    # Единственный повар взял первый заказ, второй ждёт в очереди
+    wait_until(lambda: manager.orders[in_progress].stage_started_at is not None)
+    assert manager.orders[queued].stage_started_at is None
+    chef = state.db.employees_by_role["chef"][0]
+
+    assert client.post(f"/orders/{queued}/cancel").status_code == 200
+    assert client.post(f"/orders/{in_progress}/cancel").status_code == 200
+    assert not manager.orders
+    wait_until(lambda: not chef.get_load())
+    wait_until(lambda: manager.stage_metrics.snapshot()["stages"][0]["cancelled"] == 2)
+    stages = {stage["name"]: stage for stage in manager.stage_metrics.snapshot()["stages"]}
+    assert (stages["chef"]["queue_depth"], stages["chef"]["in_service"], stages["chef"]["completed"]) == (0, 0, 0)
+
+    response = client.post(f"/orders/{queued}/cancel")
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Order not found"}
+    assert client.post("/orders/9999/cancel").status_code == 400
+
+    # Освободившийся повар сразу берёт новый заказ
+    next_order = client.post("/orders", json=order).get_json()["order_id"]
+    wait_until(lambda: manager.orders[next_order].stage_started_at is not None)
+    assert chef.get_load() == 1
@@ -0,0 +1,51 @@
+import random
+
+import numpy as np
+import pytest
+
+from database import RestaurantDatabase
+from eta import EtaForecaster
+from process_manager import ProcessManager
+from simulation import VirtualScheduler
+
+
+def kitchen(config_file, policy, seed, orders):
+    # Очередь из orders заказов, принятых в момент 0 на виртуальных часах
+    scheduler = VirtualScheduler()
+    manager = ProcessManager(RestaurantDatabase(config_file), scheduler=scheduler, synchronous=True, verbose=False,
+                             rng=random.Random(seed), policy=policy)
+    recipes = manager.database.recipes
+    for index in range(orders):
+        manager.add_order(recipes[index % len(recipes)].name, 1)
+    return manager, scheduler
+
+
+def delivered_after(manager, scheduler, recipe, quantity=1):
+    delivered = {}
+    manager.add_event_listener(lambda event, order, employee, now:
+                               event == "delivered" and delivered.setdefault(order.order_id, now))
+    order_id = manager.add_order(recipe, quantity)["order_id"]
+    start = scheduler.now()
+    scheduler.run()
+    return delivered[order_id] - start
+
+
+@pytest.mark.parametrize("policy", ["least_loaded", "earliest_completion", "round_robin", "wspt"])
+def test_forecast_matches_virtual_kitchen(venue_file, policy):
+    # Фактическое время доставки по разным розыгрышам шума сверяется с прогнозом по той же очереди
+    config_file = venue_file(recipes=5, chefs=2, waiters=1)
+    recipe = "Recipe 2"
+    actual = np.array([delivered_after(*kitchen(config_file, policy, seed, 8), recipe) for seed in range(200)])
+    manager, _ = kitchen(config_file, policy, 1000, 8)
+    forecast = EtaForecaster(manager, seed=1).forecast(manager.database.get_recipe_by_name(recipe))
+    assert forecast["p50"] == pytest.approx(np.median(actual), rel=0.03)
+    assert np.mean(actual <= forecast["p90"]) == pytest.approx(0.9, abs=0.06)
+
+
+def test_wspt_forecast_accounts_for_quantity(venue_file):
+    manager, _ = kitchen(venue_file(recipes=5, chefs=1, waiters=1), "wspt", 1, 6)
+    forecaster = EtaForecaster(manager, seed=1)
+    recipe = manager.database.get_recipe_by_name("Recipe 3")
+    single, large = forecaster.forecast(recipe, 1), forecaster.forecast(recipe, 10)
+    assert large["p50"] < single["p50"]  # Больший вес пропускает заказ вперёд очереди повара
+    assert forecaster.forecast(recipe, 10)["cached"]
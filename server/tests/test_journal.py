@@ -0,0 +1,136 @@
+import os
+import threading
+
+from database import RestaurantDatabase
+import journal as journal_module
+from journal import MutationJournal
+
+
+def table_statuses(database):
+    return {(hall.id, table.id): table.status for hall in database.halls for table in hall.tables}
+
+
+def recover(config_file):
+    # Как после сбоя: снимок с диска плюс хвост журнала
+    database = RestaurantDatabase(config_file)
+    MutationJournal(database).replay()
+    return database
+
+
+def test_replay_after_crash_restores_mutations(venue_file):
+    config_file = venue_file(tables=6)
+    database = RestaurantDatabase(config_file)
+    journal = MutationJournal(database).open()
+    database.reserve_table(1, 1)
+    database.reserve_table(1, 2)
+    database.release_table(1, 1)
+    database.process_order(database.recipes[0].name, 2, assign=False)
+    journal.flush()
+    # Процесс "упал": ни compact(), ни close()
+
+    recovered = recover(config_file)
+    assert table_statuses(recovered) == table_statuses(database)
+    assert recovered.stock.totals.tolist() == database.stock.totals.tolist()
+    assert recovered.journal_seq == 0  # Снимок прежний, изменения пришли из журнала
+
+
+def test_replay_skips_truncated_last_record(venue_file):
+    config_file = venue_file(tables=6)
+    database = RestaurantDatabase(config_file)
+    journal = MutationJournal(database).open()
+    database.reserve_table(1, 3)
+    journal.flush()
+    with open(journal.journal_file, 'a', encoding='utf-8') as file:
+        file.write('{"op": "reserve", "hall_id": 1, "tab')
+
+    recovered = recover(config_file)
+    assert table_statuses(recovered) == table_statuses(database)
+
+
+def test_overlapping_compactions_do_not_lose_records(venue_file, monkeypatch):
+    # Первое сжатие задерживается между ротацией журнала и записью снимка;
+    # второе (например, из POST /save) начинается в этот момент
+    config_file = venue_file(tables=6)
+    database = RestaurantDatabase(config_file)
+    journal = MutationJournal(database).open()
+    first_paused = threading.Event()
+    second_done = threading.Event()
+    original_write = journal_module.atomic_write_json
+    calls = []
+
+    def slow_write(*args, **kwargs):
+        calls.append(args[0])
+        if len(calls) == 1:
+            first_paused.set()
+            second_done.wait(1.0)
+        original_write(*args, **kwargs)
+
+    monkeypatch.setattr(journal_module, "atomic_write_json", slow_write)
+    database.reserve_table(1, 1)
+    first = threading.Thread(target=journal.compact)
+    first.start()
+    assert first_paused.wait(5)
+    database.reserve_table(1, 2)
+    second = threading.Thread(target=journal.compact)
+    second.start()
+    second.join(0.3)
+    second_done.set()
+    first.join()
+    second.join()
+    journal.flush()
+
+    recovered = recover(config_file)
+    assert table_statuses(recovered) == table_statuses(database)
+
+
+def test_replay_of_rotated_journal_survives_second_crash(venue_file, monkeypatch):
+    # Оба раза процесс падает между ротацией журнала и записью снимка
+    config_file = venue_file(tables=6)
+
+    def crash(*args, **kwargs):
+        raise OSError("crash")
+
+    original_write = journal_module.atomic_write_json
+    monkeypatch.setattr(journal_module, "atomic_write_json", crash)
+    database = RestaurantDatabase(config_file)
+    journal = MutationJournal(database).open()
+    database.reserve_table(1, 1)
+    try:
+        journal.compact()
+    except OSError:
+        pass
+
+    # Перезапуск: хвост берётся из .old
+    monkeypatch.setattr(journal_module, "atomic_write_json", original_write)
+    database = RestaurantDatabase(config_file)
+    journal = MutationJournal(database)
+    journal.replay()
+    journal.open()
+    database.reserve_table(1, 2)
+    monkeypatch.setattr(journal_module, "atomic_write_json", crash)
+    try:
+        journal.compact()
+    except OSError:
+        pass
+
+    monkeypatch.setattr(journal_module, "atomic_write_json", original_write)
+    recovered = recover(config_file)
+    assert table_statuses(recovered) == table_statuses(database)
+    assert table_statuses(recovered)[(1, 1)] == table_statuses(recovered)[(1, 2)] != table_statuses(recovered)[(1, 3)]
+
+
+def test_mutation_does_no_io_under_data_locks(venue_file, monkeypatch):
+    # Запись и fsync идут в фоновом потоке или в flush(), а не под блокировкой зала
+    config_file = venue_file(tables=6)
+    database = RestaurantDatabase(config_file)
+    journal = MutationJournal(database, fsync_batch=1).open()
+    synced = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(journal_module.os, "fsync", lambda fd: synced.append(fd) or real_fsync(fd))
+    database.reserve_table(1, 1)
+    assert synced == []
+    assert os.path.getsize(journal.journal_file) == 0
+
+    journal.flush()
+    assert len(synced) == 1
+    assert table_statuses(recover(config_file)) == table_statuses(database)
@@ -0,0 +1,41 @@
+import logging
+import threading
+import time
+
+from logs import QueueLogging
+
+
+class BlockedHandler(logging.Handler):
+    """Обработчик, который не пишет, пока его не отпустят."""
+
+    def __init__(self):
+        super().__init__()
+        self.entered = threading.Event()
+        self.unblock = threading.Event()
+        self.messages = []
+
+    def emit(self, record):
+        self.entered.set()
+        self.unblock.wait(5)
+        self.messages.append(record.getMessage())
+
+
+def test_full_queue_drops_records_without_blocking():
+    handler = BlockedHandler()
+    queue_logging = QueueLogging("restaurant.test_queue", [handler], maxsize=3).start()
+    logger = queue_logging.logger
+    logger.setLevel(logging.INFO)
+    try:
+        logger.info("record 0")
+        assert handler.entered.wait(5)  # Поток вывода взял первую запись и застрял
+
+        started = time.perf_counter()
+        for index in range(1, 11):
+            logger.info(f"record {index}")
+        assert time.perf_counter() - started < 1  # Пишущий поток не ждал вывода
+        assert queue_logging.dropped == 7  # 3 записи поместились в очередь
+    finally:
+        handler.unblock.set()
+        queue_logging.stop()
+    assert handler.messages == ["record 0", "record 1", "record 2", "record 3"]
+    assert queue_logging.dropped == 7
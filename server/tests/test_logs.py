@@ -0,0 +1,37 @@
+import pytest
+
+from logs import close_logging, get_logger, read_page, setup_logging
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    path = str(tmp_path / "server.log")
+    handler = setup_logging(path, max_bytes=2000, backup_count=50)
+    yield path
+    close_logging(handler)
+
+
+def read_all(path, limit, cursor=None):
+    messages = []
+    while True:
+        page = read_page(path, limit, cursor=cursor)
+        messages.extend(entry["message"] for entry in page["logs"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return messages
+
+
+def test_cursor_paging_survives_rotation(log_path):
+    logger = get_logger("test")
+    for index in range(100):
+        logger.info(f"record {index}")
+    first = read_page(log_path, limit=7)
+    assert [entry["message"] for entry in first["logs"]] == [f"record {index}" for index in range(99, 92, -1)]
+
+    # Новые записи ротируют файл, на который указывает курсор
+    for index in range(100, 200):
+        logger.info(f"record {index}")
+    rest = read_all(log_path, limit=7, cursor=first["next_cursor"])
+    assert rest == [f"record {index}" for index in range(92, -1, -1)]
+    assert read_all(log_path, limit=13) == [f"record {index}" for index in range(199, -1, -1)]
+
@@ -0,0 +1,36 @@
+import pytest
+
+
+@pytest.mark.parametrize("propagate", [False, True])
+def test_unhandled_exception_counted_as_500(venue_file, make_app, propagate):
+    app = make_app(venue_file())
+    # При PROPAGATE_EXCEPTIONS (отладка, тесты) Flask не вызывает after_request
+    app.config["PROPAGATE_EXCEPTIONS"] = propagate
+
+    def boom():
+        raise RuntimeError("unexpected")
+
+    app.add_url_rule("/boom", "boom", boom)
+    client = app.test_client()
+    if propagate:
+        with pytest.raises(RuntimeError):
+            client.get("/boom")
+    else:
+        assert client.get("/boom").status_code == 500
+    assert client.get("/halls").status_code == 200
+
+    metrics = client.get("/metrics").get_data(as_text=True)
+    assert 'restaurant_http_requests_total{method="GET",route="/boom",status="500"} 1' in metrics
+    assert 'restaurant_http_requests_total{method="GET",route="/halls",status="200"} 1' in metrics
+    assert 'restaurant_http_request_duration_seconds_count{method="GET",route="/boom"} 1' in metrics
+
+
+def test_employee_series_are_labelled_by_id(venue_file, make_app):
+    app = make_app(venue_file(chefs=2))
+    state = app.extensions["restaurant_state"]
+    for employee in state.db.employees_by_role["chef"]:
+        employee.name = "Chef"  # Одинаковые имена не должны склеивать серии
+    metrics = app.test_client().get("/metrics").get_data(as_text=True)
+    assert 'restaurant_employee_orders{employee_id="1",role="chef"} 0' in metrics
+    assert 'restaurant_employee_orders{employee_id="2",role="chef"} 0' in metrics
+    assert 'employee="' not in metrics
@@ -0,0 +1,111 @@
+import threading
+
+import pytest
+
+from admission import AdmissionController
+from async_engine import AsyncProcessManager
+from database import RestaurantDatabase
+from process_manager import ProcessManager
+from simulation import VirtualScheduler
+
+BAD_QUANTITIES = ["2", -3, 0, 1.5, True]
+
+
+@pytest.mark.parametrize("quantity", BAD_QUANTITIES)
+def test_order_rejects_invalid_quantity(venue_file, make_app, quantity):
+    app = make_app(venue_file())
+    client = app.test_client()
+    recipe = app.extensions["restaurant_state"].db.recipes[0].name
+    response = client.post("/orders", json={"recipe_name": recipe, "quantity": quantity})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("quantity", BAD_QUANTITIES)
+def test_batch_rejects_invalid_quantity(venue_file, make_app, quantity):
+    app = make_app(venue_file())
+    client = app.test_client()
+    recipe = app.extensions["restaurant_state"].db.recipes[0].name
+    response = client.post("/orders/batch", json={"items": [
+        {"recipe_name": recipe, "quantity": 1},
+        {"recipe_name": recipe, "quantity": quantity},
+    ]})
+    assert response.status_code == 400
+    assert not app.extensions["restaurant_state"].process_manager.orders
+
+
+def make_manager(engine, database, admission):
+    if engine == "threads":
+        return ProcessManager(database, scheduler=VirtualScheduler(), synchronous=True, verbose=False,
+                              admission=admission)
+    return AsyncProcessManager(database, verbose=False, admission=admission)
+
+
+@pytest.mark.parametrize("engine", ["threads", "asyncio"])
+def test_admission_slot_released_when_database_raises(venue_file, engine, monkeypatch):
+    database = RestaurantDatabase(venue_file())
+    admission = AdmissionController(queue_limits={"chef": 5})
+    manager = make_manager(engine, database, admission)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("storage failure")
+
+    monkeypatch.setattr(database, "process_order", fail)
+    monkeypatch.setattr(database, "process_order_batch", fail)
+    recipe = database.recipes[0].name
+    with pytest.raises(RuntimeError):
+        manager.add_order(recipe, 1)
+    with pytest.raises(RuntimeError):
+        manager.add_order_batch([{"recipe_name": recipe, "quantity": 1}] * 2)
+    assert admission.stats()["queue_depth"]["chef"] == 0
+
+
+def test_async_engine_lock_not_held_during_database_call(venue_file, monkeypatch):
+    database = RestaurantDatabase(venue_file())
+    manager = AsyncProcessManager(database, verbose=False)
+    held = []
+    process_order, process_order_batch = database.process_order, database.process_order_batch
+
+    def checked(method):
+        def call(*args, **kwargs):
+            held.append(manager.lock.locked())
+            return method(*args, **kwargs)
+        return call
+
+    monkeypatch.setattr(database, "process_order", checked(process_order))
+    monkeypatch.setattr(database, "process_order_batch", checked(process_order_batch))
+    recipe = database.recipes[0].name
+    assert "order_id" in manager.add_order(recipe, 1)
+    assert "order_ids" in manager.add_order_batch([{"recipe_name": recipe, "quantity": 1}] * 2)
+    assert held == [False, False]
+    assert len(manager.orders) == 3
+
+
+def test_async_stage_duration_is_work_over_performance(venue_file):
+    database = RestaurantDatabase(venue_file(chefs=1, waiters=1))
+    performance = {"chef": 20.0, "waiter": 80.0}
+    for employee in database.employees:
+        employee.performance = performance[employee.role]
+    recipe = min(database.recipes, key=lambda recipe: recipe.work)
+    manager = AsyncProcessManager(database, verbose=False)
+    started, durations, delivered = {}, {}, threading.Event()
+
+    def listener(event, order, employee, now):
+        if event == "started":
+            started[order.stage] = now
+        elif event == "completed":
+            durations[order.stage] = (now - started[order.stage], order.work / employee.performance)
+        elif event == "delivered":
+            delivered.set()
+
+    manager.add_event_listener(listener)
+    manager.start()
+    try:
+        manager.add_order(recipe.name, 1)
+        assert delivered.wait(5)
+    finally:
+        manager.stop()
+    order_work = durations["chef"][1] * performance["chef"]
+    assert 0.8 * recipe.work <= order_work <= 1.2 * recipe.work
+    for stage, (measured, expected) in durations.items():
+        assert expected == pytest.approx(order_work / performance[stage])
+        assert expected * 0.9 <= measured <= expected * 1.5
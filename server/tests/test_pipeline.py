@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+from database import RestaurantDatabase
+from pipeline import Pipeline
+from process_manager import ProcessManager
+from simulation import VirtualScheduler
+from venue import generate_venue
+
+STAGES = [
+    {"name": "prep", "role": "cook", "work_factor": 0.5},
+    {"name": "grill", "role": "cook"},
+    {"name": "plating", "role": "plater", "work_factor": 0.25},
+    {"name": "delivery", "role": "waiter", "work_factor": 0.1},
+]
+
+
+@pytest.fixture
+def pipeline_venue(tmp_path):
+    data = generate_venue(1, 4, 5, 3, 1)
+    data["pipeline"] = STAGES
+    data["employees"] = [
+        {"id": 1, "name": "Cook", "role": "cook", "performance": 2.0},
+        {"id": 2, "name": "Plater", "role": "plater", "performance": 1.0},
+        {"id": 3, "name": "Waiter", "role": "waiter", "performance": 0.5},
+    ]
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps(data))
+    return str(path)
+
+
+def test_pipeline_rejects_invalid_stages():
+    with pytest.raises(ValueError):
+        Pipeline.from_config([])
+    with pytest.raises(ValueError):
+        Pipeline.from_config([{"name": "grill"}, {"name": "grill"}])
+    with pytest.raises(ValueError):
+        Pipeline.from_config([{"name": "grill", "work_factor": 0}])
+
+
+def test_order_passes_custom_stages_with_per_stage_metrics(pipeline_venue):
+    database = RestaurantDatabase(pipeline_venue)
+    assert [stage.name for stage in database.pipeline.stages] == ["prep", "grill", "plating", "delivery"]
+    assert database.pipeline.roles == ["cook", "plater", "waiter"]
+
+    scheduler = VirtualScheduler()
+    manager = ProcessManager(database, scheduler=scheduler, synchronous=True, verbose=False)
+    started = []
+    manager.add_event_listener(lambda event, order, employee, now:
+                               event == "started" and started.append((order.stage, employee.id, now)))
+    result = manager.add_order(database.recipes[0].name, 1)
+    order = manager.orders[result["order_id"]]
+    work = order.base_work
+    scheduler.run()
+
+    assert not manager.orders
+    assert [(stage, employee_id) for stage, employee_id, _ in started] == [
+        ("prep", 1), ("grill", 1), ("plating", 2), ("delivery", 3)]
+    expected = {"prep": work * 0.5 / 2.0, "grill": work / 2.0, "plating": work * 0.25, "delivery": work * 0.1 / 0.5}
+    snapshot = manager.stage_metrics.snapshot()
+    assert [stage["name"] for stage in snapshot["stages"]] == ["prep", "grill", "plating", "delivery"]
+    for stage in snapshot["stages"]:
+        assert stage["completed"] == 1
+        assert stage["queue_depth"] == stage["in_service"] == 0
+        assert stage["service_time"]["mean"] == pytest.approx(expected[stage["name"]])
+        assert stage["wait_time"]["max"] == 0
+    assert scheduler.now() == pytest.approx(sum(expected.values()))
+
+
+def test_stage_metrics_track_queue_and_bottleneck(pipeline_venue):
+    database = RestaurantDatabase(pipeline_venue)
+    scheduler = VirtualScheduler()
+    manager = ProcessManager(database, scheduler=scheduler, synchronous=True, verbose=False)
+    recipe = database.recipes[0].name
+    for _ in range(3):
+        manager.add_order(recipe, 1)
+
+    stages = {stage["name"]: stage for stage in manager.stage_metrics.snapshot()["stages"]}
+    # Один повар: первый заказ в работе, два ждут подготовки
+    assert (stages["prep"]["in_service"], stages["prep"]["queue_depth"]) == (1, 2)
+
+    scheduler.run()
+    snapshot = manager.stage_metrics.snapshot()
+    stages = {stage["name"]: stage for stage in snapshot["stages"]}
+    assert all(stage["completed"] == 3 for stage in stages.values())
+    assert stages["prep"]["max_queue_depth"] == 2
+    # Повар делает два этапа: после подготовки заказы ждут, пока он жарит предыдущие
+    assert snapshot["bottleneck"] == "grill"
+    assert stages["plating"]["wait_time"]["max"] == stages["delivery"]["wait_time"]["max"] == 0
+
+
+def test_custom_pipeline_is_saved_with_the_config(pipeline_venue):
+    database = RestaurantDatabase(pipeline_venue)
+    assert database.to_dict()["pipeline"] == STAGES
@@ -0,0 +1,16 @@
+def test_profile_report_validates_sort_key(venue_file, make_app, tmp_path):
+    app = make_app(venue_file(), profile_dir=str(tmp_path / "profiles"))
+    client = app.test_client()
+    client.post("/admin/profiling", json={"enabled": True, "sample_rate": 1.0, "routes": ["/halls"]})
+    client.get("/halls")
+    slowest = client.get("/admin/profiling").get_json()["slowest"]
+    assert len(slowest) == 1
+    profile_id = slowest[0]["id"]
+
+    for sort in ("tottime", "cumtime", "ncalls", "module", "time", "cumulative"):
+        response = client.get(f"/admin/profiling/{profile_id}?sort={sort}")
+        assert response.status_code == 200, sort
+        assert b"function calls" in response.data
+    response = client.get(f"/admin/profiling/{profile_id}?sort=bogus")
+    assert response.status_code == 400
+    assert "tottime" in response.get_json()["sort_keys"]
@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+from database import RestaurantDatabase
+from process_manager import ProcessManager
+from simulation import VirtualScheduler
+
+
+def test_reload_keeps_employee_load_in_sync(venue_file):
+    database = RestaurantDatabase(venue_file(chefs=2))
+    manager = ProcessManager(database, scheduler=VirtualScheduler(), synchronous=True, verbose=False)
+    recipe = database.recipes[0].name
+    for _ in range(4):
+        assert "error" not in manager.add_order(recipe, 1)
+
+    # Перезагрузка, пока заказы у поваров; завершаются они уже после неё
+    database.reload()
+    manager.employees_changed()
+    manager.scheduler.run()
+    assert not manager.orders
+    chefs = database.employees_by_role["chef"]
+    assert all(chef.queued_work == 0 and not chef.orders for chef in chefs)
+
+    for _ in range(4):
+        manager.add_order(recipe, 1)
+    assert sorted(len(chef.orders) for chef in chefs) == [2, 2]
+
+
+def test_reload_applies_new_employee_fields(venue_file):
+    config_file = venue_file(chefs=2)
+    database = RestaurantDatabase(config_file)
+    chef = database.get_employee_by_id(1)
+    database.employees_by_id[1].performance = 5.0  # Изменение только в памяти, файл прежний
+    database.reload()
+    assert database.get_employee_by_id(1) is chef
+    assert chef.performance == 1.0
+
+
+@pytest.mark.parametrize("persistence", ["journal", "writer", "file", "sqlite"])
+def test_reload_keeps_acknowledged_changes(venue_file, make_app, tmp_path, persistence):
+    config_file = venue_file()
+    # Окно писателя больше длительности теста: без сброса перед перезагрузкой изменение не записано
+    app = make_app(config_file, persistence=persistence, writer_window=5,
+                   database_url=str(tmp_path / "restaurant.db"))
+    state = app.extensions["restaurant_state"]
+    client = app.test_client()
+    assert client.post("/halls/1/tables/2/reserve").status_code == 200
+    assert client.post("/reload").status_code == 200
+    assert state.db.get_table(1, 2).status == "reserved"
+    if persistence == "writer":
+        assert state.writer.committed_generation == state.writer.generation
+        with open(config_file, 'r', encoding='utf-8') as file:
+            assert json.load(file)["halls"][0]["tables"][1]["status"] == "reserved"
@@ -0,0 +1,62 @@
+import random
+
+import pytest
+
+from database import RestaurantDatabase
+from process_manager import ProcessManager
+from scheduling import POLICIES, make_policy
+from simulation import VirtualScheduler
+
+
+def kitchen(config_file, policy):
+    database = RestaurantDatabase(config_file)
+    scheduler = VirtualScheduler()
+    manager = ProcessManager(database, scheduler=scheduler, synchronous=True, verbose=False, rng=random.Random(1),
+                             policy=policy)
+    started = []
+    manager.add_event_listener(lambda event, order, employee, now:
+                               event == "started" and employee.role == "chef"
+                               and started.append((order.order_id, employee.id)))
+    return manager, scheduler, started
+
+
+def test_make_policy_by_name():
+    for name in POLICIES:
+        assert make_policy(name).name == name
+    with pytest.raises(ValueError):
+        make_policy("bogus")
+
+
+@pytest.mark.parametrize("policy, chefs", [("least_loaded", [1, 1]), ("round_robin", [1, 2])])
+def test_idle_chefs_get_orders_by_policy(venue_file, policy, chefs):
+    manager, scheduler, started = kitchen(venue_file(chefs=2), policy)
+    recipe = manager.database.recipes[0].name
+    for _ in range(2):
+        manager.add_order(recipe, 1)
+        scheduler.run()  # Оба повара снова свободны
+    assert [employee_id for _, employee_id in started] == chefs
+
+
+@pytest.mark.parametrize("policy, chefs", [("least_loaded", [1, 2]), ("earliest_completion", [1, 1])])
+def test_earliest_completion_accounts_for_performance(venue_file, policy, chefs):
+    manager, scheduler, started = kitchen(venue_file(chefs=2), policy)
+    manager.database.get_employee_by_id(1).performance = 4.0
+    recipe = manager.database.recipes[0].name
+    manager.add_order(recipe, 1)
+    manager.add_order(recipe, 1)
+    scheduler.run()
+    assert [employee_id for _, employee_id in started] == chefs
+
+
+@pytest.mark.parametrize("policy, short_first", [("least_loaded", False), ("wspt", True)])
+def test_wspt_runs_short_queued_order_first(venue_file, policy, short_first):
+    manager, scheduler, started = kitchen(venue_file(recipes=5), policy)
+    recipes = sorted(manager.database.recipes, key=lambda recipe: recipe.work)
+    short, long = recipes[0].name, recipes[-1].name
+    assert recipes[-1].work >= 2 * recipes[0].work  # Шум заказа (±20%) не меняет порядок
+    manager.add_order(long, 1)
+    long_id = manager.add_order(long, 1)["order_id"]
+    short_id = manager.add_order(short, 1)["order_id"]
+    scheduler.run()
+    order_ids = [order_id for order_id, _ in started]
+    assert order_ids[1:] == ([short_id, long_id] if short_first else [long_id, short_id])
@@ -0,0 +1,49 @@
+import numpy as np
+
+from database import RestaurantDatabase
+from stock import StockMatrix
+
+
+def make_stock():
+    stock = StockMatrix([10, 20, 30], [1, 2])
+    for warehouse_id, amounts in ((10, (3, 5)), (20, (4, 0)), (30, (10, 1))):
+        for ingredient_id, amount in zip((1, 2), amounts):
+            stock.set(warehouse_id, ingredient_id, amount)
+    return stock
+
+
+def test_deduct_splits_across_warehouses_in_order():
+    stock = make_stock()
+    requirement = stock.requirement_vector([(1, 9), (2, 5)])
+    assert stock.can_fulfil(requirement)
+    changes = stock.deduct(requirement)
+    assert sorted(changes) == [(10, 1, 3.0), (10, 2, 5.0), (20, 1, 4.0), (30, 1, 2.0)]
+    assert stock.stock.tolist() == [[0, 0], [0, 0], [8, 1]]
+    assert np.array_equal(stock.totals, stock.stock.sum(axis=0))
+
+
+def test_insufficient_total_stock_is_detected():
+    stock = make_stock()
+    # Ингредиента 1 хватает, ингредиента 2 всего 6 на трёх складах
+    assert not stock.can_fulfil(stock.requirement_vector([(1, 1), (2, 7)]))
+    assert stock.can_fulfil(stock.requirement_vector([(1, 17), (2, 6)]))
+
+
+def test_order_over_total_stock_changes_nothing(venue_file):
+    database = RestaurantDatabase(venue_file(warehouses=3))
+    recipe = database.recipes[0]
+    requirement = database.recipe_requirements[recipe.name]
+    # Каждого ингредиента рецепта на каждом складе - на один заказ, всего на три
+    for warehouse in database.warehouses:
+        for ingredient_id, _ in recipe.ingredients:
+            column = database.stock.ingredient_index[ingredient_id]
+            database.stock.set(warehouse.id, ingredient_id, requirement[column])
+    before = database.stock.stock.copy()
+
+    assert database.process_order(recipe.name, 4, assign=False) == {"error": "Not enough ingredients"}
+    assert np.array_equal(database.stock.stock, before)
+
+    result = database.process_order(recipe.name, 3, assign=False)
+    assert "order_id" in result
+    for ingredient_id, _ in recipe.ingredients:
+        assert database.stock.totals[database.stock.ingredient_index[ingredient_id]] == 0
@@ -0,0 +1,107 @@
+import json
+
+import pytest
+from sqlalchemy import func, select
+
+from database import RestaurantDatabase
+from storage import SQLiteStorage, import_json, orders_table, read_config_files, warehouse_stock_table
+
+
+@pytest.fixture
+def sqlite_url(tmp_path):
+    return str(tmp_path / "restaurant.db")
+
+
+def stock_rows(storage):
+    with storage.engine.connect() as conn:
+        return {(row.warehouse_id, row.ingredient_id): row.amount for row in conn.execute(select(warehouse_stock_table))}
+
+
+def order_count(storage):
+    with storage.engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(orders_table)).scalar()
+
+
+def test_import_json_round_trips_the_config(venue_file, sqlite_url):
+    config_file = venue_file(halls=2, warehouses=2, chefs=2)
+    import_json(sqlite_url, [config_file])
+    storage = SQLiteStorage(sqlite_url)
+    try:
+        loaded = storage.load()
+    finally:
+        storage.close()
+    with open(config_file, 'r', encoding='utf-8') as file:
+        config = json.load(file)
+    for section in ("halls", "ingredients", "warehouses", "employees"):
+        assert loaded[section] == config[section]
+    assert [recipe["name"] for recipe in loaded["recipes"]] == [recipe["name"] for recipe in config["recipes"]]
+    assert "pipeline" not in loaded
+
+
+def test_apply_updates_rows(venue_file, sqlite_url):
+    storage = SQLiteStorage(sqlite_url)
+    try:
+        storage.save(read_config_files([venue_file()]))
+        storage.apply({"op": "reserve", "hall_id": 1, "table_id": 2})
+        assert storage.load()["halls"][0]["tables"][1]["status"] == "reserved"
+        storage.apply({"op": "release", "hall_id": 1, "table_id": 2})
+        assert storage.load()["halls"][0]["tables"][1]["status"] == "free"
+
+        before = stock_rows(storage)
+        storage.apply({"op": "order", "recipe_name": "Recipe 1", "quantity": 2, "total_cost": 10,
+                       "changes": [(1, 1, 4.0)]})
+        storage.apply({"op": "order_batch", "changes": [(1, 2, 1.0)], "orders": [
+            {"recipe_name": "Recipe 1", "quantity": 1, "total_cost": 5},
+            {"recipe_name": "Recipe 2", "quantity": 1, "total_cost": 7},
+        ]})
+        after = stock_rows(storage)
+        assert after[(1, 1)] == before[(1, 1)] - 4
+        assert after[(1, 2)] == before[(1, 2)] - 1
+        assert order_count(storage) == 3
+        with pytest.raises(ValueError):
+            storage.apply({"op": "unknown"})
+    finally:
+        storage.close()
+
+
+def test_order_and_its_deduction_commit_together(venue_file, sqlite_url):
+    storage = SQLiteStorage(sqlite_url)
+    try:
+        storage.save(read_config_files([venue_file()]))
+        before = stock_rows(storage)
+        # Строку заказа записать не удаётся (нет total_cost): списание тоже откатывается
+        with pytest.raises(KeyError):
+            storage.apply({"op": "order", "recipe_name": "Recipe 1", "quantity": 1, "changes": [(1, 1, 4.0)]})
+        assert stock_rows(storage) == before
+        assert order_count(storage) == 0
+    finally:
+        storage.close()
+
+
+def test_sqlite_state_survives_restart_and_reload(venue_file, make_app, sqlite_url):
+    config_file = venue_file()
+    app = make_app(config_file, persistence="sqlite", database_url=sqlite_url)
+    state = app.extensions["restaurant_state"]
+    client = app.test_client()
+    recipe = state.db.get_recipe_by_name("Recipe 1")
+    requirement = state.db.recipe_requirements[recipe.name]
+    assert client.post("/halls/1/tables/2/reserve").status_code == 200
+    assert client.post("/orders", json={"recipe_name": recipe.name, "quantity": 3}).status_code == 200
+    expected_stock = state.db.stock.stock.copy()
+
+    # Перезагрузка читает базу, а не config.json
+    assert client.post("/reload").status_code == 200
+    assert state.db.get_table(1, 2).status == "reserved"
+    assert (state.db.stock.stock == expected_stock).all()
+    assert order_count(state.storage) == 1
+    state.close()
+
+    restarted = RestaurantDatabase(storage=SQLiteStorage(sqlite_url))
+    try:
+        assert restarted.get_table(1, 2).status == "reserved"
+        assert (restarted.stock.stock == expected_stock).all()
+        for ingredient_id, _ in recipe.ingredients:
+            column = restarted.stock.ingredient_index[ingredient_id]
+            assert restarted.stock.totals[column] == 10 ** 9 - 3 * requirement[column]
+    finally:
+        restarted.storage.close()
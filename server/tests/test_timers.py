@@ -0,0 +1,87 @@
+import threading
+import time
+
+from timers import TimerScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def run_until(calls, count, timeout=5):
+    deadline = time.monotonic() + timeout
+    while len(calls) < count and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+
+def test_calls_run_in_deadline_order_and_ties_in_fifo_order():
+    clock = FakeClock()
+    scheduler = TimerScheduler(clock)
+    calls = []
+    for delay, name in ((3, "c"), (1, "a1"), (2, "b"), (1, "a2")):
+        scheduler.call_later(delay, calls.append, name)
+    clock.now = 10.0  # Все сроки наступили до запуска потока
+    scheduler.start()
+    try:
+        run_until(calls, 4)
+    finally:
+        scheduler.stop()
+    assert calls == ["a1", "a2", "b", "c"]
+
+
+def test_cancelled_call_is_skipped():
+    clock = FakeClock()
+    scheduler = TimerScheduler(clock)
+    calls = []
+    handle = scheduler.call_later(1, calls.append, "cancelled")
+    scheduler.call_later(2, calls.append, "kept")
+    handle.cancel()
+    assert scheduler.pending() == 1
+    clock.now = 5.0
+    scheduler.start()
+    try:
+        run_until(calls, 1)
+        time.sleep(0.01)
+    finally:
+        scheduler.stop()
+    assert calls == ["kept"]
+    assert scheduler.pending() == 0
+
+
+def test_failing_callback_does_not_stop_the_thread():
+    scheduler = TimerScheduler()
+    calls = []
+    scheduler.start()
+    try:
+        scheduler.call_later(0, lambda: 1 / 0)
+        scheduler.call_later(0.001, calls.append, "after")
+        run_until(calls, 1)
+    finally:
+        scheduler.stop()
+    assert calls == ["after"]
+
+
+def test_stop_keeps_pending_calls_until_restart():
+    scheduler = TimerScheduler()
+    done = threading.Event()
+    scheduler.start()
+    scheduler.call_later(60, done.set)
+    started = time.monotonic()
+    scheduler.stop(timeout=5)
+    # Поток ждал дальний срок, но остановился сразу
+    assert time.monotonic() - started < 1
+    assert not scheduler.is_running()
+    assert scheduler.pending() == 1
+
+    scheduler.call_later(0, done.set)
+    assert not done.wait(0.05)  # Без потока вызовы не выполняются
+    scheduler.start()
+    try:
+        assert done.wait(5)
+    finally:
+        scheduler.stop()
+    assert scheduler.pending() == 1  # Дальний вызов по-прежнему ждёт своего срока
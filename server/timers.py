@@ -0,0 +1,107 @@
+# Планировщик отложенных вызовов: один поток и куча сроков
+import heapq
+import itertools
+import threading
+import time
+from logs import get_logger
+
+logger = get_logger("timers")
+
+
+class TimerHandle:
+    """Запланированный вызов; cancel() отменяет его, если он ещё не выполнен."""
+
+    __slots__ = ("deadline", "callback", "args", "cancelled")
+
+    def __init__(self, deadline, callback, args):
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TimerScheduler:
+    """Выполняет callback(*args) в момент deadline в единственном фоновом потоке.
+
+    Сроки хранятся в куче, поэтому число потоков и расход памяти не зависят
+    от количества заказов в работе: на каждый этап приходится одна запись
+    в куче вместо спящего потока. Отменённые записи удаляются лениво, когда
+    доходят до вершины кучи.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.condition = threading.Condition()
+        self._heap = []  # (deadline, seq, handle)
+        self._seq = itertools.count()  # Порядок вызовов с одинаковым сроком
+        self._thread = None
+        self._stopping = False
+
+    def now(self):
+        return self.clock()
+
+    def call_later(self, delay, callback, *args):
+        handle = TimerHandle(self.clock() + delay, callback, args)
+        with self.condition:
+            heapq.heappush(self._heap, (handle.deadline, next(self._seq), handle))
+            # Будим поток, только если новый срок стал ближайшим
+            if self._heap[0][2] is handle:
+                self.condition.notify()
+        return handle
+
+    def pending(self):
+        """Число запланированных и не отменённых вызовов."""
+        with self.condition:
+            return sum(1 for _, _, handle in self._heap if not handle.cancelled)
+
+    def _next_due(self):
+        # Вызывается под self.condition; возвращает готовый к выполнению вызов или None
+        while self._heap:
+            deadline, _, handle = self._heap[0]
+            if handle.cancelled:
+                heapq.heappop(self._heap)
+                continue
+            if deadline <= self.clock():
+                heapq.heappop(self._heap)
+                return handle
+            return None
+        return None
+
+    def _run(self):
+        while True:
+            with self.condition:
+                handle = self._next_due()
+                while handle is None:
+                    if self._stopping:
+                        return
+                    timeout = self._heap[0][0] - self.clock() if self._heap else None
+                    self.condition.wait(timeout)
+                    handle = self._next_due()
+            # Вызов выполняется вне блокировки, чтобы он мог планировать новые
+            try:
+                handle.callback(*handle.args)
+            except Exception:
+                logger.exception(f"Ошибка в отложенном вызове {handle.callback}")
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.is_running():
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="timer-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Остановить поток; невыполненные вызовы остаются в куче до следующего start()."""
+        if not self.is_running():
+            return
+        with self.condition:
+            self._stopping = True
+            self.condition.notify()
+        self._thread.join(timeout)
+        self._thread = None